@@ -0,0 +1,522 @@
+#!/usr/bin/env python3
+"""Replays exported Telegram channel history against local price files.
+
+Every message of a Telegram Desktop JSON export (result.json) goes through
+CheckSignalMessage and ParseSignal, is sized with the bot's sizing engine and
+simulated on OHLC (or tick) CSV files: pending entries, stop loss, take profits and
+the trailing stop of build_leg_plan. The bot config supplies symbols and risk
+settings; the command line can override them to compare settings.
+
+    CONFIG_FILE=bot.env python backtest.py channel1.json channel2.json --prices prices/
+    CONFIG_FILE=bot.env python backtest.py *.json --prices prices/ --plan B --trailing N
+
+Price files are prices/<SYMBOL>.csv with a header of time,open,high,low,close (or
+date,time,... or time,bid,ask for ticks), or MT4 history exports without header.
+They are converted once to prices/<SYMBOL>.npy and memory-mapped afterwards, so
+years of one minute bars load instantly and only the bars around signals are read.
+A bar that reaches both stop loss and take profit counts as a stop loss.
+"""
+import argparse
+import csv
+import json
+import os
+import sys
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+from prettytable import PrettyTable
+
+import run
+
+# columns of the cached price arrays
+TIME, OPEN, HIGH, LOW, CLOSE = range(5)
+# signals whose hits are searched together, bounds the bars held in memory
+CHUNK_SIZE = 512
+# leg outcomes
+OUTCOMES = ("tp", "sl", "breakeven", "open")
+
+
+def message_text(message: dict) -> str:
+    """Plain text of an exported message, its text may be a list of entities."""
+    text = message.get("text", "")
+    if isinstance(text, list):
+        return "".join(part if isinstance(part, str) else part["text"] for part in text)
+    return text
+
+
+def load_export(path: str, utc_offset: float = 0) -> tuple:
+    """Reads the messages of one channel from a Telegram Desktop JSON export.
+
+    Arguments:
+        path: result.json of the export
+        utc_offset: hours to subtract from message dates that have no unix time
+
+    Returns:
+        (channel name, list of (unix time, text) in time order)
+    """
+    with open(path, encoding="utf-8") as f:
+        export = json.load(f)
+    messages = []
+    for message in export.get("messages", []):
+        if message.get("type") != "message":
+            continue
+        text = message_text(message)
+        if not text:
+            continue
+        if "date_unixtime" in message:
+            timestamp = float(message["date_unixtime"])
+        else:
+            date = datetime.fromisoformat(message["date"]) - timedelta(hours=utc_offset)
+            timestamp = date.replace(tzinfo=timezone.utc).timestamp()
+        messages.append((timestamp, text))
+    messages.sort(key=lambda message: message[0])
+    return export.get("name") or os.path.basename(path), messages
+
+
+def parse_time(value: str) -> float:
+    """Unix seconds from epoch seconds/milliseconds or an ISO/MT4 date (UTC)."""
+    try:
+        timestamp = float(value)
+        return timestamp / 1000 if timestamp > 1e11 else timestamp
+    except ValueError:
+        value = value.strip()
+        # MT4 writes 2023.05.01, some exports 2023/05/01
+        value = value[:10].replace(".", "-").replace("/", "-") + value[10:]
+        date = datetime.fromisoformat(value)
+        if date.tzinfo is None:
+            date = date.replace(tzinfo=timezone.utc)
+        return date.timestamp()
+
+
+def read_price_csv(path: str) -> np.ndarray:
+    """Reads bars or ticks from a CSV file into a (rows, 5) time/OHLC array."""
+    with open(path, newline="") as f:
+        rows = [row for row in csv.reader(f) if row]
+    if not rows:
+        raise ValueError(f"{path} is empty")
+    header = [column.strip().lower() for column in rows[0]]
+    if header[0][:1].isdigit():
+        # MT4 history export without header: date,time,open,high,low,close,volume
+        header = ["date", "time", "open", "high", "low", "close", "volume"][
+            : len(rows[0])
+        ]
+    else:
+        rows = rows[1:]
+    column = {name: index for index, name in enumerate(header)}
+    prices = np.empty((len(rows), 5))
+    for index, row in enumerate(rows):
+        if "date" in column and "time" in column:
+            date, time = row[column["date"]], row[column["time"]]
+            prices[index, TIME] = parse_time(f"{date} {time}")
+        else:
+            prices[index, TIME] = parse_time(row[column.get("time", 0)])
+        if "high" in column:
+            for field, name in ((OPEN, "open"), (HIGH, "high"), (LOW, "low")):
+                prices[index, field] = float(row[column[name]])
+            prices[index, CLOSE] = float(row[column["close"]])
+        else:
+            # ticks: every field is the bid
+            prices[index, OPEN:] = float(row[column["bid"]])
+    return prices[np.argsort(prices[:, TIME], kind="stable")]
+
+
+def load_prices(symbol: str, prices_dir: str, cache: dict):
+    """Memory-mapped price array of symbol, converted from CSV when needed.
+
+    Returns:
+        the (rows, 5) array, or None if there is no price file for symbol
+    """
+    if symbol in cache:
+        return cache[symbol]
+    csvPath = os.path.join(prices_dir, f"{symbol}.csv")
+    npyPath = os.path.join(prices_dir, f"{symbol}.npy")
+    prices = None
+    if os.path.exists(csvPath) and (
+        not os.path.exists(npyPath)
+        or os.path.getmtime(npyPath) < os.path.getmtime(csvPath)
+    ):
+        print(f"Converting {csvPath} ...", file=sys.stderr)
+        np.save(npyPath, read_price_csv(csvPath))
+    if os.path.exists(npyPath):
+        prices = np.load(npyPath, mmap_mode="r")
+    cache[symbol] = prices
+    return prices
+
+
+def first_true(mask: np.ndarray) -> np.ndarray:
+    """Column of the first True in every row, mask.shape[1] when there is none."""
+    return np.where(mask.any(axis=1), mask.argmax(axis=1), mask.shape[1])
+
+
+def windows(prices: np.ndarray, starts: np.ndarray, length: int) -> tuple:
+    """Bars starts[i] .. starts[i] + length - 1 of every row.
+
+    Returns:
+        (open, high, low, close, valid) arrays of shape (rows, length); valid is
+        False past the end of the price file
+    """
+    index = starts[:, None] + np.arange(length)
+    valid = index < len(prices)
+    index = np.minimum(index, len(prices) - 1)
+    return (
+        prices[index, OPEN],
+        prices[index, HIGH],
+        prices[index, LOW],
+        prices[index, CLOSE],
+        valid,
+    )
+
+
+def fill_signals(signals: list, prices: np.ndarray, expiry: int) -> list:
+    """Finds the fill bar and price of every signal of one symbol.
+
+    Market orders fill at the open of the first bar after the message. Pending orders
+    become stop orders when price is already past the entry (as ConnectMetaTrader
+    does) and fill at their entry when a bar touches it within expiry bars.
+    Signals without a fill get fill_bar None.
+    """
+    times = prices[:, TIME]
+    for start in range(0, len(signals), CHUNK_SIZE):
+        chunk = signals[start : start + CHUNK_SIZE]
+        bars = np.searchsorted(times, [signal["time"] for signal in chunk])
+        opens, highs, lows, _, valid = windows(prices, bars, expiry)
+        for row, signal in enumerate(chunk):
+            trade = signal["trade"]
+            if not valid[row, 0]:
+                signal["status"] = "no prices"
+                continue
+            if trade["Entry"] == "NOW":
+                signal["fill_bar"] = int(bars[row])
+                trade["Entry"] = float(opens[row, 0])
+                continue
+            orderType = trade["OrderType"]
+            if orderType == "Buy Limit" and opens[row, 0] < trade["Entry"]:
+                orderType = trade["OrderType"] = "Buy Stop"
+            elif orderType == "Sell Limit" and opens[row, 0] > trade["Entry"]:
+                orderType = trade["OrderType"] = "Sell Stop"
+            if orderType in ("Buy Limit", "Sell Stop"):
+                touched = lows[row] <= trade["Entry"]
+            else:
+                touched = highs[row] >= trade["Entry"]
+            bar = first_true((touched & valid[row])[None, :])[0]
+            if bar < expiry:
+                signal["fill_bar"] = int(bars[row] + bar)
+            else:
+                signal["status"] = "not filled"
+    return signals
+
+
+def levels_valid(trade: dict) -> bool:
+    """Stop loss below and take profits above a buy entry (the other way for sells)."""
+    side = 1 if trade["OrderType"].startswith("Buy") else -1
+    entry = trade["Entry"]
+    return (trade["StopLoss"] - entry) * side < 0 and all(
+        (takeProfit - entry) * side > 0 for takeProfit in trade["TP"]
+    )
+
+
+def simulate_legs(legs: dict, prices: np.ndarray, horizon: int) -> dict:
+    """Runs every take profit leg of one symbol until it exits or horizon bars pass.
+
+    Arguments:
+        legs: arrays start (fill bar), side (+1 buy, -1 sell), entry, stop_loss,
+            take_profit and trigger (price that moves the stop loss to entry, inf
+            for none)
+        prices: price array of the symbol
+        horizon: maximum bars a leg stays open
+
+    Returns:
+        arrays exit_price, exit_bar and outcome (index into OUTCOMES)
+    """
+    count = len(legs["start"])
+    exitPrice = np.empty(count)
+    exitBar = np.empty(count, dtype=np.int64)
+    outcome = np.empty(count, dtype=np.int64)
+    for start in range(0, count, CHUNK_SIZE):
+        rows = slice(start, start + CHUNK_SIZE)
+        side = legs["side"][rows][:, None]
+        _, highs, lows, closes, valid = windows(prices, legs["start"][rows], horizon)
+        # in the direction of the trade: favourable is the high of a buy, the low of
+        # a sell, prices are mirrored for sells so one comparison serves both
+        favourable = np.where(side > 0, highs, -lows)
+        adverse = np.where(side > 0, lows, -highs)
+        entry = (legs["entry"][rows] * side[:, 0])[:, None]
+        stopLoss = (legs["stop_loss"][rows] * side[:, 0])[:, None]
+        takeProfit = (legs["take_profit"][rows] * side[:, 0])[:, None]
+        trigger = (legs["trigger"][rows] * side[:, 0])[:, None]
+
+        tpBar = first_true((favourable >= takeProfit) & valid)
+        slBar = first_true((adverse <= stopLoss) & valid)
+        triggerBar = first_true((favourable >= trigger) & valid)
+        # back at entry after the trigger, from the bar following it
+        beBar = first_true(
+            (adverse <= entry) & valid & (np.arange(horizon) > triggerBar[:, None])
+        )
+        stopBar = np.minimum(slBar, beBar)
+        lastBar = valid.sum(axis=1) - 1
+
+        isStop = stopBar <= tpBar
+        isStop &= stopBar < horizon
+        isTp = ~isStop & (tpBar < horizon)
+        chunkOutcome = np.select(
+            [isStop & (slBar <= beBar), isStop, isTp], [1, 2, 0], default=3
+        )
+        chunkBar = np.select([isStop, isTp], [stopBar, tpBar], default=lastBar)
+        chunkPrice = np.select(
+            [chunkOutcome == 1, chunkOutcome == 2, chunkOutcome == 0],
+            [stopLoss[:, 0], entry[:, 0], takeProfit[:, 0]],
+            default=closes[np.arange(len(lastBar)), lastBar] * side[:, 0],
+        )
+        exitPrice[rows] = chunkPrice * side[:, 0]
+        exitBar[rows] = legs["start"][rows] + chunkBar
+        outcome[rows] = chunkOutcome
+    return {"exit_price": exitPrice, "exit_bar": exitBar, "outcome": outcome}
+
+
+def leg_triggers(trade: dict, trailing: bool) -> list:
+    """Price that moves each leg's stop loss to entry, as build_leg_plan does."""
+    takeProfits = trade["TP"]
+    if not trailing or len(takeProfits) < 2:
+        return [np.inf * (1 if trade["OrderType"].startswith("Buy") else -1)] * len(
+            takeProfits
+        )
+    entry = trade["Entry"]
+    threshold = round(
+        entry + (takeProfits[0] - entry) * run.TRAILING_THRESHOLD_RATIO,
+        run.TRAILING_THRESHOLD_DIGITS,
+    )
+    return [threshold] + [takeProfits[0]] * (len(takeProfits) - 1)
+
+
+def simulate_symbol(signals: list, prices: np.ndarray, args) -> None:
+    """Fills, sizes and simulates the signals of one symbol, storing results on them."""
+    fill_signals(signals, prices, args.expiry)
+    filled = [signal for signal in signals if "fill_bar" in signal]
+    for signal in filled:
+        if not levels_valid(signal["trade"]):
+            signal["status"] = "bad levels"
+    filled = [signal for signal in filled if "status" not in signal]
+
+    # sizes signals with the same number of take profits in one engine pass
+    byTakeProfits = defaultdict(list)
+    for signal in filled:
+        byTakeProfits[len(signal["trade"]["TP"])].append(signal)
+    for group in byTakeProfits.values():
+        sizings = run.size_trades(
+            [signal["trade"] for signal in group],
+            [args.balance] * len(group),
+            [None] * len(group),
+        )
+        for signal, sizing in zip(group, sizings):
+            signal["sizing"] = sizing
+            # the bot refuses a signal whose legs are all below the minimum lot
+            if not any(sizing.volumes):
+                signal["status"] = "below min lot"
+    filled = [signal for signal in filled if "status" not in signal]
+
+    legs = defaultdict(list)
+    owners = []
+    for signal in filled:
+        trade = signal["trade"]
+        side = 1 if trade["OrderType"].startswith("Buy") else -1
+        triggers = leg_triggers(trade, trade["TrailingStop"] == "Y")
+        volumes = signal["sizing"].volumes
+        for leg, (takeProfit, trigger) in enumerate(zip(trade["TP"], triggers)):
+            # the bot does not place legs sized below the minimum lot
+            if not volumes[leg]:
+                continue
+            legs["start"].append(signal["fill_bar"])
+            legs["side"].append(side)
+            legs["entry"].append(trade["Entry"])
+            legs["stop_loss"].append(trade["StopLoss"])
+            legs["take_profit"].append(takeProfit)
+            legs["trigger"].append(trigger)
+            owners.append((signal, leg))
+    if not owners:
+        return
+    result = simulate_legs(
+        {name: np.asarray(values) for name, values in legs.items()},
+        prices,
+        args.horizon,
+    )
+    for row, (signal, leg) in enumerate(owners):
+        sizing = signal["sizing"]
+        side = legs["side"][row]
+        pips = (result["exit_price"][row] - legs["entry"][row]) * side / sizing.pip_size
+        signal.setdefault("pips", 0.0)
+        signal.setdefault("profit", 0.0)
+        signal.setdefault("outcomes", [])
+        signal["pips"] += pips
+        signal["profit"] += sizing.volumes[leg] * sizing.pip_value * pips
+        signal["outcomes"].append(OUTCOMES[result["outcome"][row]])
+        signal["exit_time"] = max(
+            signal.get("exit_time", 0.0), float(prices[result["exit_bar"][row], TIME])
+        )
+        signal["status"] = "closed"
+
+
+def collect_signals(path: str, args) -> tuple:
+    """Screens and parses the messages of one export.
+
+    Returns:
+        (channel name, number of messages, list of signal dictionaries)
+    """
+    channel, messages = load_export(path, args.utc_offset)
+    signals = []
+    for timestamp, text in messages:
+        if run.CheckSignalMessage(text) != run.TRADE:
+            continue
+        try:
+            trade = run.ParseSignal(text)
+        except Exception:
+            trade = {}
+        if not trade or "Entry" not in trade:
+            continue
+        if args.plan:
+            trade["Plan"] = args.plan
+        if args.trailing:
+            trade["TrailingStop"] = args.trailing
+        if args.risk_factor is not None:
+            trade["RiskFactor"] = args.risk_factor
+        if args.risk_per_trade is not None:
+            trade["RiskPerTrade"] = args.risk_per_trade
+        signals.append(
+            {"channel": channel, "time": timestamp, "text": text, "trade": trade}
+        )
+    return channel, len(messages), signals
+
+
+def channel_stats(messages: int, signals: list) -> dict:
+    """Win rate, pips, profit, profit factor and drawdown of one channel."""
+    closed = sorted(
+        (signal for signal in signals if signal.get("status") == "closed"),
+        key=lambda signal: signal["exit_time"],
+    )
+    profits = np.array([signal["profit"] for signal in closed])
+    equity = np.cumsum(profits)
+    drawdown = (np.maximum.accumulate(np.maximum(equity, 0)) - equity).max(initial=0)
+    gains, losses = profits[profits > 0].sum(), -profits[profits < 0].sum()
+    statuses = defaultdict(int)
+    for signal in signals:
+        statuses[signal.get("status", "closed")] += 1
+    return {
+        "messages": messages,
+        "signals": len(signals),
+        "traded": len(closed),
+        "not filled": statuses["not filled"],
+        "skipped": statuses["no prices"]
+        + statuses["bad levels"]
+        + statuses["below min lot"],
+        "win %": 100 * (profits > 0).sum() / len(closed) if closed else 0.0,
+        "pips": sum(signal["pips"] for signal in closed),
+        "profit": equity[-1] if closed else 0.0,
+        "profit factor": gains / losses if losses else float("inf") if gains else 0.0,
+        "max drawdown": drawdown,
+    }
+
+
+def write_trades(path: str, signals: list) -> None:
+    """Writes one CSV row per signal with its outcome."""
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(
+            ["channel", "time", "symbol", "type", "entry", "status", "legs"]
+            + ["pips", "profit"]
+        )
+        for signal in signals:
+            trade = signal["trade"]
+            writer.writerow(
+                [
+                    signal["channel"],
+                    datetime.fromtimestamp(signal["time"], timezone.utc).isoformat(),
+                    trade["Symbol"],
+                    trade["OrderType"],
+                    trade["Entry"],
+                    signal.get("status", ""),
+                    " ".join(signal.get("outcomes", [])),
+                    round(signal.get("pips", 0.0), 1),
+                    round(signal.get("profit", 0.0), 2),
+                ]
+            )
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n", 1)[0])
+    parser.add_argument("exports", nargs="+", help="Telegram Desktop result.json files")
+    parser.add_argument(
+        "--prices", required=True, help="directory of <SYMBOL>.csv files"
+    )
+    parser.add_argument("--balance", type=float, default=10000, help="balance sized on")
+    parser.add_argument("--plan", choices=["A", "B"], help="override PLAN")
+    parser.add_argument("--trailing", choices=["Y", "N"], help="override TRAILING_STOP")
+    parser.add_argument("--risk-factor", type=float, help="override RISK_FACTOR")
+    parser.add_argument("--risk-per-trade", type=float, help="override RISK_PERTRADE")
+    parser.add_argument(
+        "--expiry", type=int, default=1440, help="bars a pending order waits for entry"
+    )
+    parser.add_argument(
+        "--horizon", type=int, default=7200, help="bars a position stays open at most"
+    )
+    parser.add_argument(
+        "--utc-offset",
+        type=float,
+        default=0,
+        help="UTC offset in hours of export dates without unix time",
+    )
+    parser.add_argument(
+        "--trades", help="write every signal and its outcome to this CSV"
+    )
+    args = parser.parse_args()
+
+    channels = []
+    for path in args.exports:
+        channels.append(collect_signals(path, args))
+
+    bySymbol = defaultdict(list)
+    for _, _, signals in channels:
+        for signal in signals:
+            bySymbol[signal["trade"]["Symbol"]].append(signal)
+    cache = {}
+    for symbol, signals in bySymbol.items():
+        prices = load_prices(symbol, args.prices, cache)
+        if prices is None or not len(prices):
+            for signal in signals:
+                signal["status"] = "no prices"
+            continue
+        simulate_symbol(signals, prices, args)
+
+    table = PrettyTable(
+        ["Channel", "Messages", "Signals", "Traded", "Not filled", "Skipped", "Win %"]
+        + ["Pips", "Profit", "PF", "Max DD"]
+    )
+    table.align = "r"
+    table.align["Channel"] = "l"
+    for channel, messages, signals in channels:
+        stats = channel_stats(messages, signals)
+        table.add_row(
+            [
+                channel,
+                stats["messages"],
+                stats["signals"],
+                stats["traded"],
+                stats["not filled"],
+                stats["skipped"],
+                f"{stats['win %']:.1f}",
+                f"{stats['pips']:,.0f}",
+                f"{stats['profit']:,.2f}",
+                f"{stats['profit factor']:.2f}",
+                f"{stats['max drawdown']:,.2f}",
+            ]
+        )
+    print(table)
+
+    if args.trades:
+        write_trades(
+            args.trades, [signal for _, _, signals in channels for signal in signals]
+        )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,367 @@
+#!/usr/bin/env python3
+"""Offline benchmarks of the signal screening, parsing and sizing hot paths.
+
+Runs without Telegram or MetaApi: run.py is imported with a benchmark config (unless
+CONFIG_FILE is set) and every function is called on a fixed corpus of signal formats
+and a seeded synthetic position book, so numbers are comparable between commits.
+
+    python benchmark.py                              # prints throughput and allocations
+    python benchmark.py --json bench.json            # saves the results
+    python benchmark.py --baseline bench.json        # exits 1 on a regression
+"""
+import argparse
+import asyncio
+import copy
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta, timezone
+
+BENCH_CONFIG = """\
+[MetaAPI]
+API_KEY = benchmark
+ACCOUNT_ID = benchmark
+RISK_FACTOR = 0.02
+RISK_PERTRADE = 0.01
+
+[Telegram]
+TOKEN = 0:benchmark
+TELEGRAM_USER = benchmark
+CHANNEL_USER = benchmark
+
+[Render]
+APP_URL = http://localhost/
+PLAN = A
+TRAILING_STOP = Y
+
+[Bot]
+SYMBOLS = XAUUSD,GOLD,XAGUSD,EURUSD,GBPUSD,USDJPY,AUDUSD,GBPJPY,NAS100,USTEC,US30
+SYMBOLSPLUS = XAU/USD,EUR/USD,GBP/USD,USD/JPY,GBP/JPY
+TYPETRADE = BUY,SELL
+OTHER = CLOSE,MOVE SL
+"""
+
+if "CONFIG_FILE" not in os.environ:
+    # run.py reads its settings at import, point it at throwaway benchmark files;
+    # the directory is removed when the interpreter exits
+    benchDir = tempfile.TemporaryDirectory(prefix="benchmark-")
+    os.environ["CONFIG_FILE"] = os.path.join(benchDir.name, "benchmark.env")
+    os.environ["CONFIG_OVERRIDE_FILE"] = os.path.join(benchDir.name, "override.env")
+    with open(os.environ["CONFIG_FILE"], "w") as f:
+        f.write(BENCH_CONFIG)
+
+import run  # noqa: E402
+from prettytable import PrettyTable  # noqa: E402
+
+# Signal formats seen in provider channels
+SIGNALS = [
+    "XAUUSD BUY 1935.50\nSL 1928.00\nTP 1940.00\nTP 1945.00\nTP 1955.00",
+    "XAUUSD SELL NOW\nSL 1948\nTP 1940\nTP 1935\nTP 1930\nTP 1925",
+    "GOLD BUY LIMIT 1930 - 1927\nSL 1922\nTP 1935\nTP 1940\nTP 1950",
+    "GOLD SELL 1950 (scalper)\nSTOP LOSS 1956\nTarget Profit 1945\nTarget Profit 1940",
+    "XAU/USD BUY STOP\nEntry 1941.2\nSL 1934.2\nTP 1946.2\nTP 1951.2",
+    "EUR/USD SELL LIMIT 1.0925\nSL 1.0950 (25 pips)\nTP 1.0900 (25 pips)\nTP 1.0875",
+    "GBPJPY BUY @ 182.40\nSL 181.90\nTP 182.70\nTP 183.00\nTP 183.50",
+    "NAS100 BUY NOW\nSL 15250\nTP 15350\nTP 15400\nTP 15500",
+    "US30 SELL STOP\nentry 34350\nSL 34450\nTP 34250\nTP 34150",
+    "USDJPY SELL 149 85\nSL 150 20\nTP 149 50\nTP 149 20",
+    "EURUSD BUY 1.0850/1.0845\nSL 1.0820 (30 pips)\nTP 1.0880 (30 pips)\n"
+    "TP 1.0910 (60 pips)\nTP 1.0950",
+    "XAGUSD SELL LIMIT 23.45\nStop Loss 23.70\nTake Profit 23.20\nTP 23.00",
+    "🔥 GOLD BUY NOW 🔥\n\nSL 1925 (swing)\nTP 1935\nTP 1945\nTP OPEN",
+    "USTEC SELL 15420 intraday\nSL 15480\nTP 15360\nTP 15300\nTP 15200\nTP 15100",
+]
+
+# Channel chatter that screening has to reject quickly
+CHATTER = [
+    "Good morning traders! Big week ahead with CPI on Wednesday.",
+    "TP1 hit on gold +50 pips ✅✅",
+    "Move SL to entry on the EURUSD trade",
+    "Close half now and let the rest run",
+    "Market is choppy today, stay patient.",
+    "Results this week: +420 pips, 12 wins 3 losses",
+    "",
+    "👍",
+    "Join our VIP channel for more signals: t.me/example",
+    "Gold looks bullish above 1930, waiting for a pullback to buy",
+]
+
+# Broker specifications for sizing: digits, point, tick size, tick value, contract size
+SPECS = {
+    symbol: run.SymbolSpec(symbol, *values, 0.01, 0.01, 100, 0.0)
+    for symbol, values in {
+        "XAUUSD": (2, 0.01, 0.01, 1.0, 100),
+        "XAGUSD": (3, 0.001, 0.001, 5.0, 5000),
+        "EURUSD": (5, 0.00001, 0.00001, 1.0, 100000),
+        "GBPJPY": (3, 0.001, 0.001, 0.67, 100000),
+        "USDJPY": (3, 0.001, 0.001, 0.67, 100000),
+        "USTEC": (2, 0.01, 0.01, 0.01, 1),
+        "US30": (2, 0.01, 0.01, 0.01, 1),
+    }.items()
+}
+
+BOOK_SYMBOLS = ["XAUUSD", "EURUSD", "GBPUSD", "USDJPY", "USTEC", "US30", "XAGUSD"]
+SELECTORS = [
+    "all",
+    "losing",
+    "symbol=XAUUSD side=buy",
+    "symbol=EURUSD profit>0 opened<1h",
+    "volume>=0.5 magic=123",
+]
+
+
+def make_positions(count: int, seed: int = 7) -> list:
+    """Seeded synthetic open positions shaped like MetaApi position dictionaries.
+
+    Arguments:
+        count: number of positions
+        seed: random seed, the same seed gives the same book
+
+    Returns:
+        a list of position dictionaries
+    """
+    rng = random.Random(seed)
+    now = datetime.now(timezone.utc)
+    positions = []
+    for index in range(count):
+        symbol = rng.choice(BOOK_SYMBOLS)
+        openPrice = round(rng.uniform(1, 2000), 2)
+        positions.append(
+            {
+                "id": str(100000000 + index),
+                "type": rng.choice(["POSITION_TYPE_BUY", "POSITION_TYPE_SELL"]),
+                "symbol": symbol,
+                "magic": rng.choice([0, 123, 456]),
+                "time": now - timedelta(seconds=rng.randint(0, 7 * 86400)),
+                "openPrice": openPrice,
+                "currentPrice": round(openPrice * rng.uniform(0.99, 1.01), 2),
+                "volume": rng.choice([0.01, 0.05, 0.1, 0.5, 1.0]),
+                "profit": round(rng.uniform(-500, 500), 2),
+                "stopLoss": round(openPrice * 0.99, 2),
+                "takeProfit": round(openPrice * 1.01, 2),
+            }
+        )
+    return positions
+
+
+class DiscardMessage:
+    """Telegram message stand-in that drops replies, for the handlers' reply() calls."""
+
+    chat_id = 0
+
+    def reply_text(self, text, **kwargs):
+        return None
+
+
+class DiscardUpdate:
+    effective_message = DiscardMessage()
+
+
+def benchmarks(positions: list, accounts: int) -> list:
+    """Returns (name, items per call, function) for every benchmark.
+
+    Arguments:
+        positions: synthetic position book
+        accounts: number of accounts one signal is sized for at once
+    """
+    lines = [
+        run.replace_spaces(run.remove_pips(signal)).splitlines() for signal in SIGNALS
+    ]
+    messages = SIGNALS + CHATTER
+    trades = []
+    for signal in SIGNALS:
+        trade = run.ParseSignal(signal)
+        if trade:
+            if trade["Entry"] == "NOW":
+                trade["Entry"] = trade["StopLoss"]
+                trade["StopLoss"] += -5 if trade["OrderType"].startswith("Buy") else 5
+            trades.append(trade)
+    update = DiscardUpdate()
+
+    rng = random.Random(11)
+    accountTrades = [
+        dict(
+            trades[0],
+            RiskFactor=rng.choice([0.01, 0.02, 0.05]),
+            Plan=rng.choice(["A", "B"]),
+        )
+        for _ in range(accounts)
+    ]
+    accountBalances = [rng.uniform(1000, 100000) for _ in range(accounts)]
+    accountSpecs = [SPECS.get(trades[0]["Symbol"])] * accounts
+
+    state = run.AccountStateMirror(run.SymbolSpecCache())
+    asyncio.run(state.on_positions_replaced("0", copy.deepcopy(positions)))
+    selectors = [run.parse_selector(selector) for selector in SELECTORS]
+
+    def screen():
+        for message in messages:
+            run.screen_message(message)
+
+    def check():
+        for message in messages:
+            run.CheckSignalMessage(message)
+
+    def parse():
+        for signal in SIGNALS:
+            run.ParseSignal(signal)
+
+    def find_tp():
+        for signalLines in lines:
+            run.FindTP("tp", signalLines)
+
+    def strip_pips():
+        for signal in SIGNALS:
+            run.remove_pips(signal)
+
+    def join_numbers():
+        for signal in SIGNALS:
+            run.replace_spaces(signal)
+
+    def size_trades():
+        for trade in trades:
+            run.GetTradeInformation(
+                update, dict(trade), 10000.0, SPECS.get(trade["Symbol"])
+            )
+
+    def size_accounts():
+        run.size_trades(accountTrades, accountBalances, accountSpecs)
+
+    def filter_book():
+        for selector in selectors:
+            [p for p in positions if run.selector_matches(selector, p)]
+
+    def filter_index():
+        for selector in selectors:
+            candidates = state.positions_for(selector.symbol, selector.side)
+            [p for p in candidates if run.selector_matches(selector, p)]
+
+    def render_book():
+        list(run.create_table(positions, is_pending=False).chunks())
+
+    return [
+        ("screen_message", len(messages), screen),
+        ("CheckSignalMessage", len(messages), check),
+        ("ParseSignal", len(SIGNALS), parse),
+        ("FindTP", len(lines), find_tp),
+        ("remove_pips", len(SIGNALS), strip_pips),
+        ("replace_spaces", len(SIGNALS), join_numbers),
+        ("GetTradeInformation", len(trades), size_trades),
+        ("size_trades accounts", accounts, size_accounts),
+        ("create_table", len(positions), render_book),
+        ("selector scan", len(positions) * len(selectors), filter_book),
+        ("selector index", len(positions) * len(selectors), filter_index),
+    ]
+
+
+def measure(function, seconds: float, repeat: int) -> dict:
+    """Times function for about seconds, repeat times, and traces one call's memory.
+
+    Returns:
+        {"calls_per_s": best of the repeats, "peak_kib": peak traced memory of one
+        call, "retained_b": memory still allocated after it}
+    """
+    function()
+    best = 0.0
+    for _ in range(repeat):
+        calls = 0
+        start = time.perf_counter()
+        while True:
+            function()
+            calls += 1
+            elapsed = time.perf_counter() - start
+            if elapsed >= seconds:
+                break
+        best = max(best, calls / elapsed)
+
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        function()
+        current, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {
+        "calls_per_s": best,
+        "peak_kib": (peak - before) / 1024,
+        "retained_b": max(0, current - before),
+    }
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list:
+    """Returns a line per benchmark that got slower or allocates more than tolerance."""
+    regressions = []
+    for name, result in results.items():
+        base = baseline.get(name)
+        if base is None:
+            continue
+        if result["items_per_s"] < base["items_per_s"] * (1 - tolerance):
+            regressions.append(
+                f"{name}: {result['items_per_s']:,.0f} items/s,"
+                f" baseline {base['items_per_s']:,.0f}"
+            )
+        if result["peak_kib"] > max(base["peak_kib"] * (1 + tolerance), 1.0):
+            regressions.append(
+                f"{name}: peak {result['peak_kib']:,.1f} KiB,"
+                f" baseline {base['peak_kib']:,.1f}"
+            )
+    return regressions
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n", 1)[0])
+    parser.add_argument("--seconds", type=float, default=0.5, help="time per repeat")
+    parser.add_argument("--repeat", type=int, default=3, help="repeats, best is kept")
+    parser.add_argument("--positions", type=int, default=5000, help="book size")
+    parser.add_argument("--accounts", type=int, default=100, help="accounts sized")
+    parser.add_argument("--filter", default="", help="run benchmarks containing this")
+    parser.add_argument("--json", help="write the results to this file")
+    parser.add_argument("--baseline", help="compare with results saved by --json")
+    parser.add_argument(
+        "--tolerance", type=float, default=0.2, help="allowed slowdown, 0.2 = 20%%"
+    )
+    args = parser.parse_args()
+
+    table = PrettyTable(["Benchmark", "items/s", "µs/item", "peak KiB", "retained B"])
+    table.align = "r"
+    table.align["Benchmark"] = "l"
+    results = {}
+    for name, items, function in benchmarks(
+        make_positions(args.positions), args.accounts
+    ):
+        if args.filter not in name:
+            continue
+        result = measure(function, args.seconds, args.repeat)
+        result["items_per_s"] = result["calls_per_s"] * items
+        results[name] = result
+        table.add_row(
+            [
+                name,
+                f"{result['items_per_s']:,.0f}",
+                f"{1e6 / result['items_per_s']:,.2f}",
+                f"{result['peak_kib']:,.1f}",
+                f"{result['retained_b']:,}",
+            ]
+        )
+    print(table)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
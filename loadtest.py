@@ -0,0 +1,677 @@
+#!/usr/bin/env python3
+"""End-to-end load test of the signal path against a local MetaApi stand-in.
+
+The bot runs as in production (webhook, Updater handlers, signal queue, connection
+managers), but the MetaApi SDK is replaced by an in-process fake whose RPC latency,
+errors and fills are configurable, and the Telegram Bot API by a request object that
+answers locally. Synthetic signals are posted to the webhook at a fixed rate and each
+is timed from the POST until the fake broker received all of its orders.
+
+    python loadtest.py                                     # 20 signals/s for 10 s
+    python loadtest.py --rate 50 --latency 80 --error-rate 0.02
+    python loadtest.py --json load.json --max-p99 500 --min-rate 15  # exit 1 if missed
+
+Without CONFIG_FILE run.py is imported with a load test config; with it the bot's own
+settings (queue, workers, accounts, rate limits) are tested.
+"""
+import argparse
+import asyncio
+import http.client
+import itertools
+import json
+import logging
+import os
+import random
+import socket
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+
+LOAD_CONFIG = """\
+[MetaAPI]
+API_KEY = loadtest
+ACCOUNT_ID = loadtest
+RISK_FACTOR = 0.02
+RISK_PERTRADE = 0.01
+
+[Telegram]
+TOKEN = 123456:loadtest
+TELEGRAM_USER = loadtest
+CHANNEL_USER = loadtest
+
+[Render]
+APP_URL = http://localhost/
+PLAN = A
+TRAILING_STOP = Y
+METRICS_PORT = 0
+
+[Bot]
+SYMBOLS = XAUUSD,EURUSD,GBPUSD,USDJPY,XAGUSD,USTEC,US30
+SYMBOLSPLUS = XAU/USD,EUR/USD,GBP/USD,USD/JPY
+TYPETRADE = BUY,SELL
+OTHER = CLOSE,MOVE SL
+CONFIG_WATCH_INTERVAL = 0
+"""
+
+if "CONFIG_FILE" not in os.environ:
+    # run.py reads its settings at import, point it at throwaway load test files;
+    # the directory is removed when the interpreter exits
+    loadDir = tempfile.TemporaryDirectory(prefix="loadtest-")
+    os.environ["CONFIG_FILE"] = os.path.join(loadDir.name, "loadtest.env")
+    os.environ["CONFIG_OVERRIDE_FILE"] = os.path.join(loadDir.name, "override.env")
+    with open(os.environ["CONFIG_FILE"], "w") as f:
+        f.write(LOAD_CONFIG)
+
+import numpy as np  # noqa: E402
+from metaapi_cloud_sdk.clients.metaApi.tradeException import (
+    TradeException,
+)  # noqa: E402
+from prettytable import PrettyTable  # noqa: E402
+from telegram import Bot  # noqa: E402
+from telegram.ext import Updater  # noqa: E402
+from telegram.utils.request import Request  # noqa: E402
+
+import run  # noqa: E402
+
+# Instruments the fake broker knows: price, digits, tick value of one lot, contract size
+MARKETS = {
+    "XAUUSD": (1930.00, 2, 1.0, 100),
+    "XAGUSD": (23.450, 3, 5.0, 5000),
+    "EURUSD": (1.08500, 5, 1.0, 100000),
+    "GBPUSD": (1.26500, 5, 1.0, 100000),
+    "USDJPY": (149.500, 3, 0.67, 100000),
+    "USTEC": (15400.0, 1, 0.1, 1),
+    "US30": (34400.0, 1, 0.1, 1),
+}
+# Take profits of every synthetic signal
+TAKE_PROFITS = 3
+# chat of the redelivered copies, synthetic signals come from chats 1000 and up
+REDELIVERY_CHAT = 999
+# Non-signal messages posted between signals
+CHATTER = [
+    "Good morning traders! Big week ahead with CPI on Wednesday.",
+    "TP1 hit on gold +50 pips ✅✅",
+    "Market is choppy today, stay patient.",
+]
+
+
+def order_key(symbol: str, stop_loss: float) -> str:
+    """Identifies a synthetic signal by symbol and its (unique) stop loss."""
+    return f"{symbol} {stop_loss:.{MARKETS[symbol][1]}f}"
+
+
+class FakeBroker:
+    """State and behaviour shared by every fake MetaApi object.
+
+    Arguments:
+        latency: mean seconds of one RPC call
+        jitter: extra random seconds of one RPC call, uniform
+        error_rate: share of orders rejected with a TradeException
+        fill: "done" answers orders with a result, "no-error" raises the TradeException
+            with ERR_NO_ERROR that MetaApi sometimes reports for successful trades
+        handshake: seconds of wait_connected and wait_synchronized
+        balance: account balance
+    """
+
+    def __init__(
+        self,
+        latency: float = 0.05,
+        jitter: float = 0.02,
+        error_rate: float = 0.0,
+        fill: str = "done",
+        handshake: float = 0.5,
+        balance: float = 10000,
+    ):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.fill = fill
+        self.handshake = handshake
+        self.balance = balance
+        self.random = random.Random(7)
+        self.ids = itertools.count(1)
+        self.calls = Counter()
+        # order key -> perf_counter times of accepted and rejected orders
+        self.orders = {}
+        self.rejected = {}
+        self._lock = threading.Lock()
+
+    async def delay(self, method: str) -> None:
+        with self._lock:
+            self.calls[method] += 1
+        await asyncio.sleep(self.latency + self.random.uniform(0, self.jitter))
+
+    async def order(self, method: str, symbol: str, volume: float, *args) -> dict:
+        await self.delay(method)
+        # market orders: stop loss, take profit; pending: price, stop loss, take profit
+        stopLoss = args[0] if "market" in method else args[1]
+        key = order_key(symbol, stopLoss)
+        now = time.perf_counter()
+        with self._lock:
+            rejected = self.random.random() < self.error_rate
+            (self.rejected if rejected else self.orders).setdefault(key, []).append(now)
+            orderId = str(next(self.ids))
+        if rejected:
+            raise TradeException(
+                "Trade rejected by load test", 10006, "TRADE_RETCODE_REJECT"
+            )
+        if self.fill == "no-error":
+            raise TradeException("No error returned", 0, "ERR_NO_ERROR")
+        if "market" in method:
+            return {
+                "numericCode": 10009,
+                "stringCode": "TRADE_RETCODE_DONE",
+                "orderId": orderId,
+                "positionId": orderId,
+            }
+        return {
+            "numericCode": 10008,
+            "stringCode": "TRADE_RETCODE_PLACED",
+            "orderId": orderId,
+        }
+
+
+class FakeRpcConnection:
+    """RPC connection of the fake broker: account, prices, specifications and orders."""
+
+    def __init__(self, broker: FakeBroker):
+        self.broker = broker
+
+    async def connect(self) -> None:
+        pass
+
+    async def wait_synchronized(self, *args, **kwargs) -> None:
+        await asyncio.sleep(self.broker.handshake)
+
+    async def close(self) -> None:
+        pass
+
+    async def get_server_time(self) -> dict:
+        await self.broker.delay("get_server_time")
+        return {"time": time.time()}
+
+    async def get_account_information(self) -> dict:
+        await self.broker.delay("get_account_information")
+        balance = self.broker.balance
+        return {
+            "balance": balance,
+            "equity": balance,
+            "margin": 0,
+            "freeMargin": balance,
+            "leverage": 100,
+            "currency": "USD",
+        }
+
+    async def get_symbol_specification(self, symbol: str) -> dict:
+        await self.broker.delay("get_symbol_specification")
+        if symbol not in MARKETS:
+            raise Exception(f"Symbol {symbol} not found")
+        _, digits, _, contractSize = MARKETS[symbol]
+        return {
+            "symbol": symbol,
+            "digits": digits,
+            "point": 10**-digits,
+            "tickSize": 10**-digits,
+            "contractSize": contractSize,
+            "minVolume": 0.01,
+            "maxVolume": 100,
+            "volumeStep": 0.01,
+        }
+
+    async def get_symbol_price(self, symbol: str, *args, **kwargs) -> dict:
+        await self.broker.delay("get_symbol_price")
+        price, digits, tickValue, _ = MARKETS[symbol]
+        return {
+            "symbol": symbol,
+            "bid": price,
+            "ask": round(price + 2 * 10**-digits, digits),
+            "profitTickValue": tickValue,
+            "lossTickValue": tickValue,
+        }
+
+    async def get_positions(self) -> list:
+        await self.broker.delay("get_positions")
+        return []
+
+    async def get_orders(self) -> list:
+        await self.broker.delay("get_orders")
+        return []
+
+    def __getattr__(self, name: str):
+        # create_market_buy_order, create_limit_sell_order, ... named by ORDER_ROUTES
+        if name.startswith("create_") and name.endswith("_order"):
+
+            async def order(*args, **kwargs):
+                return await self.broker.order(name, *args)
+
+            return order
+        raise AttributeError(name)
+
+
+class FakeStreamingConnection:
+    """Streaming connection that synchronizes but never streams, prices use RPC."""
+
+    def __init__(self, broker: FakeBroker):
+        self.broker = broker
+
+    def add_synchronization_listener(self, listener) -> None:
+        pass
+
+    async def connect(self) -> None:
+        pass
+
+    async def wait_synchronized(self, *args, **kwargs) -> None:
+        await asyncio.sleep(self.broker.handshake)
+
+    async def subscribe_to_market_data(self, symbol: str, *args, **kwargs) -> None:
+        pass
+
+    async def close(self) -> None:
+        pass
+
+
+class FakeAccount:
+    state = "DEPLOYED"
+
+    def __init__(self, broker: FakeBroker):
+        self.broker = broker
+
+    async def wait_connected(self) -> None:
+        await asyncio.sleep(self.broker.handshake)
+
+    def get_rpc_connection(self) -> FakeRpcConnection:
+        return FakeRpcConnection(self.broker)
+
+    def get_streaming_connection(self) -> FakeStreamingConnection:
+        return FakeStreamingConnection(self.broker)
+
+
+class FakeAccountApi:
+    def __init__(self, broker: FakeBroker):
+        self.broker = broker
+
+    async def get_account(self, account_id: str) -> FakeAccount:
+        return FakeAccount(self.broker)
+
+
+class FakeMetaApi:
+    """Takes the place of metaapi_cloud_sdk.MetaApi(token) in run.py."""
+
+    broker = None
+
+    def __init__(self, token: str, *args, **kwargs):
+        self.metatrader_account_api = FakeAccountApi(self.broker)
+
+    def close(self) -> None:
+        pass
+
+
+class FakeTelegramRequest(Request):
+    """Answers Bot API calls locally and counts them instead of calling Telegram."""
+
+    __slots__ = ("calls", "messageIds", "_lock")
+
+    def __init__(self, con_pool_size: int = 1):
+        super().__init__(con_pool_size=con_pool_size)
+        self.calls = Counter()
+        self.messageIds = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def post(self, url: str, data: dict, timeout: float = None):
+        method = url.rsplit("/", 1)[-1]
+        with self._lock:
+            self.calls[method] += 1
+            messageId = next(self.messageIds)
+        if method == "getMe":
+            return {
+                "id": 1,
+                "is_bot": True,
+                "first_name": "loadtest",
+                "username": "loadtest_bot",
+            }
+        if method in ("sendMessage", "editMessageText"):
+            return {
+                "message_id": messageId,
+                "date": int(time.time()),
+                "chat": {"id": int(data.get("chat_id", 1)), "type": "private"},
+                "text": data.get("text", ""),
+            }
+        return True
+
+
+def synthetic_updates(count: int, chatter: float, chats: int, symbols: list) -> list:
+    """Webhook bodies of count signals with chatter messages between them.
+
+    Returns:
+        a list of (order key or None, update dictionary)
+    """
+    generator = random.Random(11)
+    username = run.AUTHORIZED_USERS[0]
+    updates = []
+    for index in range(count):
+        while generator.random() < chatter:
+            updates.append((None, generator.choice(CHATTER)))
+        symbol = symbols[index % len(symbols)]
+        price, digits, _, _ = MARKETS[symbol]
+        side = 1 if index % 2 == 0 else -1
+        # every signal of a symbol gets its own stop loss, so orders can be matched
+        step = 10**-digits
+        stopLoss = price * (1 - side * 0.005) - side * (index // len(symbols)) * step
+        takeProfits = [
+            price * (1 + side * 0.002 * (leg + 1)) for leg in range(TAKE_PROFITS)
+        ]
+        lines = [
+            f"{symbol} {'BUY' if side > 0 else 'SELL'} NOW",
+            f"SL {stopLoss:.{digits}f}",
+        ]
+        lines += [f"TP {takeProfit:.{digits}f}" for takeProfit in takeProfits]
+        updates.append((order_key(symbol, stopLoss), "\n".join(lines)))
+    return [
+        (
+            key,
+            {
+                "update_id": updateId,
+                "message": {
+                    "message_id": updateId,
+                    "date": int(time.time()),
+                    "chat": {
+                        "id": 1000 + updateId % chats,
+                        "type": "private",
+                        "username": username,
+                    },
+                    "from": {"id": 1000, "is_bot": False, "first_name": username},
+                    "text": text,
+                },
+            },
+        )
+        for updateId, (key, text) in enumerate(updates, 1)
+    ]
+
+
+def redeliver(updates: list, share: float) -> list:
+    """Posts share of the updates a second time shortly after, as Telegram does when
+    the webhook answers too late.
+
+    A copy keeps its update_id but comes from a chat no original uses, so the signal
+    fingerprint differs and only the webhook's update_id check can drop it.
+    """
+    generator = random.Random(13)
+    updates = list(updates)
+    for index in reversed(range(len(updates))):
+        if generator.random() < share:
+            key, update = updates[index]
+            again = json.loads(json.dumps(update))
+            again["message"]["chat"]["id"] = REDELIVERY_CHAT
+            updates.insert(index + generator.randint(1, 5), (key, again))
+    return updates
+
+
+def post_updates(port: int, path: str, updates: list, rate: float) -> tuple:
+    """POSTs updates to the webhook at rate per second over one keep-alive connection.
+
+    Returns:
+        ({order key: perf_counter time of the POST}, failed POSTs, seconds taken)
+    """
+    connection = http.client.HTTPConnection("127.0.0.1", port, timeout=10)
+    posted, failed = {}, 0
+    start = time.perf_counter()
+    for index, (key, update) in enumerate(updates):
+        delay = start + index / rate - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        sentAt = time.perf_counter()
+        try:
+            connection.request(
+                "POST",
+                path,
+                json.dumps(update).encode(),
+                {
+                    "Content-Type": "application/json",
+                    run.SECRET_TOKEN_HEADER: run.WEBHOOK_SECRET,
+                },
+            )
+            response = connection.getresponse()
+            response.read()
+            ok = response.status == 200
+        except (OSError, http.client.HTTPException):
+            connection.close()
+            ok = False
+        if not ok:
+            failed += 1
+        elif key is not None:
+            posted.setdefault(key, sentAt)
+    connection.close()
+    return posted, failed, time.perf_counter() - start
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def wait_for_orders(
+    broker: FakeBroker, posted: dict, legs: int, timeout: float
+) -> None:
+    """Waits until every posted signal has all its orders or timeout seconds pass."""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        with broker._lock:
+            done = sum(
+                len(broker.orders.get(key, ())) + len(broker.rejected.get(key, ()))
+                >= legs
+                for key in posted
+            )
+        if done >= len(posted):
+            return
+        time.sleep(0.05)
+
+
+def summarize(
+    broker: FakeBroker, posted: dict, failedPosts: int, legs: int, updates: int
+) -> dict:
+    """Throughput, signal-to-order latency percentiles and error rates."""
+    latencies, completedAt = [], []
+    failedSignals = lost = repeated = 0
+    for key, sentAt in posted.items():
+        times = broker.orders.get(key, []) + broker.rejected.get(key, [])
+        if len(times) < legs:
+            lost += 1
+            continue
+        if len(times) > legs:
+            repeated += 1
+        if key in broker.rejected:
+            failedSignals += 1
+        latencies.append(max(times) - sentAt)
+        completedAt.append(max(times))
+    signals = len(posted)
+    ordersSent = sum(map(len, broker.orders.values()))
+    ordersRejected = sum(map(len, broker.rejected.values()))
+    elapsed = (max(completedAt) - min(posted.values())) if completedAt else 0.0
+    latencies = np.array(latencies) * 1000
+    return {
+        "updates": updates,
+        "signals": signals,
+        "completed": len(latencies),
+        "signals/s": len(latencies) / elapsed if elapsed else 0.0,
+        "latency p50 ms": (
+            float(np.percentile(latencies, 50)) if len(latencies) else 0.0
+        ),
+        "latency p95 ms": (
+            float(np.percentile(latencies, 95)) if len(latencies) else 0.0
+        ),
+        "latency p99 ms": (
+            float(np.percentile(latencies, 99)) if len(latencies) else 0.0
+        ),
+        "latency max ms": float(latencies.max()) if len(latencies) else 0.0,
+        "webhook error rate": failedPosts / updates if updates else 0.0,
+        "lost signal rate": lost / signals if signals else 0.0,
+        "failed signal rate": failedSignals / signals if signals else 0.0,
+        "placed twice rate": repeated / signals if signals else 0.0,
+        "order error rate": (
+            ordersRejected / (ordersSent + ordersRejected)
+            if ordersSent + ordersRejected
+            else 0.0
+        ),
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n", 1)[0])
+    parser.add_argument(
+        "--rate", type=float, default=20, help="signals posted per second"
+    )
+    parser.add_argument("--seconds", type=float, default=10, help="seconds of posting")
+    parser.add_argument(
+        "--chatter", type=float, default=0.5, help="share of non-signal messages"
+    )
+    parser.add_argument(
+        "--chats", type=int, default=20, help="chats the signals come from"
+    )
+    parser.add_argument(
+        "--latency", type=float, default=50, help="mean fake RPC latency in ms"
+    )
+    parser.add_argument(
+        "--jitter", type=float, default=20, help="random extra RPC latency in ms"
+    )
+    parser.add_argument(
+        "--error-rate", type=float, default=0.0, help="share of orders rejected"
+    )
+    parser.add_argument(
+        "--fill", choices=["done", "no-error"], default="done", help="order answers"
+    )
+    parser.add_argument(
+        "--handshake", type=float, default=500, help="connect and sync time in ms"
+    )
+    parser.add_argument(
+        "--drain", type=float, default=30, help="seconds to wait for the last orders"
+    )
+    parser.add_argument(
+        "--redeliver", type=float, default=0.0, help="share of updates posted twice"
+    )
+    parser.add_argument("--json", help="write the results to this file")
+    parser.add_argument(
+        "--verbose", action="store_true", help="keep the bot's INFO logs"
+    )
+    parser.add_argument(
+        "--max-p99", type=float, help="exit 1 if p99 latency (ms) is higher"
+    )
+    parser.add_argument("--min-rate", type=float, help="exit 1 if signals/s is lower")
+    args = parser.parse_args()
+    if not args.verbose:
+        logging.getLogger().setLevel(logging.WARNING)
+
+    symbols = [symbol for symbol in run.broker_symbols() if symbol in MARKETS]
+    if not symbols:
+        print(f"None of SYMBOLS is one of {', '.join(MARKETS)}", file=sys.stderr)
+        return 2
+    broker = FakeBroker(
+        latency=args.latency / 1000,
+        jitter=args.jitter / 1000,
+        error_rate=args.error_rate,
+        fill=args.fill,
+        handshake=args.handshake / 1000,
+    )
+    FakeMetaApi.broker = broker
+    run.MetaApi = FakeMetaApi
+
+    request = FakeTelegramRequest(con_pool_size=run.DISPATCHER_WORKERS + 4)
+    updater = Updater(
+        bot=Bot(run.TOKEN, request=request),
+        use_context=True,
+        workers=run.DISPATCHER_WORKERS,
+    )
+    run.register_handlers(updater.dispatcher)
+
+    run.event_loop.start()
+    run.reply_sender.start()
+    for account in run.settings.accounts:
+        run.event_loop.run(
+            run.get_connection_manager(account.account_id).start(), timeout=60
+        )
+
+    port = free_port()
+    path = f"/{run.TOKEN}"
+    server = run.start_webhook(
+        updater, "127.0.0.1", port, f"http://127.0.0.1:{port}{path}"
+    )
+    legs = TAKE_PROFITS * len(run.settings.accounts)
+    updates = synthetic_updates(
+        int(args.rate * args.seconds), args.chatter, args.chats, symbols
+    )
+    updates = redeliver(updates, args.redeliver)
+    print(
+        f"Posting {len(updates)} updates ({int(args.rate * args.seconds)} signals) "
+        f"to {len(run.settings.accounts)} account(s) ...",
+        file=sys.stderr,
+    )
+    # chatter is posted between signals, the signal rate stays at --rate
+    posted, failedPosts, _ = post_updates(
+        port, path, updates, len(updates) / args.seconds
+    )
+    wait_for_orders(broker, posted, legs, args.drain)
+    results = summarize(broker, posted, failedPosts, legs, len(updates))
+
+    run.stop_webhook(updater, server)
+    try:
+        run.event_loop.run(run.signal_queue.stop(), timeout=30)
+    except Exception as e:
+        print(f"Error stopping the signal queue: {e}", file=sys.stderr)
+    for manager in list(run.connection_managers.values()):
+        run.event_loop.run(manager.close(), timeout=30)
+    run.event_loop.stop()
+    run.reply_sender.stop(timeout=1)
+
+    table = PrettyTable(["Metric", "Value"])
+    table.align = "r"
+    table.align["Metric"] = "l"
+    for name, value in results.items():
+        if name.endswith("rate"):
+            table.add_row([name, f"{value:.2%}"])
+        else:
+            table.add_row(
+                [name, f"{value:,.1f}" if isinstance(value, float) else value]
+            )
+    print(table)
+
+    stages = PrettyTable(["Stage", "Count", "p50 ms", "p99 ms", "Max ms"])
+    stages.align = "r"
+    stages.align["Stage"] = "l"
+    for stage, stats in run.latency_stats.summary().items():
+        stages.add_row(
+            [stage, stats["count"]]
+            + [f"{stats[field] * 1000:.1f}" for field in ("p50", "p99", "max")]
+        )
+    print(stages)
+    print(
+        "Queue:",
+        dict(run.signal_queue.counters),
+        "Webhook:",
+        dict(run.webhook_counters),
+        "Telegram calls:",
+        dict(request.calls),
+    )
+
+    results["queue"] = dict(run.signal_queue.counters)
+    results["webhook"] = dict(run.webhook_counters)
+    results["telegram calls"] = dict(request.calls)
+    results["broker calls"] = dict(broker.calls)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+    failed = []
+    if args.max_p99 is not None and results["latency p99 ms"] > args.max_p99:
+        failed.append(
+            f"p99 latency {results['latency p99 ms']:.1f} ms > {args.max_p99}"
+        )
+    if args.min_rate is not None and results["signals/s"] < args.min_rate:
+        failed.append(f"{results['signals/s']:.1f} signals/s < {args.min_rate}")
+    for message in failed:
+        print(f"FAILED: {message}", file=sys.stderr)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -2,11 +2,25 @@
 import asyncio
 import logging
 import math
+import operator
 import os
 import re
 import json
+import hashlib
+import hmac
+import html
+import time
+import threading
+import secrets
+import numpy as np
 import pytz
 import configparser
+import contextlib
+import types
+import uuid
+from collections import Counter, OrderedDict, defaultdict, deque, namedtuple
+from dataclasses import dataclass, fields
+from typing import List, Optional, Union
 
 
 try:
@@ -14,9 +28,11 @@ try:
 except ImportError:
     from typing_extensions import Literal
 
-from metaapi_cloud_sdk import MetaApi
+from aiohttp import web
+from metaapi_cloud_sdk import MetaApi, SynchronizationListener
 from prettytable import PrettyTable
 from telegram import ParseMode, Update, InlineKeyboardButton, InlineKeyboardMarkup
+from telegram.error import RetryAfter
 from telegram.ext import (
     CommandHandler,
     Filters,
@@ -26,12 +42,26 @@ from telegram.ext import (
     CallbackContext,
     CallbackQueryHandler,
     ContextTypes,
+    Dispatcher,
 )
 from datetime import datetime
+from signal import SIGABRT, SIGINT, SIGTERM, signal as handle_signal
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 
 
-config = configparser.ConfigParser()
-config.read("/etc/secrets/secret_telegramtomt4.env")
+CONFIG_FILE = os.environ.get("CONFIG_FILE", "/etc/secrets/secret_telegramtomt4.env")
+# values changed with /updateenv are written here and read on top of CONFIG_FILE
+CONFIG_OVERRIDE_FILE = os.environ.get("CONFIG_OVERRIDE_FILE", "my_secret.env")
+
+
+def read_config() -> configparser.ConfigParser:
+    """Reads CONFIG_FILE and then CONFIG_OVERRIDE_FILE, later values win."""
+    parser = configparser.ConfigParser()
+    parser.read([CONFIG_FILE, CONFIG_OVERRIDE_FILE])
+    return parser
+
+
+config = read_config()
 
 # Define states for the conversation
 SELECT_OPTION, WAIT_FOR_ID, INPUT_TEXT, ACTION_SELECT = range(4)
@@ -70,16 +100,24 @@ SELECT_OPTION, WAIT_FOR_ID, INPUT_TEXT, ACTION_SELECT = range(4)
     "pending_order",
 )
 
-# Create a list to store selected option and IDs
-selected_data = {"option": None, "ids": []}
-
-
 # MetaAPI Credentials
 API_KEY = config["MetaAPI"]["API_KEY"]
 ACCOUNT_ID = config["MetaAPI"]["ACCOUNT_ID"]
-# Risk factor
-RISK_FACTOR = float(config["MetaAPI"]["RISK_FACTOR"])
-RISK_PERTRADE = float(config["MetaAPI"]["RISK_PERTRADE"])
+# Shared connection keep-alive / reconnect settings (seconds)
+HEALTH_CHECK_INTERVAL = float(config["MetaAPI"].get("HEALTH_CHECK_INTERVAL", "30"))
+HEALTH_CHECK_TIMEOUT = float(config["MetaAPI"].get("HEALTH_CHECK_TIMEOUT", "10"))
+RECONNECT_ATTEMPTS = int(config["MetaAPI"].get("RECONNECT_ATTEMPTS", "5"))
+RECONNECT_BACKOFF = float(config["MetaAPI"].get("RECONNECT_BACKOFF", "1"))
+RECONNECT_BACKOFF_MAX = float(config["MetaAPI"].get("RECONNECT_BACKOFF_MAX", "30"))
+# Maximum number of take profit orders of one signal submitted at the same time
+ORDER_CONCURRENCY = int(config["MetaAPI"].get("ORDER_CONCURRENCY", "5"))
+# Maximum number of position operations in flight for one bulk command
+BULK_CONCURRENCY = int(config["MetaAPI"].get("BULK_CONCURRENCY", "10"))
+# Seconds before cached broker symbol specifications are refreshed
+SYMBOL_SPEC_TTL = float(config["MetaAPI"].get("SYMBOL_SPEC_TTL", "3600"))
+# Stream prices of all SYMBOLS into memory; quotes older than QUOTE_MAX_AGE seconds are fetched again
+STREAM_QUOTES = config["MetaAPI"].get("STREAM_QUOTES", "Y")
+QUOTE_MAX_AGE = float(config["MetaAPI"].get("QUOTE_MAX_AGE", "5"))
 
 
 # Telegram Credentials
@@ -87,14 +125,24 @@ TOKEN = config["Telegram"]["TOKEN"]
 TELEGRAM_USER = config["Telegram"]["TELEGRAM_USER"].split(",")
 AUTHORIZED_USERS = TELEGRAM_USER
 CHANNEL_USER = config["Telegram"]["CHANNEL_USER"]
+# Outgoing message limits: messages per second for the whole bot and for one chat
+SEND_RATE_GLOBAL = float(config["Telegram"].get("SEND_RATE_GLOBAL", "25"))
+SEND_RATE_CHAT = float(config["Telegram"].get("SEND_RATE_CHAT", "1"))
+SEND_BURST_CHAT = int(config["Telegram"].get("SEND_BURST_CHAT", "3"))
+# Dispatcher threads for handlers registered with run_async
+DISPATCHER_WORKERS = int(config["Telegram"].get("DISPATCHER_WORKERS", "8"))
+# secret_token registered with setWebhook: Telegram sends it with every update and
+# other requests to the webhook are refused; a random one is made at start when empty
+WEBHOOK_SECRET = config["Telegram"].get("WEBHOOK_SECRET") or secrets.token_urlsafe(32)
 
 
 # Render Credentials
 APP_URL = config["Render"]["APP_URL"]
 # Port number for Telegram bot web hook
 PORT = int(config["Render"].get("PORT", "8443"))
-PLAN = config["Render"].get("PLAN", "A")
-TRAILINGSTOP = config["Render"].get("TRAILING_STOP", "Y")
+# Prometheus style latency metrics at http://METRICS_HOST:METRICS_PORT/metrics (0 = off)
+METRICS_HOST = config["Render"].get("METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(config["Render"].get("METRICS_PORT", "9100"))
 
 # Enables logging
 logging.basicConfig(
@@ -105,47 +153,132 @@ logger = logging.getLogger(__name__)
 # possibles states for conversation handler
 CALCULATE, TRADE, DECISION, ERROR = range(4)
 
-# allowed FX symbols
-# Đọc các biến từ file .env và chuyển thành danh sách
-SYMBOLS = config["Bot"].get("SYMBOLS").split(",")
-SYMBOLSPLUS = config["Bot"].get("SYMBOLSPLUS").split(",")
-TYPETRADE = config["Bot"].get("TYPETRADE").split(",")
-OTHER = config["Bot"].get("OTHER").split(",")
-
-
-def update_env(text):
-    """Cập nhật các biến môi trường từ text.
+# Symbols, order types, risk, PLAN and TRAILING_STOP live in the reloadable `settings`
+# snapshot below; seconds between checks of the config files for changes (0 = off)
+CONFIG_WATCH_INTERVAL = float(config["Bot"].get("CONFIG_WATCH_INTERVAL", "30"))
+# length bounds of a message that can be a signal (characters)
+SIGNAL_MIN_LENGTH = int(config["Bot"].get("SIGNAL_MIN_LENGTH", "10"))
+SIGNAL_MAX_LENGTH = int(config["Bot"].get("SIGNAL_MAX_LENGTH", "2000"))
+# repeats of a signal from the same chat within DEDUPE_WINDOW seconds are not traded again;
+# with DEDUPE_FILE the remembered signals survive restarts (e.g. on a Render disk)
+DEDUPE_WINDOW = float(config["Bot"].get("DEDUPE_WINDOW", "600"))
+DEDUPE_MAX = int(config["Bot"].get("DEDUPE_MAX", "1000"))
+DEDUPE_FILE = config["Bot"].get("DEDUPE_FILE", "")
+# signal work queue: concurrent workers, waiting signals and what to do when it is full
+SIGNAL_WORKERS = int(config["Bot"].get("SIGNAL_WORKERS", "4"))
+SIGNAL_QUEUE_SIZE = int(config["Bot"].get("SIGNAL_QUEUE_SIZE", "50"))
+SIGNAL_OVERFLOW = config["Bot"].get("SIGNAL_OVERFLOW", "REJECT").upper()
+# durations kept per stage of the signal path for the latency percentiles
+LATENCY_SAMPLES = int(config["Bot"].get("LATENCY_SAMPLES", "1000"))
+# update_ids accepted by the webhook, so updates Telegram delivers again are dropped;
+# with UPDATE_SEEN_FILE they survive restarts (e.g. on a Render disk)
+UPDATE_SEEN_MAX = int(config["Bot"].get("UPDATE_SEEN_MAX", "10000"))
+UPDATE_SEEN_FILE = config["Bot"].get("UPDATE_SEEN_FILE", "")
+# seconds acknowledged updates get to reach the dispatcher when the bot stops
+WEBHOOK_DRAIN_TIMEOUT = float(config["Bot"].get("WEBHOOK_DRAIN_TIMEOUT", "10"))
+
+
+def update_env(update: Update, context: CallbackContext) -> int:
+    """Cập nhật các biến môi trường từ text rồi nạp lại cấu hình.
+
+    Mỗi dòng NAME = value được ghi vào CONFIG_OVERRIDE_FILE, trong section chứa NAME.
+    Dòng Account:<name>.NAME = value ghi vào section [Account:<name>] của tài khoản đó.
 
-    Args:
-      text: Đoạn text chứa các biến môi trường.
-
-    Returns:
-      None.
+    Arguments:
+      update: update from Telegram, its text holds the NAME = value lines
+      context: CallbackContext object that stores commonly used objects in handler callbacks
     """
 
-    # Tạo đối tượng configparser.
-    config = configparser.ConfigParser()
+    # Cấu hình hiện tại để biết mỗi biến thuộc section nào.
+    current = read_config()
 
-    # Đọc tệp cấu hình my_secret.
-    config.read("/etc/secrets/my_secret.env")
+    # Đọc tệp cấu hình override.
+    override = configparser.ConfigParser()
+    override.read(CONFIG_OVERRIDE_FILE)
 
     # Xử lý text.
-    for line in text.splitlines():
+    updated, unknown, kept = [], [], {}
+    for line in update.effective_message.text.splitlines():
         # Tìm kiếm một biến môi trường hợp lệ.
-        match = re.match(r"([A-Za-z0-9_]+)\s*=\s*(.*)", line)
+        match = re.match(
+            r"(?:(%s[^.=]+)\.)?([A-Za-z0-9_]+)\s*=\s*(.*)" % ACCOUNT_SECTION_PREFIX,
+            line.strip(),
+        )
         if match:
             # Lấy tên và giá trị của biến môi trường.
-            name = match.group(1)
-            value = match.group(2)
+            name = match.group(2)
+            value = match.group(3).strip()
+
+            if match.group(1):
+                # biến riêng của một tài khoản, section phải có sẵn
+                section = (
+                    ACCOUNT_SECTION_PREFIX
+                    + match.group(1)[len(ACCOUNT_SECTION_PREFIX) :].strip()
+                )
+                if not current.has_section(section) or name.upper() not in ACCOUNT_KEYS:
+                    unknown.append(f"{match.group(1)}.{name}")
+                    continue
+                label = f"{section}.{name}"
+            else:
+                # Tìm kiếm biến môi trường trong tệp cấu hình.
+                section = next(
+                    (s for s in current.sections() if current.has_option(s, name)),
+                    None,
+                )
+                if section is None:
+                    unknown.append(name)
+                    continue
+                label = name
+                if name.upper() in ACCOUNT_KEYS:
+                    # tài khoản có giá trị riêng không nhận giá trị mặc định mới
+                    kept[name] = [
+                        s[len(ACCOUNT_SECTION_PREFIX) :].strip()
+                        for s in current.sections()
+                        if s.startswith(ACCOUNT_SECTION_PREFIX)
+                        and current.has_option(s, name)
+                    ]
+
+            # Cập nhật giá trị của biến môi trường.
+            for parser in (current, override):
+                if not parser.has_section(section):
+                    parser.add_section(section)
+                parser[section][name] = value
+            updated.append(label)
+
+    if not updated:
+        reply(update, "No known settings found, nothing changed.")
+        return ConversationHandler.END
 
-            # Tìm kiếm biến môi trường trong tệp cấu hình.
-            if name in config:
-                # Cập nhật giá trị của biến môi trường.
-                config[name] = value
+    # kiểm tra giá trị mới trước khi ghi, cấu hình đang chạy giữ nguyên nếu sai
+    try:
+        ConfigSnapshot.from_config(current)
+    except Exception as e:
+        reply(update, f"Invalid settings, nothing changed: {e}")
+        return ConversationHandler.END
 
     # Ghi lại các thay đổi vào tệp cấu hình.
-    with open("/etc/secrets/my_secret.env", "w") as f:
-        config.write(f)
+    with open(CONFIG_OVERRIDE_FILE, "w") as f:
+        override.write(f)
+
+    lines = [f"Updated: {', '.join(updated)}"]
+    if unknown:
+        lines.append(f"Unknown: {', '.join(unknown)}")
+    for name, accounts in kept.items():
+        if accounts:
+            lines.append(
+                f"Only the default {name} changed, kept by: {', '.join(accounts)}"
+                f" (use Account:<name>.{name} = value)"
+            )
+    restart = [
+        label
+        for label in updated
+        if label.rsplit(".", 1)[-1].lower() not in RELOADABLE_KEYS
+    ]
+    if restart:
+        lines.append(f"Applied after a restart: {', '.join(restart)}")
+    lines.append(describe_reload())
+    reply(update, "\n".join(lines))
+    return ConversationHandler.END
 
 
 def command_updateenv(update: Update, context: CallbackContext) -> int:
@@ -155,9 +288,15 @@ def command_updateenv(update: Update, context: CallbackContext) -> int:
       updates: update from Telegram
       context: CallbackContext object that stores commonly used objects in handler callbacks
     """
+    user_username = update.effective_message.chat.username
+    if user_username not in AUTHORIZED_USERS:
+        reply(update, "You are not authorized to use this bot! 🙅🏽‍♂️")
+        return ConversationHandler.END
 
-    update.effective_message.reply_text(
-        "Please enter the text to update the environment."
+    reply(
+        update,
+        "Please enter the text to update the environment, one NAME = value per line."
+        " Use Account:<name>.NAME = value for one account's own setting.",
     )
 
     return INPUT_TEXT
@@ -180,9 +319,7 @@ def menu_button(update: Update, context: CallbackContext) -> int:
             ],
         ]
     )
-    update.effective_message.reply_text(
-        "Please choose an option:", reply_markup=reply_markup
-    )
+    reply(update, "Please choose an option:", reply_markup=reply_markup)
     return SELECT_OPTION
 
 
@@ -196,51 +333,33 @@ def select_option(update: Update, context: CallbackContext) -> int:
     # text = update.message.text
     # update.effective_message.reply_text(text)
 
-    # Update selected_data based on user's choice
+    # Remembers the choice for this chat only; handle_ids reads it with the IDs
     if data == SELECT_TRAILING:
-        selected_data["option"] = TRAILING_STOP
+        context.chat_data["menu_option"] = TRAILING_STOP
         # Ask for IDs
-        update.effective_message.reply_text(
-            "Please send the position ID(s) separated by commas."
-        )
+        reply(update, "Please send the position ID(s) separated by commas.")
         return WAIT_FOR_ID
     elif data == SELECT_CLOSEFULL:
-        selected_data["option"] = CLOSE_POSITION
+        context.chat_data["menu_option"] = CLOSE_POSITION
         # Ask for IDs
-        update.effective_message.reply_text(
-            "Please send the position ID(s) separated by commas."
-        )
+        reply(update, "Please send the position ID(s) separated by commas.")
         return WAIT_FOR_ID
     elif data == SELECT_CLOSEPART:
-        selected_data["option"] = SELECT_CLOSEPART
+        context.chat_data["menu_option"] = SELECT_CLOSEPART
         # Ask for IDs
-        update.effective_message.reply_text(
-            "Please send the position ID(s) separated by commas."
-        )
+        reply(update, "Please send the position ID(s) separated by commas.")
         return WAIT_FOR_ID
     elif data == SELECT_INFO:
-        selected_data["option"] = ACCOUNT_INFO
-        update.effective_message.reply_text(
-            "OK! Check your account"
-        )
-        asyncio.run(account_info(update))
-        selected_data.clear()
+        reply(update, "OK! Check your account")
+        run_coroutine(account_info(update))
         return ConversationHandler.END
     elif data == SELECT_POSITION:
-        selected_data["option"] = OPENING_POSITION
-        update.effective_message.reply_text(
-            "OK! Check your opening position"
-        )
-        asyncio.run(open_trades(update, context))
-        selected_data.clear()
+        reply(update, "OK! Check your opening position")
+        run_coroutine(open_trades(update, context))
         return ConversationHandler.END
     elif data == SELECT_ORDER:
-        selected_data["option"] = PENDING_ORDER
-        update.effective_message.reply_text(
-            "OK! Check your pending order"
-        )
-        asyncio.run(pending_orders(update, context))
-        selected_data.clear()
+        reply(update, "OK! Check your pending order")
+        run_coroutine(pending_orders(update, context))
         return ConversationHandler.END
      
     return  ConversationHandler.END
@@ -250,46 +369,42 @@ def select_option(update: Update, context: CallbackContext) -> int:
 def handle_ids(update: Update, context: CallbackContext) -> None:
     # Extract IDs from the message
     ids = update.message.text
-    update.effective_message.reply_text(f" ids : " + ids)
-    # Store IDs in selected_data
-    selected_data["ids"] = ids
+    reply(update, f" ids : " + ids)
 
-    # Perform actions based on user's choice
-    option = selected_data["option"]
-    update.effective_message.reply_text(f" handle_ids option : " + option)
+    # Perform actions based on this chat's choice, which is consumed here
+    option = context.chat_data.pop("menu_option", None)
+    if option is None:
+        reply(update, "Please choose an option with /menu first.")
+        return ConversationHandler.END
+    reply(update, f" handle_ids option : " + option)
     if option == TRAILING_STOP:
         # Call your function to handle trailing stop
-        asyncio.run(trailing_stop(update, ids))
+        run_coroutine(trailing_stop(update, ids))
     elif option == CLOSE_POSITION:
         # Call your function to handle close position
-        asyncio.run(close_position(update, ids))
+        run_coroutine(close_position(update, ids))
     elif option == SELECT_CLOSEPART:
         # Call your function to handle close part position
-        asyncio.run(close_position_partially(update, ids))
-    # Reset selected_data for future use
-    selected_data.clear()
+        run_coroutine(close_position_partially(update, ids))
 
     return ConversationHandler.END
 
 
 # Function to handle IDs and perform actions
 def handle_selectaction(update: Update, context: CallbackContext) -> None:
-    # Perform actions based on user's choice
-    option = selected_data["option"]
+    # Perform actions based on this chat's choice, which is consumed here
+    option = context.chat_data.pop("menu_option", None)
     logger.info(f"--------------------------handle_selectaction-------------------------------:  {option}")
-    update.effective_message.reply_text(f" Action  : {option} ")
+    reply(update, f" Action  : {option} ")
     if option == ACCOUNT_INFO:
         # Call your function to handle account info
-        asyncio.run(account_info(update))
+        run_coroutine(account_info(update))
     elif option == OPENING_POSITION:
         # Call your function to handle opening position
-        asyncio.run(open_trades(update, context))
+        run_coroutine(open_trades(update, context))
     elif option == PENDING_ORDER:
         # Call your function to handle pending order
-        asyncio.run(pending_orders(update, context))
-
-    # Reset selected_data for future use
-    selected_data.clear()
+        run_coroutine(pending_orders(update, context))
 
     return ConversationHandler.END
 
@@ -352,6 +467,263 @@ def CheckSymbolStr(stringcheck, stringsrc) -> int:
     return checkstr
 
 
+class SymbolMatcher:
+    """Aho-Corasick automaton that finds many symbols in one scan of a text.
+
+    Built once from a pattern list (e.g. SYMBOLS); matching is linear in the length
+    of the text no matter how many symbols the broker list contains. Patterns and
+    text are compared in upper case, matches report the pattern as configured.
+
+    Arguments:
+        patterns: list of strings to search for
+    """
+
+    def __init__(self, patterns: list):
+        self.goto = [{}]
+        self.fail = [0]
+        self.output = [()]
+        for pattern in patterns:
+            if pattern:
+                self._insert(pattern)
+        self._build()
+
+    def _insert(self, pattern: str) -> None:
+        state = 0
+        for char in pattern.upper():
+            next_state = self.goto[state].get(char)
+            if next_state is None:
+                next_state = len(self.goto)
+                self.goto[state][char] = next_state
+                self.goto.append({})
+                self.fail.append(0)
+                self.output.append(())
+            state = next_state
+        self.output[state] += ((len(pattern), pattern),)
+
+    def _build(self) -> None:
+        # breadth first: fail links point to the longest proper suffix in the trie
+        queue = list(self.goto[0].values())
+        for state in queue:
+            for char, next_state in self.goto[state].items():
+                queue.append(next_state)
+                fail = self.fail[state]
+                while fail and char not in self.goto[fail]:
+                    fail = self.fail[fail]
+                self.fail[next_state] = self.goto[fail].get(char, 0)
+                self.output[next_state] += self.output[self.fail[next_state]]
+
+    def finditer(self, text: str):
+        """Yields (start, pattern) for every pattern occurrence in text."""
+        goto, fail, output = self.goto, self.fail, self.output
+        state = 0
+        for index, char in enumerate(text.upper()):
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            for length, pattern in output[state]:
+                yield index - length + 1, pattern
+
+    def find_longest(self, text: str):
+        """Returns the longest pattern found in text (leftmost on ties), or None.
+
+        Longest match disambiguates overlapping symbols, e.g. USDJPY over JPY.
+        """
+        best = None
+        bestStart = 0
+        for start, pattern in self.finditer(text):
+            if (
+                best is None
+                or len(pattern) > len(best)
+                or (len(pattern) == len(best) and start < bestStart)
+            ):
+                best, bestStart = pattern, start
+        return best
+
+    def contains_any(self, text: str) -> bool:
+        """Returns True if any pattern occurs in text."""
+        for _ in self.finditer(text):
+            return True
+        return False
+
+
+# config keys read into ConfigSnapshot; everything else needs a restart to change
+RELOADABLE_KEYS = {
+    "symbols",
+    "symbolsplus",
+    "typetrade",
+    "other",
+    "symbol_aliases",
+    "risk_factor",
+    "risk_pertrade",
+    "plan",
+    "trailing_stop",
+}
+
+
+# One MetaTrader account signals are copied to, with its own risk settings
+AccountSettings = namedtuple(
+    "AccountSettings",
+    ["name", "account_id", "risk_factor", "risk_per_trade", "plan", "trailing_stop"],
+)
+# [Account:<name>] sections list the accounts; without them [MetaAPI] ACCOUNT_ID trades
+ACCOUNT_SECTION_PREFIX = "Account:"
+# settings an [Account:<name>] section can set for itself
+ACCOUNT_KEYS = ("ACCOUNT_ID", "RISK_FACTOR", "RISK_PERTRADE", "PLAN", "TRAILING_STOP")
+
+
+def read_accounts(parser: configparser.ConfigParser, defaults: dict) -> tuple:
+    """Reads the [Account:<name>] sections, missing values come from defaults.
+
+    Arguments:
+        parser: parsed config files
+        defaults: RISK_FACTOR, RISK_PERTRADE, PLAN and TRAILING_STOP of the bot
+
+    Returns:
+        a tuple of AccountSettings; only the [MetaAPI] account without sections
+    """
+    accounts = []
+    for section in parser.sections():
+        if not section.startswith(ACCOUNT_SECTION_PREFIX):
+            continue
+        values = parser[section]
+        accounts.append(
+            AccountSettings(
+                name=section[len(ACCOUNT_SECTION_PREFIX) :].strip(),
+                account_id=values["ACCOUNT_ID"],
+                risk_factor=float(values.get("RISK_FACTOR", defaults["RISK_FACTOR"])),
+                risk_per_trade=float(
+                    values.get("RISK_PERTRADE", defaults["RISK_PERTRADE"])
+                ),
+                plan=values.get("PLAN", defaults["PLAN"]),
+                trailing_stop=values.get("TRAILING_STOP", defaults["TRAILING_STOP"]),
+            )
+        )
+    if not accounts:
+        accounts.append(
+            AccountSettings(
+                name="main",
+                account_id=parser["MetaAPI"]["ACCOUNT_ID"],
+                risk_factor=defaults["RISK_FACTOR"],
+                risk_per_trade=defaults["RISK_PERTRADE"],
+                plan=defaults["PLAN"],
+                trailing_stop=defaults["TRAILING_STOP"],
+            )
+        )
+    for account in accounts:
+        if account.plan not in ("A", "B"):
+            raise ValueError(f"PLAN of {account.name} must be A or B")
+        if account.trailing_stop not in ("Y", "N"):
+            raise ValueError(f"TRAILING_STOP of {account.name} must be Y or N")
+    accountIds = [account.account_id for account in accounts]
+    if len(set(accountIds)) != len(accountIds):
+        raise ValueError("An ACCOUNT_ID is listed in more than one account section")
+    return tuple(accounts)
+
+
+@dataclass(frozen=True)
+class ConfigSnapshot:
+    """Settings that can change while the bot runs, with the indexes built from them.
+
+    A snapshot is never modified. reload_config() builds a complete new one, symbol
+    automatons included, and swaps the module level `settings` reference, so code that
+    reads `cfg = settings` once works with one consistent version.
+    """
+
+    symbols: tuple
+    symbols_plus: tuple
+    type_trade: tuple
+    other: tuple
+    symbol_aliases: types.MappingProxyType
+    risk_factor: float
+    risk_per_trade: float
+    plan: str
+    trailing_stop: str
+    accounts: tuple
+    symbol_matcher: SymbolMatcher
+    symbolplus_matcher: SymbolMatcher
+    typetrade_matcher: SymbolMatcher
+    loaded_at: float
+
+    @classmethod
+    def from_config(cls, parser: configparser.ConfigParser) -> "ConfigSnapshot":
+        """Builds a snapshot from parsed config files, raising on invalid values."""
+        bot = parser["Bot"]
+        symbols = tuple(bot.get("SYMBOLS").split(","))
+        symbolsPlus = tuple(bot.get("SYMBOLSPLUS").split(","))
+        typeTrade = tuple(bot.get("TYPETRADE").split(","))
+        # Symbol aliases used by signal providers mapped to the broker symbol
+        aliases = {}
+        for pair in bot.get("SYMBOL_ALIASES", "GOLD:XAUUSD,NAS100:USTEC").split(","):
+            if pair.strip():
+                alias, symbol = pair.split(":", 1)
+                aliases[alias.strip().upper()] = symbol.strip().upper()
+        plan = parser["Render"].get("PLAN", "A")
+        if plan not in ("A", "B"):
+            raise ValueError(f"PLAN must be A or B, not {plan}")
+        trailingStop = parser["Render"].get("TRAILING_STOP", "Y")
+        if trailingStop not in ("Y", "N"):
+            raise ValueError(f"TRAILING_STOP must be Y or N, not {trailingStop}")
+        riskFactor = float(parser["MetaAPI"]["RISK_FACTOR"])
+        riskPerTrade = float(parser["MetaAPI"]["RISK_PERTRADE"])
+        accounts = read_accounts(
+            parser,
+            {
+                "RISK_FACTOR": riskFactor,
+                "RISK_PERTRADE": riskPerTrade,
+                "PLAN": plan,
+                "TRAILING_STOP": trailingStop,
+            },
+        )
+        return cls(
+            symbols=symbols,
+            symbols_plus=symbolsPlus,
+            type_trade=typeTrade,
+            other=tuple(bot.get("OTHER").split(",")),
+            symbol_aliases=types.MappingProxyType(aliases),
+            risk_factor=riskFactor,
+            risk_per_trade=riskPerTrade,
+            plan=plan,
+            trailing_stop=trailingStop,
+            accounts=accounts,
+            symbol_matcher=SymbolMatcher(symbols),
+            symbolplus_matcher=SymbolMatcher(symbolsPlus),
+            typetrade_matcher=SymbolMatcher(typeTrade),
+            loaded_at=time.time(),
+        )
+
+    def changes(self, previous: "ConfigSnapshot") -> list:
+        """Returns "name: old -> new" lines for settings that differ from previous."""
+        lines = []
+        for field in fields(self):
+            if field.name.endswith("_matcher") or field.name == "loaded_at":
+                continue
+            old, new = getattr(previous, field.name), getattr(self, field.name)
+            if old != new:
+                if isinstance(new, types.MappingProxyType):
+                    old, new = dict(old), dict(new)
+                lines.append(f"{field.name}: {old} -> {new}")
+        return lines
+
+
+# current settings; replaced as a whole by reload_config(), never modified in place
+settings = ConfigSnapshot.from_config(config)
+settings_lock = threading.Lock()
+
+
+def config_mtimes() -> tuple:
+    """Modification times of the config files (None for a missing file)."""
+    mtimes = []
+    for path in (CONFIG_FILE, CONFIG_OVERRIDE_FILE):
+        try:
+            mtimes.append(os.stat(path).st_mtime)
+        except OSError:
+            mtimes.append(None)
+    return tuple(mtimes)
+
+
+watched_mtimes = config_mtimes()
+
+
 def FindTP(alphacheck, signalsrc) -> float:
     arrayfind = []
     alphacheck = alphacheck.lower()
@@ -367,460 +739,1930 @@ def FindTP(alphacheck, signalsrc) -> float:
     return arrayfind
 
 
-def calculate_rr_coefficient(take_profit_pips, stop_loss_pips):
-    rr_coefficients = []
-
-    for tp in take_profit_pips:
-        rr_coefficient = float(tp / stop_loss_pips)
-        rr_coefficients.append(rr_coefficient)
-
-    return rr_coefficients
+PIPS_PATTERN = re.compile(
+    r"(pips|\(.+\))|(pip|\(.+\))|(scalper|\(.+\))|(intraday|\(.+\))|(swing|\(.+\))"
+)
 
 
 def remove_pips(signal):
-    temp = re.sub(
-        r"(pips|\(.+\))|(pip|\(.+\))|(scalper|\(.+\))|(intraday|\(.+\))|(swing|\(.+\))",
-        "",
-        signal,
-    )
+    temp = PIPS_PATTERN.sub("", signal)
     return temp
 
 
-# Lấy danh sách pending orders
-async def get_pending_orders(update: Update):
-    try:
-        api = MetaApi(API_KEY)
-        account = await api.metatrader_account_api.get_account(ACCOUNT_ID)
-        initial_state = account.state
-        deployed_states = ["DEPLOYING", "DEPLOYED"]
+class AsyncLoopThread:
+    """Runs one asyncio event loop in a daemon thread for the lifetime of the bot.
 
-        if initial_state not in deployed_states:
-            #  wait until account is deployed and connected to broker
-            logger.info("Deploying account")
-            await account.deploy()
+    python-telegram-bot callbacks are synchronous and run in dispatcher threads; they
+    submit coroutines here instead of calling asyncio.run(), so MetaApi connections,
+    caches and timers created on this loop survive between updates.
+    """
 
-        logger.info("Waiting for API server to connect to broker ...")
-        await account.wait_connected()
+    def __init__(self, name: str = "asyncio-loop"):
+        self.name = name
+        self.loop = asyncio.new_event_loop()
+        self._thread = None
+        self._start_lock = threading.Lock()
+
+    def _run(self, started: threading.Event) -> None:
+        asyncio.set_event_loop(self.loop)
+        self.loop.call_soon(started.set)
+        self.loop.run_forever()
+
+    def start(self) -> None:
+        with self._start_lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            started = threading.Event()
+            self._thread = threading.Thread(
+                target=self._run, args=(started,), name=self.name, daemon=True
+            )
+            self._thread.start()
+            started.wait()
 
-        # connect to MetaApi API
-        connection = account.get_rpc_connection()
-        await connection.connect()
+    def submit(self, coro):
+        """Schedules a coroutine on the loop and returns a concurrent.futures.Future."""
+        self.start()
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
 
-        # obtains account information from MetaTrader server
-        orders = await connection.get_orders()
-        return orders
-    except Exception as e:
-        print(f"Error getting pending orders: {e}")
-        update.effective_message.reply_text(f"Error getting open trades: {e}")
-        return []
+    def run(self, coro, timeout: float = None):
+        """Runs a coroutine on the loop and blocks the calling thread until it finishes."""
+        return self.submit(coro).result(timeout)
 
+    def stop(self) -> None:
+        if self._thread is None:
+            return
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join()
+        self._thread = None
 
-# Lấy danh sách open trades
-async def get_open_trades(update: Update):
-    try:
-        api = MetaApi(API_KEY)
-        account = await api.metatrader_account_api.get_account(ACCOUNT_ID)
-        initial_state = account.state
-        deployed_states = ["DEPLOYING", "DEPLOYED"]
 
-        if initial_state not in deployed_states:
-            #  wait until account is deployed and connected to broker
-            logger.info("Deploying account")
-            await account.deploy()
+event_loop = AsyncLoopThread()
 
-        logger.info("Waiting for API server to connect to broker ...")
-        await account.wait_connected()
 
-        # connect to MetaApi API
-        connection = account.get_rpc_connection()
-        await connection.connect()
+def run_coroutine(coro, timeout: float = None):
+    """Runs a coroutine on the shared background event loop from a sync handler."""
+    return event_loop.run(coro, timeout)
 
-        # wait until terminal state synchronized to the local state
 
-        # obtains account information from MetaTrader server
-        trades = await connection.get_positions()
-        return trades
-    except Exception as e:
-        logger.info(f"Error getting open trades: {e}")
-        update.effective_message.reply_text(f"Error getting open trades: {e}")
-        return []
+def log_future_error(future) -> None:
+    """Done-callback that logs the exception of a fire-and-forget submission."""
+    if not future.cancelled() and future.exception() is not None:
+        logger.error(f"Background task failed: {future.exception()}")
 
 
-def create_table(data, is_pending=True) -> PrettyTable:
-    try:
-        # Kiểm tra xem data có phải là chuỗi không
-        if isinstance(data, str):
-            # Nếu là chuỗi, chuyển đổi thành đối tượng Python
-            json_data = json.loads(data)
-        elif isinstance(data, list):
-            # Nếu là danh sách, sử dụng trực tiếp
-            json_data = data
-        else:
-            # Nếu không phải là chuỗi hoặc danh sách, xử lý lỗi hoặc trả về
-            raise ValueError("Invalid data format")
+# Stages of the signal path in the order they run, for /stats and /metrics
+LATENCY_STAGES = (
+    "webhook",
+    "screen",
+    "parse",
+    "dedupe",
+    "ack_reply",
+    "queue_wait",
+    "connection",
+    "account_info",
+    "symbol_spec",
+    "price",
+    "sizing",
+    "orders",
+    "total",
+    "wait_connected",
+    "wait_synchronized",
+    "telegram_send",
+)
 
-        table = PrettyTable()
-        headers = ["Id", "Type", "Symbol", "Size", "Entry", "SL", "TP", "Profit"]
-        table.align["Id"] = "l"
-        table.align["Type"] = "l"
-        table.align["Symbol"] = "l"
-        table.align["Size"] = "l"
-        table.align["Entry"] = "l"
-        table.align["SL"] = "l"
-        table.align["TP"] = "l"
-        table.align["Profit"] = "l"
-        if not is_pending:
-            data_key = "positions"
-            table.title = "Opening Trades"
-        else:
-            data_key = "orders"
-            table.title = "Pending Orders"
-            if "Profit" in headers:
-                headers.remove("Profit")
 
-        table.field_names = headers
-        total_profit = 0
-        for order_or_position in json_data:
-            # Truy cập thông tin từng vị thế hoặc order tùy thuộc vào loại dữ liệu
-            if data_key == "positions":
-                order_type = order_or_position.get("type", "")
-                profit_value = round(float(order_or_position.get("profit", 0)), 2)
-                if profit_value >= 0:
-                    profit_with_currency = f"{profit_value:,.2f} $"
-                else:
-                    profit_with_currency = f"{profit_value:,.2f} $"
-                if order_type.startswith("POSITION_TYPE_"):
-                    match = re.match(r"POSITION_TYPE_(.*)", order_type)
-                    if match:
-                        simplified_type = match.group(1)
-                row = [
-                    order_or_position.get("id", ""),
-                    simplified_type,
-                    order_or_position.get("symbol", ""),
-                    order_or_position.get("volume", ""),
-                    order_or_position.get("openPrice", ""),
-                    order_or_position.get("stopLoss", ""),
-                    order_or_position.get("takeProfit", ""),
-                    profit_with_currency,
-                ]
-                total_profit += float(order_or_position.get("profit", 0))
-            else:
-                order_type = order_or_position.get("type", "")
-                if order_type.startswith("ORDER_TYPE_"):
-                    match = re.match(r"ORDER_TYPE_(.*)", order_type)
-                    if match:
-                        simplified_type = match.group(1)
-                row = [
-                    order_or_position.get("id", ""),
-                    simplified_type,
-                    order_or_position.get("symbol", ""),
-                    order_or_position.get("volume", ""),
-                    order_or_position.get("openPrice", ""),
-                    order_or_position.get("stopLoss", ""),
-                    order_or_position.get("takeProfit", ""),
-                ]
-            table.add_row(row)
-            # Sort the table by the "Profit" column in descending order
+class LatencyStats:
+    """Durations of the stages of the signal path, summarized as percentiles.
 
-        if not is_pending:
-            total_profit_row = [
-                "TOTAL PROFIT",
-                "",
-                "",
-                "",
-                "",
-                "",
-                "",
-                f"{round(total_profit, 2)} $",
-            ]
-            table.add_row(total_profit_row)
-        return table
-    except Exception as e:
-        # Xử lý lỗi khi có vấn đề với định dạng dữ liệu
-        logger.info(f"Error creating table: {e}")
-        return None
+    The last `samples` durations of every stage are kept for the percentiles, counts
+    and sums cover the whole run. Safe to record from any thread.
 
+    Arguments:
+        samples: durations kept per stage
+    """
 
-async def pending_orders(update: Update, context: CallbackContext) -> None:
-    try:
-        countrow = 0
-        pending_orders_data = await get_pending_orders(update)
-        table = create_table(pending_orders_data)
-        countrow = len(table._rows)
-        update.effective_message.reply_text(f"Total Pending Orders: {countrow}")
-        batch_size = 30
-        # In các phần
-        for start in range(0, countrow, batch_size):
-            end = min(start + batch_size, countrow)
-            temp_table = table.get_string(start=start, end=end)
-            part_temp_table = f"<pre>{temp_table}</pre>"
-            update.effective_message.reply_text(
-                part_temp_table, parse_mode=ParseMode.HTML
-            )
-    except Exception as e:
-        update.effective_message.reply_text(f"Error pending orders: {e}")
+    def __init__(self, samples: int = LATENCY_SAMPLES):
+        self.samples = samples
+        self.outcomes = Counter()
+        self._recent = {}
+        self._count = Counter()
+        self._sum = defaultdict(float)
+        self._lock = threading.Lock()
+
+    def record(self, stage: str, seconds: float) -> None:
+        with self._lock:
+            recent = self._recent.get(stage)
+            if recent is None:
+                recent = self._recent[stage] = deque(maxlen=self.samples)
+            recent.append(seconds)
+            self._count[stage] += 1
+            self._sum[stage] += seconds
+
+    def count_outcome(self, outcome: str) -> None:
+        with self._lock:
+            self.outcomes[outcome] += 1
+
+    @contextlib.contextmanager
+    def time(self, stage: str):
+        """Records how long the with block took as stage."""
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self.record(stage, time.monotonic() - start)
 
+    def summary(self) -> dict:
+        """Returns {stage: {count, sum, p50, p95, p99, max}}, durations in seconds."""
+        with self._lock:
+            recent = {stage: sorted(values) for stage, values in self._recent.items()}
+            counts, sums = dict(self._count), dict(self._sum)
+        stages = [stage for stage in LATENCY_STAGES if stage in recent]
+        stages += sorted(set(recent) - set(LATENCY_STAGES))
+        summary = {}
+        for stage in stages:
+            values = recent[stage]
 
-async def open_trades(update: Update, context: CallbackContext) -> None:
-    try:
-        countrow = 0
-        open_trades_data = await get_open_trades(update)
-        table = create_table(open_trades_data, is_pending=False)
-        if len(table._rows) == 1:
-            countrow == 0
-        else:
-            countrow = len(table._rows)
-        update.effective_message.reply_text(f"Total Positions: {countrow}")
-        batch_size = 30
-        # In các phần
-        for start in range(0, countrow, batch_size):
-            end = min(start + batch_size, countrow)
-            temp_table = table.get_string(start=start, end=end)
-            part_temp_table = f"<pre>{temp_table}</pre>"
-            update.effective_message.reply_text(
-                part_temp_table, parse_mode=ParseMode.HTML
-            )
-    except Exception as e:
-        update.effective_message.reply_text(f"Error open trades: {e}")
+            def percentile(p):
+                return values[min(len(values) - 1, int(p * len(values)))]
 
+            summary[stage] = {
+                "count": counts[stage],
+                "sum": sums[stage],
+                "p50": percentile(0.50),
+                "p95": percentile(0.95),
+                "p99": percentile(0.99),
+                "max": values[-1],
+            }
+        return summary
 
-# Function to handle the /trailingstop command
-async def trailing_stop(update: Update, args) -> None:
-    # Get the string of position IDs from the command arguments
-    if not args:
-        update.effective_message.reply_text("Please provide a list of position IDs.")
-        return
 
-    # Combine the arguments into a single string, then split it into a list of position IDs
-    position_ids = "".join(args).split(",")
-
-    api = MetaApi(API_KEY)
-    account = await api.metatrader_account_api.get_account(ACCOUNT_ID)
-    initial_state = account.state
-    deployed_states = ["DEPLOYING", "DEPLOYED"]
-
-    if initial_state not in deployed_states:
-        #  wait until account is deployed and connected to broker
-        logger.info("Deploying account")
-        await account.deploy()
-
-    logger.info("Waiting for API server to connect to broker ...")
-    await account.wait_connected()
-
-    # connect to MetaApi API
-    connection = account.get_rpc_connection()
-    await connection.connect()
-    await connection.wait_synchronized()
-    # Process each position ID
-    for position_id in position_ids:
-        try:
-            # Convert position ID to an integer (assuming it's a valid integer)
-            intposition_id = str(position_id)
+latency_stats = LatencyStats()
 
-            # Get position information
-            position = await connection.get_position(intposition_id)
-            # Modify the position with trailing stop parameters
 
-            # Check if stopLoss exists, set to its value or None
-            stopLoss = position["stopLoss"] if "stopLoss" in position else None
+class SignalTrace:
+    """Timing spans of one signal, from the Telegram message to the placed orders.
 
-            # Check if takeProfit exists, set to its value or None
-            takeProfit = position["takeProfit"] if "takeProfit" in position else None
+    The correlation id ties the log lines of a signal together across the dispatcher
+    thread and the event loop. Every span also goes into latency_stats; finish() logs
+    the whole breakdown on one line.
 
-            # Modify the position with trailing stop parameters
-            await connection.modify_position(
-                intposition_id,
-                stop_loss=position["openPrice"],  # Set stopLoss to the openPrice
-                take_profit=takeProfit,  # Set takeProfit to its existing value or None if it doesn't exist
-            )
+    Arguments:
+        stats: LatencyStats the spans are recorded in
+    """
 
-            update.effective_message.reply_text(
-                f"Trailing stop set for position ID ({intposition_id}) - Change SL :  {stopLoss} to Entry: {position['openPrice']}. Successfully"
-            )
+    def __init__(self, stats: LatencyStats = None):
+        self.id = uuid.uuid4().hex[:8]
+        self.stats = stats or latency_stats
+        self.started_at = time.monotonic()
+        self.spans = []
+        self.finished = False
+
+    def add(self, stage: str, seconds: float, account: str = None) -> None:
+        # stats are per stage, the log line tells the accounts of a signal apart
+        label = f"{stage}[{account}]" if account else stage
+        self.spans.append((label, seconds))
+        self.stats.record(stage, seconds)
+        logger.debug(f"signal={self.id} stage={label} ms={seconds * 1000:.1f}")
+
+    @contextlib.contextmanager
+    def span(self, stage: str, account: str = None):
+        """Records how long the with block took as stage of this signal."""
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self.add(stage, time.monotonic() - start, account)
+
+    def finish(self, outcome: str) -> None:
+        """Records the total time and logs the spans; later calls are ignored."""
+        if self.finished:
+            return
+        self.finished = True
+        self.add("total", time.monotonic() - self.started_at)
+        self.stats.count_outcome(outcome)
+        spans = " ".join(
+            f"{stage}={seconds * 1000:.1f}ms" for stage, seconds in self.spans
+        )
+        logger.info(f"signal={self.id} outcome={outcome} {spans}")
 
-        except ValueError:
-            update.effective_message.reply_text(
-                f"Invalid position ID: {intposition_id}. Please provide valid integers."
-            )
-        except Exception as e:
-            update.effective_message.reply_text(
-                f"Error TrailingStop Position ID {position_id}: {str(e)}."
-            )
 
+# Telegram rejects messages longer than this
+MESSAGE_LIMIT = 4096
 
-async def close_position(update: Update, args) -> None:
-    # Get the string of position IDs from the command arguments
-    if not args:
-        update.effective_message.reply_text("Please provide a list of position IDs.")
-        return
-    # Lấy chuỗi từ args
-    command_str = args
-    # Tách chuỗi thành danh sách các ID, tách bởi dấu phẩy
-    position_ids = command_str.split(",")
-    if not position_ids:
-        update.effective_message.reply_text("Please provide a list of position IDs.")
-        return
 
-    api = MetaApi(API_KEY)
-    account = await api.metatrader_account_api.get_account(ACCOUNT_ID)
-    initial_state = account.state
-    deployed_states = ["DEPLOYING", "DEPLOYED"]
+class TokenBucket:
+    """Allows rate events per second with bursts of up to burst events."""
 
-    if initial_state not in deployed_states:
-        # Wait until account is deployed and connected to the broker
-        logger.info("Deploying account")
-        await account.deploy()
+    def __init__(self, rate: float, burst: int = 1):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated_at = time.monotonic()
 
-    logger.info("Waiting for API server to connect to the broker ...")
-    await account.wait_connected()
+    def wait_time(self, now: float) -> float:
+        """Seconds until one token is available."""
+        self.tokens = min(self.burst, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
 
-    # Connect to MetaApi API
-    connection = account.get_rpc_connection()
-    await connection.connect()
-    await connection.wait_synchronized()
+    def take(self) -> None:
+        self.tokens -= 1
 
-    # Process each position ID
-    for position_id in position_ids:
-        try:
-            # Close position
-            await connection.close_position(position_id)
-            update.effective_message.reply_text(
-                f"Closed Position ID {position_id} successfully."
-            )
 
-        except ValueError:
-            update.effective_message.reply_text(
-                f"Invalid Position ID: {position_id}. Please provide valid integers."
-            )
-        except Exception as e:
-            update.effective_message.reply_text(
-                f"Error closing Position ID {position_id}: {str(e)}."
-            )
+class ReplySender:
+    """Sends replies from a background thread within Telegram's rate limits.
 
+    Handlers enqueue replies and carry on with trading work. Messages keep their order
+    within a chat, each chat is limited to SEND_RATE_CHAT messages per second (bursts of
+    SEND_BURST_CHAT) and the bot to SEND_RATE_GLOBAL. Flood control answers
+    (RetryAfter) pause the chat and the message is retried.
+    """
 
-async def close_position_partially(update: Update, args) -> None:
-    # Get the string of position IDs and sizes from the command arguments
-    if not args or "|" not in args:
-        update.effective_message.reply_text(
-            "Please provide a list of position IDs and sizes separated by '|'."
+    def __init__(
+        self,
+        global_rate: float = SEND_RATE_GLOBAL,
+        chat_rate: float = SEND_RATE_CHAT,
+        chat_burst: int = SEND_BURST_CHAT,
+    ):
+        self.global_rate = global_rate
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self._global = TokenBucket(global_rate, max(1, int(global_rate)))
+        self._chats = {}
+        self._buckets = {}
+        self._condition = threading.Condition()
+        self._thread = None
+        self._running = False
+
+    def start(self) -> None:
+        with self._condition:
+            if self._running:
+                return
+            self._running = True
+        self._thread = threading.Thread(
+            target=self._run, name="reply-sender", daemon=True
         )
-        return
-
-    # Split the arguments into position IDs and sizes
-    position_args = args.split("|")
-    listID = position_args[0].split(",")
-    # listID_str = ', '.join(map(str, listID))
-    # update.effective_message.reply_text(f"List ID: {listID_str}.")
-    listSize = list(map(float, position_args[1].split(",")))
-    api = MetaApi(API_KEY)
-    account = await api.metatrader_account_api.get_account(ACCOUNT_ID)
-    initial_state = account.state
-    deployed_states = ["DEPLOYING", "DEPLOYED"]
-
-    if initial_state not in deployed_states:
-        #  wait until account is deployed and connected to broker
-        logger.info("Deploying account")
-        await account.deploy()
-
-    logger.info("Waiting for API server to connect to broker ...")
-    await account.wait_connected()
-
-    # connect to MetaApi API
-    connection = account.get_rpc_connection()
-    await connection.connect()
-    await connection.wait_synchronized()
-    # Process each position ID and size
-    for i, position_id in enumerate(listID):
-        try:
-            # Kiểm tra nếu không tồn tại phần tử tương ứng trong listSize
-            if i >= len(listSize):
-                update.effective_message.reply_text(
-                    f"No size provided for Position ID {position_id}."
+        self._thread.start()
+
+    def stop(self, timeout: float = 10) -> None:
+        """Sends what is still queued, then stops the sender thread."""
+        with self._condition:
+            self._running = False
+            self._condition.notify()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def send(self, message, text: str, **kwargs) -> None:
+        """Queues message.reply_text(text, **kwargs); sends inline when not started."""
+        if not self._running:
+            message.reply_text(text, **kwargs)
+            return
+        with self._condition:
+            self._chats.setdefault(message.chat_id, []).append((message, text, kwargs))
+            self._condition.notify()
+
+    def _next(self):
+        # returns (wait, chat_id): the chat that may send first and how long until it may
+        now = time.monotonic()
+        best = None
+        for chat_id in self._chats:
+            bucket = self._buckets.setdefault(
+                chat_id, TokenBucket(self.chat_rate, self.chat_burst)
+            )
+            wait = bucket.wait_time(now)
+            if best is None or wait < best[0]:
+                best = (wait, chat_id)
+        if best is None:
+            return None
+        return max(best[0], self._global.wait_time(now)), best[1]
+
+    def _run(self) -> None:
+        while True:
+            with self._condition:
+                while True:
+                    nextChat = self._next()
+                    if nextChat is None:
+                        if not self._running:
+                            return
+                        self._condition.wait()
+                    elif nextChat[0] > 0:
+                        self._condition.wait(nextChat[0])
+                    else:
+                        break
+                chat_id = nextChat[1]
+                message, text, kwargs = self._chats[chat_id][0]
+                self._buckets[chat_id].take()
+                self._global.take()
+            try:
+                with latency_stats.time("telegram_send"):
+                    message.reply_text(text, **kwargs)
+            except RetryAfter as e:
+                logger.warning(
+                    f"Flood control for chat {chat_id}, retrying in {e.retry_after}s"
                 )
-                break
+                with self._condition:
+                    bucket = self._buckets[chat_id]
+                    bucket.tokens = 1 - e.retry_after * bucket.rate
+                    bucket.updated_at = time.monotonic()
+                continue
+            except Exception as e:
+                logger.error(f"Error sending reply to chat {chat_id}: {e}")
+            with self._condition:
+                queue = self._chats[chat_id]
+                queue.pop(0)
+                if not queue:
+                    del self._chats[chat_id]
+
+
+reply_sender = ReplySender()
+
+
+def reply(update: Update, text: str, **kwargs) -> None:
+    """Queues a reply to the message of update without waiting for Telegram."""
+    reply_sender.send(update.effective_message, text, **kwargs)
+
+
+def chunk_lines(lines: list, limit: int = MESSAGE_LIMIT) -> list:
+    """Joins lines into as few messages as possible, each at most limit characters."""
+    chunks = []
+    current = ""
+    for line in lines:
+        while len(line) > limit:
+            if current:
+                chunks.append(current)
+                current = ""
+            chunks.append(line[:limit])
+            line = line[limit:]
+        if current and len(current) + 1 + len(line) > limit:
+            chunks.append(current)
+            current = line
+        else:
+            current = f"{current}\n{line}" if current else line
+    if current:
+        chunks.append(current)
+    return chunks
 
-            size = float(listSize[i])
 
-            # Close a part of the position
-            await connection.close_position_partially(position_id, size)
+class ReplyBatch:
+    """Collects the status lines of one command and sends them as one message.
 
-            update.effective_message.reply_text(
-                f"Closed a part : {size} lot of Position ID : {position_id} successfully."
-            )
-        except ValueError:
-            update.effective_message.reply_text(
-                f"Invalid Position ID: {position_id}. Please provide valid integers."
-            )
-        except Exception as e:
-            update.effective_message.reply_text(
-                f"Error closing Position ID {position_id}: {str(e)}."
-            )
+    Used as a context manager, the lines are queued when the block ends, also when it
+    raises.
 
+    Arguments:
+        update: update from Telegram
+        header: optional first line of the message
+        kwargs: passed on to reply_text, e.g. parse_mode
+    """
 
-async def account_info(update: Update) -> None:
-    try:
-        # Đoạn mã JSON của bạn
-        api = MetaApi(API_KEY)
-        account = await api.metatrader_account_api.get_account(ACCOUNT_ID)
-        initial_state = account.state
-        deployed_states = ["DEPLOYING", "DEPLOYED"]
+    def __init__(self, update: Update, header: str = None, **kwargs):
+        self.update = update
+        self.lines = [header] if header else []
+        self.kwargs = kwargs
+
+    def add(self, line: str) -> None:
+        self.lines.append(line)
+
+    def flush(self) -> None:
+        for chunk in chunk_lines(self.lines):
+            reply(self.update, chunk, **self.kwargs)
+        self.lines = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.flush()
+        return False
+
+
+# Broker symbol specification kept in memory, tick_value is per tick and lot in account currency
+SymbolSpec = namedtuple(
+    "SymbolSpec",
+    [
+        "symbol",
+        "digits",
+        "point",
+        "tick_size",
+        "tick_value",
+        "contract_size",
+        "min_volume",
+        "volume_step",
+        "max_volume",
+        "updated_at",
+    ],
+)
 
-        if initial_state not in deployed_states:
-            #  wait until account is deployed and connected to broker
-            logger.info("Deploying account")
-            await account.deploy()
 
-        logger.info("Waiting for API server to connect to broker ...")
-        await account.wait_connected()
+def broker_symbols() -> list:
+    """SYMBOLS with provider aliases (GOLD, NAS100, ...) replaced by broker symbols."""
+    cfg = settings
+    return list(
+        dict.fromkeys(cfg.symbol_aliases.get(symbol, symbol) for symbol in cfg.symbols)
+    )
 
-        # connect to MetaApi API
-        connection = account.get_rpc_connection()
-        await connection.connect()
-        await connection.wait_synchronized()
-        account_information = await connection.get_account_information()
-        logger.info(f"Account Info : {account_information}")
-        # Tạo PrettyTable
-        table = PrettyTable(["Title", "Value"])
-        table.align["Title"] = "l"
-        table.align["Value"] = "l"
-        # Thêm dữ liệu vào PrettyTable
-        # Chọn các trường bạn muốn hiển thị
-        fields_to_display = [
-            "balance",
-            "equity",
-            "margin",
-            "freeMargin",
-            "leverage",
-            "marginLevel",
-        ]
 
-        # Thêm dữ liệu vào PrettyTable
-        for field in fields_to_display:
-            # Chuyển đổi tên trường thành tiếng Việt
-            field_name_vietnamese = {
-                "balance": "Balance - Số dư",
-                "equity": "Equity - Tài sản ròng",
-                "margin": "Margin - Tiền ký quỹ",
-                "freeMargin": "FreeMargin - Số dư margin",
-                "leverage": "Leverage - Đòn bẩy",
-                "marginLevel": "Margin Level - % ký quỹ",
-            }.get(field, field)
-            if field in ["balance", "equity", "margin", "freeMargin"]:
-                field_value = "$ {:,.2f}".format(account_information.get(field, 0))
-            elif field == "marginLevel":
-                field_value = "{:.2f} %".format(account_information.get(field, 0))
-            else:
-                field_value = account_information.get(field, 0)
-            table.add_row([field_name_vietnamese, field_value])
-        # Gửi bảng dưới dạng tin nhắn HTML
-        temp_table = f"<pre>{table}</pre>"
-        update.effective_message.reply_text(
-            f"<pre>{temp_table}</pre>", parse_mode=ParseMode.HTML
-            )
-    except Exception as e:
-        update.effective_message.reply_text(f"Error get Account Infomation: {str(e)}.")
+def pip_size(spec: SymbolSpec) -> float:
+    """Pip size from digits: 10 points for 2/3/5 digit quotes (XAUUSD, USDJPY, EURUSD)."""
+    if spec.digits in (2, 3, 5):
+        return spec.point * 10
+    return spec.point
 
-    def ButtonMenu(update, context):
+
+def pip_value(spec: SymbolSpec) -> float:
+    """Value of one pip for one lot in account currency."""
+    if spec.tick_value and spec.tick_size:
+        return spec.tick_value * pip_size(spec) / spec.tick_size
+    return pip_size(spec) * spec.contract_size
+
+
+def minimum_volumes(steps, min_volumes) -> np.ndarray:
+    """Smallest lot an order may have: the symbol minimum, else one volume step.
+
+    A step of 0 (no symbol specification) gives 0.01 lot.
+    """
+    steps = np.asarray(steps, dtype=float)
+    min_volumes = np.asarray(min_volumes, dtype=float)
+    return np.where(steps > 0, np.where(min_volumes > 0, min_volumes, steps), 0.01)
+
+
+def round_volumes(volumes, steps, min_volumes, max_volumes) -> np.ndarray:
+    """Floors lot sizes to their volume step within min/max volume, element-wise.
+
+    Arguments broadcast against volumes. A step of 0 (no symbol specification) floors
+    the volume to 0.01 lot with no maximum, as before specifications existed. Volumes
+    below the minimum lot come out as 0 (no order): rounding them up would risk more
+    than RISK_FACTOR/RISK_PERTRADE allow.
+    """
+    volumes = np.asarray(volumes, dtype=float)
+    steps = np.asarray(steps, dtype=float)
+    min_volumes = np.asarray(min_volumes, dtype=float)
+    max_volumes = np.asarray(max_volumes, dtype=float)
+    hasStep = steps > 0
+    safeSteps = np.where(hasStep, steps, 0.01)
+    # scaling by the step's decimals (0.01 -> 100) removes the float noise of n * step
+    scale = 10.0 ** np.where(
+        safeSteps < 1, np.maximum(0, -np.floor(np.log10(safeSteps))), 0
+    )
+    stepped = np.round(np.floor(volumes / safeSteps + 1e-9) * safeSteps * scale) / scale
+    rounded = np.where(hasStep, stepped, np.floor(volumes * 100) / 100)
+    rounded = np.where(
+        hasStep & (max_volumes > 0), np.minimum(rounded, max_volumes), rounded
+    )
+    below = rounded < minimum_volumes(steps, min_volumes) - 1e-9
+    return np.where(below, 0.0, rounded)
+
+
+def pip_parameters(trade: dict, spec: SymbolSpec = None) -> tuple:
+    """Pip size and value of one lot for the symbol of trade.
+
+    Without a broker specification the pip size is guessed from the symbol and entry
+    price and one pip of one lot is taken as 10 account currency units.
+    """
+    if spec is not None:
+        # pip size and pip value from the broker's symbol specification
+        return pip_size(spec), pip_value(spec)
+    if trade["Symbol"] == "XAUUSD":
+        multiplier = 0.1
+    elif trade["Symbol"] == "XAGUSD":
+        multiplier = 0.001
+    elif trade["Symbol"] in ["US30", "US500", "USTEC", "NAS100"]:
+        multiplier = 0.1
+    elif str(trade["Entry"]).index(".") >= 2:
+        multiplier = 0.01
+    else:
+        multiplier = 0.0001
+    return multiplier, 10
+
+
+# Sizing of one trade on one account, shared by CreateTable and build_leg_plan.
+# position_size is one volume for PLAN A and one per take profit for PLAN B;
+# volumes, losses and profits are per order leg (one leg per take profit).
+TradeSizing = namedtuple(
+    "TradeSizing",
+    [
+        "plan",
+        "pip_size",
+        "pip_value",
+        "stop_loss_pips",
+        "take_profit_pips",
+        "rr",
+        "position_size",
+        "volumes",
+        "losses",
+        "profits",
+    ],
+)
+
+
+def size_positions(
+    entries,
+    stop_losses,
+    take_profits,
+    balances,
+    risks,
+    plan_b,
+    pip_sizes,
+    pip_values,
+    volume_steps,
+    min_volumes,
+    max_volumes,
+) -> dict:
+    """Sizes every take profit leg of many trades in one pass.
+
+    Every argument has one row per trade (account), take_profits one column per take
+    profit. PLAN A risks balance * risks on the stop loss and splits the volume evenly
+    between the take profits; PLAN B sizes each take profit by its reward to risk
+    ratio times balance * risks. Rows with the stop loss at entry come out as inf/nan.
+
+    Legs are never rounded up to the minimum lot. PLAN A splits its volume over only
+    as many take profits as the minimum lot allows, from TP 1 on; a PLAN B leg below
+    the minimum lot is dropped. Dropped legs have volume 0.
+
+    Returns:
+        a dict of arrays: stop_loss_pips, position_size (PLAN A total per row),
+        and per leg take_profit_pips, rr, volumes, losses, profits
+    """
+    entries = np.asarray(entries, dtype=float)
+    pip_sizes = np.asarray(pip_sizes, dtype=float)
+    pip_values = np.asarray(pip_values, dtype=float)[:, None]
+    take_profits = np.asarray(take_profits, dtype=float)
+    limits = (
+        np.asarray(volume_steps, dtype=float)[:, None],
+        np.asarray(min_volumes, dtype=float)[:, None],
+        np.asarray(max_volumes, dtype=float)[:, None],
+    )
+
+    stopLossPips = np.abs(
+        np.round((np.asarray(stop_losses, dtype=float) - entries) / pip_sizes)
+    )
+    takeProfitPips = np.abs(
+        np.round((take_profits - entries[:, None]) / pip_sizes[:, None])
+    )
+    with np.errstate(divide="ignore", invalid="ignore"):
+        rr = takeProfitPips / stopLossPips[:, None]
+        riskVolume = (
+            np.asarray(balances, dtype=float)
+            * np.asarray(risks, dtype=float)
+            / stopLossPips
+        )[:, None] / pip_values
+        positionSize = round_volumes(riskVolume, *limits)
+        # as many legs as the minimum lot allows, the last take profits go first
+        legCount = np.minimum(
+            take_profits.shape[1],
+            np.floor(positionSize / minimum_volumes(*limits[:2]) + 1e-9),
+        )
+        evenLegs = np.where(
+            np.arange(take_profits.shape[1]) < legCount,
+            round_volumes(positionSize / np.maximum(legCount, 1), *limits),
+            0.0,
+        )
+        rrLegs = round_volumes(riskVolume * rr, *limits)
+        volumes = np.where(np.asarray(plan_b, dtype=bool)[:, None], rrLegs, evenLegs)
+        losses = volumes * pip_values * stopLossPips[:, None]
+        profits = volumes * pip_values * takeProfitPips
+    return {
+        "stop_loss_pips": stopLossPips,
+        "take_profit_pips": takeProfitPips,
+        "rr": rr,
+        "position_size": positionSize[:, 0],
+        "volumes": volumes,
+        "losses": losses,
+        "profits": profits,
+    }
+
+
+def size_trades(trades: list, balances: list, specs: list) -> list:
+    """Sizes one trade per account with a single size_positions pass.
+
+    All trades are copies of one signal, so they have the same number of take profits.
+
+    Arguments:
+        trades: trade dictionaries with Entry, StopLoss, TP, risk settings and Plan
+        balances: account balance of every trade
+        specs: broker SymbolSpec of every trade, or None
+
+    Returns:
+        a TradeSizing per trade
+    """
+    plans = [trade.get("Plan", settings.plan) for trade in trades]
+    pips = [pip_parameters(trade, spec) for trade, spec in zip(trades, specs)]
+    sized = size_positions(
+        [trade["Entry"] for trade in trades],
+        [trade["StopLoss"] for trade in trades],
+        [trade["TP"] for trade in trades],
+        balances,
+        [
+            trade["RiskPerTrade"] if plan == "B" else trade["RiskFactor"]
+            for trade, plan in zip(trades, plans)
+        ],
+        [plan == "B" for plan in plans],
+        [pipSize for pipSize, _ in pips],
+        [pipValue for _, pipValue in pips],
+        [spec.volume_step or 0 if spec is not None else 0 for spec in specs],
+        [spec.min_volume or 0 if spec is not None else 0 for spec in specs],
+        [spec.max_volume or 0 if spec is not None else 0 for spec in specs],
+    )
+    sizings = []
+    for row, (plan, (pipSize, pipValue)) in enumerate(zip(plans, pips)):
+        if sized["stop_loss_pips"][row] == 0:
+            raise ValueError("Stop loss is at the entry price")
+        volumes = sized["volumes"][row].tolist()
+        sizings.append(
+            TradeSizing(
+                plan=plan,
+                pip_size=pipSize,
+                pip_value=pipValue,
+                stop_loss_pips=int(sized["stop_loss_pips"][row]),
+                take_profit_pips=sized["take_profit_pips"][row].astype(int).tolist(),
+                rr=sized["rr"][row].tolist(),
+                position_size=(
+                    volumes if plan == "B" else float(sized["position_size"][row])
+                ),
+                volumes=volumes,
+                losses=sized["losses"][row].tolist(),
+                profits=sized["profits"][row].tolist(),
+            )
+        )
+    return sizings
+
+
+def skipped_legs(sizing: TradeSizing) -> list:
+    """Labels of the take profit legs sized below the minimum lot, not placed."""
+    return [
+        f"TP {count + 1}" for count, volume in enumerate(sizing.volumes) if not volume
+    ]
+
+
+class SymbolSpecCache:
+    """Broker symbol specifications (digits, point, tick value, contract size, lots).
+
+    Populated from the broker at startup and refreshed every SYMBOL_SPEC_TTL seconds,
+    so sizing and rounding read from memory instead of guessing or calling the broker.
+
+    Arguments:
+        ttl: seconds before an entry is refreshed
+    """
+
+    def __init__(self, ttl: float = SYMBOL_SPEC_TTL):
+        self.ttl = ttl
+        self._specs = {}
+
+    def get(self, symbol: str):
+        """Returns the cached SymbolSpec (possibly stale), or None."""
+        return self._specs.get(symbol)
+
+    def is_fresh(self, symbol: str) -> bool:
+        spec = self._specs.get(symbol)
+        return spec is not None and time.monotonic() - spec.updated_at < self.ttl
+
+    def update_tick_value(self, symbol: str, price: dict) -> None:
+        """Keeps the tick value current from a symbol price update."""
+        spec = self._specs.get(symbol)
+        tick_value = price.get("lossTickValue") or price.get("profitTickValue")
+        if spec is not None and tick_value:
+            self._specs[symbol] = spec._replace(tick_value=tick_value)
+
+    async def load(self, connection, symbol: str) -> SymbolSpec:
+        specification = await connection.get_symbol_specification(symbol)
+        price = await connection.get_symbol_price(symbol)
+        digits = specification.get("digits")
+        if digits is None:
+            digits = max(0, -math.floor(math.log10(specification["tickSize"])))
+        spec = SymbolSpec(
+            symbol=symbol,
+            digits=digits,
+            point=specification.get("point") or 10**-digits,
+            tick_size=specification.get("tickSize"),
+            tick_value=price.get("lossTickValue") or price.get("profitTickValue"),
+            contract_size=specification.get("contractSize"),
+            min_volume=specification.get("minVolume"),
+            volume_step=specification.get("volumeStep"),
+            max_volume=specification.get("maxVolume"),
+            updated_at=time.monotonic(),
+        )
+        self._specs[symbol] = spec
+        return spec
+
+    async def refresh(self, connection, symbols: list) -> None:
+        """Reloads the specifications of symbols, skipping ones the broker does not know."""
+        semaphore = asyncio.Semaphore(10)
+
+        async def load(symbol):
+            async with semaphore:
+                try:
+                    await self.load(connection, symbol)
+                except Exception as e:
+                    logger.info(f"No symbol specification for {symbol}: {e}")
+
+        await asyncio.gather(*(load(symbol) for symbol in symbols))
+        logger.info(f"Symbol specifications cached: {len(self._specs)}")
+
+    async def ensure(self, connection, symbol: str):
+        """Returns a fresh SymbolSpec for symbol, loading it if needed, or None."""
+        if not self.is_fresh(symbol):
+            try:
+                await self.load(connection, symbol)
+            except Exception as e:
+                logger.info(f"No symbol specification for {symbol}: {e}")
+        return self._specs.get(symbol)
+
+
+class QuoteCache:
+    """Last bid/ask per symbol with the time it was received.
+
+    Arguments:
+        max_age: seconds after which a quote is considered stale
+    """
+
+    def __init__(self, max_age: float = QUOTE_MAX_AGE):
+        self.max_age = max_age
+        self._quotes = {}
+
+    def update(self, price: dict) -> None:
+        self._quotes[price["symbol"]] = (price, time.monotonic())
+
+    def get(self, symbol: str, max_age: float = None):
+        """Returns the last price of symbol, or None if there is none or it is stale."""
+        quote = self._quotes.get(symbol)
+        if quote is None:
+            return None
+        price, receivedAt = quote
+        if max_age is None:
+            max_age = self.max_age
+        if time.monotonic() - receivedAt > max_age:
+            return None
+        return price
+
+    def age(self, symbol: str):
+        """Seconds since the last quote of symbol, or None."""
+        quote = self._quotes.get(symbol)
+        return None if quote is None else time.monotonic() - quote[1]
+
+
+class PriceListener(SynchronizationListener):
+    """Feeds streamed prices into the quote and symbol specification caches."""
+
+    def __init__(self, quotes: QuoteCache, symbol_specs: SymbolSpecCache):
+        super().__init__()
+        self.quotes = quotes
+        self.symbol_specs = symbol_specs
+
+    async def on_symbol_price_updated(self, instance_index: str, price: dict):
+        self.quotes.update(price)
+        self.symbol_specs.update_tick_value(price["symbol"], price)
+
+
+def format_age(seconds: float) -> str:
+    """Short human readable age: 4s, 3m 20s, 2h 5m."""
+    seconds = int(seconds)
+    if seconds < 60:
+        return f"{seconds}s"
+    if seconds < 3600:
+        return f"{seconds // 60}m {seconds % 60}s"
+    return f"{seconds // 3600}h {seconds % 3600 // 60}m"
+
+
+def position_side(position: dict) -> str:
+    """'buy' or 'sell' from a MetaApi position type."""
+    return "buy" if position.get("type") == "POSITION_TYPE_BUY" else "sell"
+
+
+class AccountStateMirror(SynchronizationListener):
+    """Local copy of account information, open positions and pending orders.
+
+    Filled by the initial synchronization of the streaming connection and then kept
+    up to date incrementally from the synchronization events, so menu views are
+    served from memory. Position profits follow the streamed prices. Position IDs are
+    indexed by (symbol, side) so selectors only look at the positions they can match.
+
+    Arguments:
+        symbol_specs: symbol specification cache, used for tick sizes
+    """
+
+    def __init__(self, symbol_specs: SymbolSpecCache):
+        super().__init__()
+        self.symbol_specs = symbol_specs
+        self.account_information = None
+        self.positions = {}
+        self._position_index = defaultdict(set)
+        self.orders = {}
+        self.connected = False
+        self._positions_synchronized = False
+        self._orders_synchronized = False
+        self.updated_at = None
+
+    def _touch(self) -> None:
+        self.updated_at = time.monotonic()
+
+    def is_ready(self) -> bool:
+        """True while connected and after positions and orders were synchronized."""
+        return (
+            self.connected
+            and self.account_information is not None
+            and self._positions_synchronized
+            and self._orders_synchronized
+        )
+
+    def freshness(self) -> str:
+        """One line telling the user how current the mirrored data is."""
+        if self.updated_at is None:
+            return "No account data received yet"
+        age = format_age(time.monotonic() - self.updated_at)
+        if self.is_ready():
+            return f"🟢 Live account data, last update {age} ago"
+        return f"🟡 Stream disconnected, data from {age} ago"
+
+    def get_positions(self) -> list:
+        return list(self.positions.values())
+
+    def _index_add(self, position: dict) -> None:
+        key = (position["symbol"], position_side(position))
+        self._position_index[key].add(position["id"])
+
+    def _index_remove(self, position_id: str) -> None:
+        position = self.positions.get(position_id)
+        if position is not None:
+            key = (position["symbol"], position_side(position))
+            self._position_index[key].discard(position_id)
+            if not self._position_index[key]:
+                del self._position_index[key]
+
+    def positions_for(self, symbol: str = None, side: str = None) -> list:
+        """Positions with the given symbol and/or side, looked up in the index."""
+        if symbol is None and side is None:
+            return self.get_positions()
+        return [
+            self.positions[position_id]
+            for (indexSymbol, indexSide), ids in self._position_index.items()
+            if symbol in (None, indexSymbol) and side in (None, indexSide)
+            for position_id in ids
+        ]
+
+    def get_orders(self) -> list:
+        return list(self.orders.values())
+
+    async def on_connected(self, instance_index: str, replicas: int):
+        self.connected = True
+
+    async def on_disconnected(self, instance_index: str):
+        self.connected = False
+
+    async def on_synchronization_started(
+        self,
+        instance_index: str,
+        specifications_updated: bool = True,
+        positions_updated: bool = True,
+        orders_updated: bool = True,
+        synchronization_id: str = None,
+    ):
+        self.connected = True
+        if positions_updated:
+            self._positions_synchronized = False
+        if orders_updated:
+            self._orders_synchronized = False
+
+    async def on_account_information_updated(
+        self, instance_index: str, account_information: dict
+    ):
+        self.account_information = dict(account_information)
+        self._touch()
+
+    async def on_positions_replaced(self, instance_index: str, positions: list):
+        self.positions = {position["id"]: dict(position) for position in positions}
+        self._position_index = defaultdict(set)
+        for position in self.positions.values():
+            self._index_add(position)
+        self._touch()
+
+    async def on_positions_synchronized(
+        self, instance_index: str, synchronization_id: str
+    ):
+        self._positions_synchronized = True
+
+    async def on_position_updated(self, instance_index: str, position: dict):
+        self._index_remove(position["id"])
+        self.positions[position["id"]] = dict(position)
+        self._index_add(position)
+        self._touch()
+
+    async def on_position_removed(self, instance_index: str, position_id: str):
+        self._index_remove(position_id)
+        self.positions.pop(position_id, None)
+        self._touch()
+
+    async def on_pending_orders_replaced(self, instance_index: str, orders: list):
+        self.orders = {order["id"]: dict(order) for order in orders}
+        self._touch()
+
+    async def on_pending_orders_synchronized(
+        self, instance_index: str, synchronization_id: str
+    ):
+        self._orders_synchronized = True
+
+    async def on_pending_order_updated(self, instance_index: str, order: dict):
+        self.orders[order["id"]] = dict(order)
+        self._touch()
+
+    async def on_pending_order_completed(self, instance_index: str, order_id: str):
+        self.orders.pop(order_id, None)
+        self._touch()
+
+    def _update_position_profit(self, position: dict, price: dict) -> None:
+        spec = self.symbol_specs.get(position["symbol"])
+        if spec is None or not spec.tick_size:
+            return
+        direction = 1 if position["type"] == "POSITION_TYPE_BUY" else -1
+        if "realizedProfit" not in position:
+            # part of the reported profit that does not move with price (swap, partial closes)
+            unrealized = (
+                direction
+                * (position["currentPrice"] - position["openPrice"])
+                * position.get("currentTickValue", spec.tick_value or 0)
+                * position["volume"]
+                / spec.tick_size
+            )
+            position["realizedProfit"] = position.get("profit", 0) - unrealized
+        currentPrice = price["bid"] if direction == 1 else price["ask"]
+        moved = direction * (currentPrice - position["openPrice"])
+        tickValue = price.get("profitTickValue" if moved > 0 else "lossTickValue")
+        if not tickValue:
+            return
+        position["currentPrice"] = currentPrice
+        position["currentTickValue"] = tickValue
+        position["profit"] = round(
+            position["realizedProfit"]
+            + moved * tickValue * position["volume"] / spec.tick_size,
+            2,
+        )
+
+    async def on_symbol_prices_updated(
+        self,
+        instance_index: str,
+        prices: list,
+        equity: float = None,
+        margin: float = None,
+        free_margin: float = None,
+        margin_level: float = None,
+        account_currency_exchange_rate: float = None,
+    ):
+        for price in prices:
+            for position in self.positions.values():
+                if position["symbol"] == price["symbol"] and "currentPrice" in position:
+                    self._update_position_profit(position, price)
+        if self.account_information is not None and equity is not None:
+            self.account_information.update(
+                equity=equity,
+                margin=margin,
+                freeMargin=free_margin,
+                marginLevel=margin_level,
+            )
+        if prices:
+            self._touch()
+
+
+DEPLOYED_STATES = ["DEPLOYING", "DEPLOYED"]
+
+
+class MetaApiConnectionManager:
+    """Keeps one deployed account and RPC connection warm and shares it between handlers.
+
+    The handshake (get_account, deploy check, wait_connected, connect, wait_synchronized)
+    runs once; afterwards every caller gets the same connection back. The connection is
+    health checked at most every HEALTH_CHECK_INTERVAL seconds and rebuilt with
+    exponential backoff when the check fails.
+
+    Arguments:
+        api_key: MetaAPI token
+        account_id: MetaAPI account id
+    """
+
+    def __init__(self, api_key: str, account_id: str):
+        self.api_key = api_key
+        self.account_id = account_id
+        self.api = None
+        self.account = None
+        self.connection = None
+        self._loop = None
+        self._lock = None
+        self._keepalive_task = None
+        self._checked_at = 0.0
+        self.symbol_specs = SymbolSpecCache()
+        self.quotes = QuoteCache()
+        self.state = AccountStateMirror(self.symbol_specs)
+        self.stream = None
+        self._subscribed = set()
+
+    def _bind_loop(self) -> None:
+        # SDK websockets and asyncio primitives belong to the loop that created them
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop:
+            self._loop = loop
+            self._lock = asyncio.Lock()
+            self.api = None
+            self.account = None
+            self.connection = None
+            self.stream = None
+            self._subscribed = set()
+            self._keepalive_task = None
+            self._checked_at = 0.0
+
+    async def _handshake(self) -> None:
+        if self.api is None:
+            self.api = MetaApi(self.api_key)
+        account = await self.api.metatrader_account_api.get_account(self.account_id)
+
+        if account.state not in DEPLOYED_STATES:
+            #  wait until account is deployed and connected to broker
+            logger.info("Deploying account")
+            await account.deploy()
+
+        logger.info("Waiting for API server to connect to broker ...")
+        with latency_stats.time("wait_connected"):
+            await account.wait_connected()
+
+        # connect to MetaApi API
+        connection = account.get_rpc_connection()
+        await connection.connect()
+
+        # wait until terminal state synchronized to the local state
+        logger.info("Waiting for SDK to synchronize to terminal state ...")
+        with latency_stats.time("wait_synchronized"):
+            await connection.wait_synchronized()
+
+        self.account = account
+        self.connection = connection
+        self._checked_at = time.monotonic()
+
+    async def _close_connection(self) -> None:
+        connection, self.connection = self.connection, None
+        if connection is not None:
+            try:
+                await connection.close()
+            except Exception as e:
+                logger.info(f"Error closing MetaApi connection: {e}")
+
+    async def _reconnect(self):
+        delay = RECONNECT_BACKOFF
+        for attempt in range(1, RECONNECT_ATTEMPTS + 1):
+            try:
+                await self._close_connection()
+                await self._handshake()
+                return self.connection
+            except Exception as e:
+                if attempt >= RECONNECT_ATTEMPTS:
+                    raise
+                logger.warning(
+                    f"MetaApi connect attempt {attempt} failed: {e}. Retrying in {delay}s"
+                )
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, RECONNECT_BACKOFF_MAX)
+
+    async def health_check(self) -> bool:
+        """Returns True if the shared connection answers one RPC round trip."""
+        if self.connection is None:
+            return False
+        try:
+            await asyncio.wait_for(
+                self.connection.get_server_time(), HEALTH_CHECK_TIMEOUT
+            )
+        except Exception as e:
+            logger.warning(f"MetaApi health check failed: {e}")
+            return False
+        self._checked_at = time.monotonic()
+        return True
+
+    async def get_connection(self):
+        """Returns the shared RPC connection, connecting or reconnecting when needed.
+
+        Safe to call from concurrent coroutines: only one of them performs the
+        handshake while the others wait for it and reuse the result.
+        """
+        self._bind_loop()
+        if (
+            self.connection is not None
+            and time.monotonic() - self._checked_at < HEALTH_CHECK_INTERVAL
+        ):
+            return self.connection
+
+        async with self._lock:
+            if self.connection is None:
+                return await self._reconnect()
+            if time.monotonic() - self._checked_at >= HEALTH_CHECK_INTERVAL:
+                if not await self.health_check():
+                    return await self._reconnect()
+            return self.connection
+
+    def invalidate(self) -> None:
+        """Forces the next get_connection() call to run a health check."""
+        self._checked_at = 0.0
+
+    async def _open_stream(self) -> None:
+        # the streaming connection reconnects on its own once it is synchronized
+        stream = self.account.get_streaming_connection()
+        stream.add_synchronization_listener(
+            PriceListener(self.quotes, self.symbol_specs)
+        )
+        stream.add_synchronization_listener(self.state)
+        await stream.connect()
+        await stream.wait_synchronized()
+        self.stream = stream
+        self._subscribed = set()
+        await self.subscribe_symbols(broker_symbols())
+        logger.info("Streaming prices of configured symbols")
+
+    async def subscribe_symbols(self, symbols: list) -> None:
+        """Caches specifications and streams prices of symbols that are new to this account."""
+        missing = [symbol for symbol in symbols if self.symbol_specs.get(symbol) is None]
+        if missing:
+            await self.symbol_specs.refresh(await self.get_connection(), missing)
+        if self.stream is None:
+            return
+        for symbol in symbols:
+            if symbol in self._subscribed:
+                continue
+            try:
+                await self.stream.subscribe_to_market_data(symbol, wait_for_quote=False)
+                self._subscribed.add(symbol)
+            except Exception as e:
+                logger.info(f"Could not subscribe to {symbol} prices: {e}")
+
+    async def get_price(self, symbol: str) -> dict:
+        """Returns the latest streamed price of symbol, or asks the broker if it is stale."""
+        price = self.quotes.get(symbol)
+        if price is None:
+            connection = await self.get_connection()
+            price = await connection.get_symbol_price(symbol=symbol)
+            self.quotes.update(price)
+        return price
+
+    async def get_account_information(self) -> dict:
+        """Account information from the mirror, or from the broker when it is not live."""
+        if self.state.is_ready():
+            return dict(self.state.account_information)
+        connection = await self.get_connection()
+        return await connection.get_account_information()
+
+    async def get_positions(self) -> list:
+        """Open positions from the mirror, or from the broker when it is not live."""
+        if self.state.is_ready():
+            return self.state.get_positions()
+        connection = await self.get_connection()
+        return await connection.get_positions()
+
+    async def get_orders(self) -> list:
+        """Pending orders from the mirror, or from the broker when it is not live."""
+        if self.state.is_ready():
+            return self.state.get_orders()
+        connection = await self.get_connection()
+        return await connection.get_orders()
+
+    def freshness(self) -> str:
+        """Where the account views come from and how old they are."""
+        if self.state.is_ready():
+            return self.state.freshness()
+        return "🔄 Fetched from the server just now"
+
+    async def _keepalive(self) -> None:
+        refreshedAt = time.monotonic()
+        while True:
+            await asyncio.sleep(HEALTH_CHECK_INTERVAL)
+            try:
+                self.invalidate()
+                connection = await self.get_connection()
+                if time.monotonic() - refreshedAt >= self.symbol_specs.ttl:
+                    await self.symbol_specs.refresh(connection, broker_symbols())
+                    refreshedAt = time.monotonic()
+                if STREAM_QUOTES == "Y" and self.stream is None:
+                    await self._open_stream()
+            except Exception as e:
+                logger.error(f"MetaApi keep-alive failed: {e}")
+
+    async def start(self) -> None:
+        """Connects eagerly, caches symbol specifications and streams prices."""
+        connection = await self.get_connection()
+        await self.symbol_specs.refresh(connection, broker_symbols())
+        if STREAM_QUOTES == "Y" and self.stream is None:
+            try:
+                await self._open_stream()
+            except Exception as e:
+                logger.error(f"MetaApi price streaming failed: {e}")
+        if self._keepalive_task is None or self._keepalive_task.done():
+            self._keepalive_task = asyncio.ensure_future(self._keepalive())
+
+    async def close(self) -> None:
+        if self._keepalive_task is not None:
+            self._keepalive_task.cancel()
+            self._keepalive_task = None
+        stream, self.stream = self.stream, None
+        self._subscribed = set()
+        if stream is not None:
+            try:
+                await stream.close()
+            except Exception as e:
+                logger.info(f"Error closing MetaApi streaming connection: {e}")
+        await self._close_connection()
+        if self.api is not None:
+            self.api.close()
+            self.api = None
+
+
+connection_managers = {}
+
+
+def get_connection_manager(account_id: str) -> MetaApiConnectionManager:
+    """Returns the process wide connection manager for a MetaAPI account."""
+    manager = connection_managers.get(account_id)
+    if manager is None:
+        manager = connection_managers.setdefault(
+            account_id, MetaApiConnectionManager(API_KEY, account_id)
+        )
+    return manager
+
+
+def account_prefix(account: AccountSettings) -> str:
+    """'<name>: ' in front of per-account replies when there are several accounts."""
+    return f"{account.name}: " if len(settings.accounts) > 1 else ""
+
+
+def command_accounts(args: str) -> tuple:
+    """Splits an account=<name> term off the arguments of a view or bulk command.
+
+    Commands act on every account in settings.accounts unless accounts are named,
+    e.g. /closeposition account=swing losing or /opentrades account=swing.
+
+    Returns:
+        (tuple of AccountSettings the command acts on, the remaining arguments)
+
+    Raises:
+        ValueError: if a named account is not configured
+    """
+    names, rest = [], []
+    for term in args.split():
+        if term.lower().startswith("account="):
+            names.append(term.split("=", 1)[1].lower())
+        else:
+            rest.append(term)
+    if not names:
+        return settings.accounts, " ".join(rest)
+    accounts = tuple(
+        account for account in settings.accounts if account.name.lower() in names
+    )
+    unknown = set(names) - {account.name.lower() for account in accounts}
+    if unknown:
+        known = ", ".join(account.name for account in settings.accounts)
+        raise ValueError(f"Unknown account: {', '.join(sorted(unknown))} (use {known})")
+    return accounts, " ".join(rest)
+
+
+# Lấy danh sách pending orders
+async def get_pending_orders(update: Update, account: AccountSettings):
+    try:
+        # served from the account state mirror while the stream is live
+        orders = await get_connection_manager(account.account_id).get_orders()
+        return orders
+    except Exception as e:
+        logger.error(f"Error getting pending orders of {account.name}: {e}")
+        reply(update, f"{account_prefix(account)}Error getting pending orders: {e}")
+        return []
+
+
+# Lấy danh sách open trades
+async def get_open_trades(update: Update, account: AccountSettings):
+    try:
+        # served from the account state mirror while the stream is live
+        trades = await get_connection_manager(account.account_id).get_positions()
+        return trades
+    except Exception as e:
+        logger.info(f"Error getting open trades of {account.name}: {e}")
+        reply(update, f"{account_prefix(account)}Error getting open trades: {e}")
+        return []
+
+
+# MetaApi position/order types and the short labels shown in listings
+TYPE_LABELS = {
+    "POSITION_TYPE_BUY": "BUY",
+    "POSITION_TYPE_SELL": "SELL",
+    "ORDER_TYPE_BUY": "BUY",
+    "ORDER_TYPE_SELL": "SELL",
+    "ORDER_TYPE_BUY_LIMIT": "BUY_LIMIT",
+    "ORDER_TYPE_SELL_LIMIT": "SELL_LIMIT",
+    "ORDER_TYPE_BUY_STOP": "BUY_STOP",
+    "ORDER_TYPE_SELL_STOP": "SELL_STOP",
+    "ORDER_TYPE_BUY_STOP_LIMIT": "BUY_STOP_LIMIT",
+    "ORDER_TYPE_SELL_STOP_LIMIT": "SELL_STOP_LIMIT",
+    "ORDER_TYPE_CLOSE_BY": "CLOSE_BY",
+}
+
+
+class FixedWidthTable:
+    """Left aligned text table that is sent as Telegram sized <pre> chunks.
+
+    Column widths grow as rows are added, so they are known once the last row is in;
+    rendering then streams the rows into chunks below MESSAGE_LIMIT characters, each
+    with its own title, header and borders. Columns too wide for one row to fit a
+    message are narrowed and their cells cut with an ellipsis.
+
+    Arguments:
+        field_names: column headers
+        title: optional title above the header
+    """
+
+    def __init__(self, field_names: list, title: str = None):
+        self.field_names = field_names
+        self.title = title
+        self.widths = [len(name) for name in field_names]
+        self.rows = []
+
+    def add_row(self, row: list) -> None:
+        row = [str(value) for value in row]
+        self.widths = [max(width, len(value)) for width, value in zip(self.widths, row)]
+        self.rows.append(row)
+
+    @staticmethod
+    def _cell(value: str, width: int) -> str:
+        if len(value) > width:
+            value = value[: width - 1] + "…"
+        return value.ljust(width)
+
+    def _line(self, cells: list, widths: list) -> str:
+        return (
+            "| "
+            + " | ".join(self._cell(cell, width) for cell, width in zip(cells, widths))
+            + " |"
+        )
+
+    def _header(self, widths: list) -> tuple:
+        border = "+" + "+".join("-" * (width + 2) for width in widths) + "+"
+        head = [border]
+        if self.title:
+            inner = len(border) - 4
+            head += ["| " + self._cell(self.title.center(inner), inner) + " |", border]
+        head += [self._line(self.field_names, widths), border]
+        return html.escape("\n".join(head)), border
+
+    def chunks(self, limit: int = MESSAGE_LIMIT):
+        """Yields the table as HTML <pre> messages of at most limit characters."""
+        widths = list(self.widths)
+        while True:
+            header, border = self._header(widths)
+            # <pre>, header, rows, closing border and </pre>, joined by newlines
+            overhead = len("<pre></pre>") + len(header) + len(border) + 2
+            longest = max(
+                (len(html.escape(self._line(row, widths))) for row in self.rows),
+                default=0,
+            )
+            excess = overhead + longest + 1 - limit
+            widest = widths.index(max(widths))
+            if excess <= 0 or widths[widest] == 1:
+                break
+            # một dòng quá dài, thu hẹp cột rộng nhất cho đến khi vừa một tin nhắn;
+            # mỗi ký tự bớt đi làm ngắn tối đa 6 ký tự đã escape ở mỗi dòng văn bản
+            lines = 7 if self.title else 5
+            widths[widest] = max(1, widths[widest] - max(1, excess // (6 * lines)))
+        body = []
+        size = overhead
+        for row in self.rows:
+            line = html.escape(self._line(row, widths))
+            if body and size + len(line) + 1 > limit:
+                yield "<pre>" + "\n".join([header] + body + [border]) + "</pre>"
+                body = []
+                size = overhead
+            body.append(line)
+            size += len(line) + 1
+        yield "<pre>" + "\n".join([header] + body + [border]) + "</pre>"
+
+
+def create_table(data, is_pending=True) -> FixedWidthTable:
+    try:
+        # Kiểm tra xem data có phải là chuỗi không
+        if isinstance(data, str):
+            # Nếu là chuỗi, chuyển đổi thành đối tượng Python
+            json_data = json.loads(data)
+        elif isinstance(data, list):
+            # Nếu là danh sách, sử dụng trực tiếp
+            json_data = data
+        else:
+            # Nếu không phải là chuỗi hoặc danh sách, xử lý lỗi hoặc trả về
+            raise ValueError("Invalid data format")
+
+        headers = ["Id", "Type", "Symbol", "Size", "Entry", "SL", "TP"]
+        if not is_pending:
+            table = FixedWidthTable(headers + ["Profit"], "Opening Trades")
+        else:
+            table = FixedWidthTable(headers, "Pending Orders")
+
+        total_profit = 0
+        for order_or_position in json_data:
+            order_type = order_or_position.get("type", "")
+            row = [
+                order_or_position.get("id", ""),
+                TYPE_LABELS.get(order_type, order_type),
+                order_or_position.get("symbol", ""),
+                order_or_position.get("volume", ""),
+                order_or_position.get("openPrice", ""),
+                order_or_position.get("stopLoss", ""),
+                order_or_position.get("takeProfit", ""),
+            ]
+            # Truy cập thông tin từng vị thế hoặc order tùy thuộc vào loại dữ liệu
+            if not is_pending:
+                profit_value = round(float(order_or_position.get("profit", 0)), 2)
+                row.append(f"{profit_value:,.2f} $")
+                total_profit += float(order_or_position.get("profit", 0))
+            table.add_row(row)
+
+        if not is_pending and json_data:
+            total_profit_row = ["TOTAL PROFIT", "", "", "", "", "", ""]
+            total_profit_row.append(f"{round(total_profit, 2)} $")
+            table.add_row(total_profit_row)
+        return table
+    except Exception as e:
+        # Xử lý lỗi khi có vấn đề với định dạng dữ liệu
+        logger.info(f"Error creating table: {e}")
+        return None
+
+
+async def pending_orders(update: Update, context: CallbackContext, args="") -> None:
+    try:
+        accounts, _ = command_accounts(args)
+        # mỗi tài khoản một danh sách
+        for account in accounts:
+            pending_orders_data = await get_pending_orders(update, account)
+            table = create_table(pending_orders_data)
+            reply(
+                update,
+                f"{account_prefix(account)}"
+                f"Total Pending Orders: {len(pending_orders_data)}"
+                f"\n{get_connection_manager(account.account_id).freshness()}",
+            )
+            # In các phần
+            if pending_orders_data:
+                for part_temp_table in table.chunks():
+                    reply(update, part_temp_table, parse_mode=ParseMode.HTML)
+    except Exception as e:
+        reply(update, f"Error pending orders: {e}")
+
+
+async def open_trades(update: Update, context: CallbackContext, args="") -> None:
+    try:
+        accounts, _ = command_accounts(args)
+        # mỗi tài khoản một danh sách
+        for account in accounts:
+            open_trades_data = await get_open_trades(update, account)
+            table = create_table(open_trades_data, is_pending=False)
+            reply(
+                update,
+                f"{account_prefix(account)}Total Positions: {len(open_trades_data)}"
+                f"\n{get_connection_manager(account.account_id).freshness()}",
+            )
+            # In các phần
+            if open_trades_data:
+                for part_temp_table in table.chunks():
+                    reply(update, part_temp_table, parse_mode=ParseMode.HTML)
+    except Exception as e:
+        reply(update, f"Error open trades: {e}")
+
+
+# Bulk commands accept comma separated position IDs or a selector such as
+# "symbol=XAUUSD side=buy profit>0 opened<1h": every term must match.
+SELECTOR_KEYWORDS = {
+    "all": None,
+    "losing": ("profit", operator.lt, 0.0),
+    "winning": ("profit", operator.gt, 0.0),
+}
+SELECTOR_TERM_PATTERN = re.compile(r"^([a-z]+)(<=|>=|=|<|>)(.+)$")
+SELECTOR_COMPARATORS = {
+    "=": operator.eq,
+    "<": operator.lt,
+    ">": operator.gt,
+    "<=": operator.le,
+    ">=": operator.ge,
+}
+# Fields that can be compared with a number, and opened age with a duration (30m, 1h, 2d)
+SELECTOR_NUMERIC_FIELDS = ("profit", "volume", "magic", "swap")
+DURATION_PATTERN = re.compile(r"^(\d+(?:\.\d+)?)([smhdw]?)$")
+DURATION_SECONDS = {"": 1, "s": 1, "m": 60, "h": 3600, "d": 86400, "w": 604800}
+
+# symbol and side narrow the candidates through the mirror index, checks filter them
+PositionSelector = namedtuple("PositionSelector", ["symbol", "side", "checks"])
+
+
+def is_selector(target: str) -> bool:
+    """True if target is a position selector rather than a list of IDs."""
+    terms = target.lower().split()
+    return bool(terms) and all(
+        term in SELECTOR_KEYWORDS or SELECTOR_TERM_PATTERN.match(term) for term in terms
+    )
+
+
+def parse_duration(text: str) -> float:
+    """Seconds in a duration such as 90s, 30m, 1.5h or 2d."""
+    match = DURATION_PATTERN.match(text)
+    if match is None:
+        raise ValueError(f"Invalid duration: {text}")
+    return float(match.group(1)) * DURATION_SECONDS[match.group(2)]
+
+
+def position_age(position: dict) -> float:
+    """Seconds since the position was opened."""
+    opened = position.get("time")
+    if isinstance(opened, str):
+        opened = datetime.fromisoformat(opened.replace("Z", "+00:00"))
+    return (datetime.now(pytz.utc) - opened).total_seconds()
+
+
+def parse_selector(selector: str) -> PositionSelector:
+    """Parses selector terms into index keys and field checks.
+
+    Arguments:
+        selector: space separated terms: all, losing, winning, symbol=<symbol>,
+            side=buy|sell, profit/volume/magic/swap compared with =, <, >, <=, >=
+            to a number, and opened compared to a duration (opened<1h)
+
+    Returns:
+        a PositionSelector
+    """
+    symbol = side = None
+    checks = []
+    for term in selector.lower().split():
+        if term in SELECTOR_KEYWORDS:
+            if SELECTOR_KEYWORDS[term] is not None:
+                checks.append(SELECTOR_KEYWORDS[term])
+            continue
+        match = SELECTOR_TERM_PATTERN.match(term)
+        if match is None:
+            raise ValueError(f"Unknown selector: {term}")
+        field, op, value = match.groups()
+        if field == "symbol" and op == "=":
+            symbol = settings.symbol_aliases.get(value.upper(), value.upper())
+        elif field == "side" and op == "=" and value in ("buy", "sell"):
+            side = value
+        elif field in SELECTOR_NUMERIC_FIELDS:
+            try:
+                checks.append((field, SELECTOR_COMPARATORS[op], float(value)))
+            except ValueError:
+                raise ValueError(f"Invalid number in selector: {term}")
+        elif field == "opened":
+            checks.append(("opened", SELECTOR_COMPARATORS[op], parse_duration(value)))
+        else:
+            raise ValueError(f"Unknown selector: {term}")
+    return PositionSelector(symbol, side, checks)
+
+
+def selector_matches(selector: PositionSelector, position: dict) -> bool:
+    """True if position satisfies every part of selector."""
+    if selector.symbol is not None and position.get("symbol") != selector.symbol:
+        return False
+    if selector.side is not None and position_side(position) != selector.side:
+        return False
+    for field, compare, value in selector.checks:
+        if field == "opened":
+            actual = position_age(position)
+        else:
+            actual = position.get(field, 0) or 0
+        if not compare(actual, value):
+            return False
+    return True
+
+
+async def select_positions(selector: str, account: AccountSettings) -> list:
+    """Open positions of account matching selector, in memory when the mirror is live.
+
+    With a live mirror symbol and side are looked up in its index and only those
+    positions are checked; otherwise one get_positions call is filtered.
+    """
+    parsed = parse_selector(selector)
+    manager = get_connection_manager(account.account_id)
+    if manager.state.is_ready():
+        candidates = manager.state.positions_for(parsed.symbol, parsed.side)
+    else:
+        candidates = await manager.get_positions()
+    return [position for position in candidates if selector_matches(parsed, position)]
+
+
+async def locate_positions(accounts: tuple, position_ids: list) -> tuple:
+    """Finds the account holding each position ID among accounts.
+
+    Returns:
+        ([(AccountSettings, {"id": ...}) of the IDs found], IDs open on no account)
+    """
+    held = await asyncio.gather(
+        *(
+            get_connection_manager(account.account_id).get_positions()
+            for account in accounts
+        )
+    )
+    owners = {
+        str(position["id"]): account
+        for account, positions in zip(accounts, held)
+        for position in positions
+    }
+    found = [
+        (owners[position_id], {"id": position_id})
+        for position_id in position_ids
+        if position_id in owners
+    ]
+    missing = [
+        position_id for position_id in position_ids if position_id not in owners
+    ]
+    return found, missing
+
+
+async def target_positions(update: Update, target: str) -> list:
+    """Positions named by a bulk command: comma separated IDs or a selector.
+
+    The command acts on every configured account, or on the ones named with
+    account=<name>. With one account IDs are returned as {"id": ...} stubs without
+    asking the broker; with several, the open positions tell which account holds each
+    ID. Invalid or empty selections are reported to the user and return an empty list.
+
+    Returns:
+        a list of (AccountSettings, position) pairs
+    """
+    try:
+        accounts, target = command_accounts(target)
+    except ValueError as e:
+        reply(update, str(e))
+        return []
+    if not is_selector(target):
+        position_ids = [
+            position_id.strip()
+            for position_id in target.split(",")
+            if position_id.strip()
+        ]
+        if len(accounts) == 1:
+            return [(accounts[0], {"id": position_id}) for position_id in position_ids]
+        try:
+            positions, missing = await locate_positions(accounts, position_ids)
+        except Exception as e:
+            reply(update, f"Error finding the positions: {e}")
+            return []
+        if missing:
+            reply(update, f"Not open on any account: {', '.join(missing)}")
+        return positions
+    try:
+        selected = await asyncio.gather(
+            *(select_positions(target, account) for account in accounts)
+        )
+    except ValueError as e:
+        reply(
+            update,
+            f"{e}\nUse IDs or a selector like: symbol=XAUUSD side=buy profit>0 opened<1h"
+        )
+        return []
+    except Exception as e:
+        reply(update, f"Error finding the positions: {e}")
+        return []
+    positions = [
+        (account, position)
+        for account, matches in zip(accounts, selected)
+        for position in matches
+    ]
+    if not positions:
+        reply(update, f"No positions match: {target}")
+    return positions
+
+
+async def run_bulk(update: Update, title: str, items: list, action) -> None:
+    """Runs action for every item concurrently and sends one aggregated report.
+
+    At most BULK_CONCURRENCY actions are in flight at a time. Each action returns
+    (succeeded, status line) and handles its own errors.
+
+    Arguments:
+        update: update from Telegram
+        title: name of the operation in the report
+        items: position IDs, positions or (ID, size) pairs
+        action: coroutine function called with one item
+    """
+    semaphore = asyncio.Semaphore(BULK_CONCURRENCY)
+
+    async def run(item):
+        async with semaphore:
+            return await action(item)
+
+    results = await asyncio.gather(*(run(item) for item in items))
+    succeeded = sum(1 for ok, _ in results if ok)
+    status = "✅" if succeeded == len(results) else "⚠️" if succeeded else "❌"
+    header = f"{title}: {succeeded}/{len(results)} succeeded {status}"
+    logger.info(header)
+    # one status message per command, queued off the trading path
+    with ReplyBatch(update, header) as replies:
+        for _, line in results:
+            replies.add(line)
+
+
+# Function to handle the /trailingstop command
+async def trailing_stop(update: Update, args) -> None:
+    # Get the string of position IDs from the command arguments
+    if not args:
+        reply(update, "Please provide a list of position IDs.")
+        return
+
+    # Combine the arguments into a single string, then split it into a list of position IDs
+    positions = await target_positions(
+        update, " ".join(args) if isinstance(args, list) else args
+    )
+    if not positions:
+        return
+
+    async def move_to_entry(item):
+        account, position = item
+        intposition_id = str(position["id"])
+        prefix = account_prefix(account)
+        try:
+            manager = get_connection_manager(account.account_id)
+            connection = await manager.get_connection()
+            if "openPrice" not in position:
+                # Get position information
+                position = await connection.get_position(intposition_id)
+
+            # Check if stopLoss exists, set to its value or None
+            stopLoss = position["stopLoss"] if "stopLoss" in position else None
+
+            # Check if takeProfit exists, set to its value or None
+            takeProfit = position["takeProfit"] if "takeProfit" in position else None
+
+            # Modify the position with trailing stop parameters
+            await connection.modify_position(
+                intposition_id,
+                stop_loss=position["openPrice"],  # Set stopLoss to the openPrice
+                take_profit=takeProfit,  # Set takeProfit to its existing value or None if it doesn't exist
+            )
+            return (
+                True,
+                f"{prefix}Trailing stop set for position ID ({intposition_id}) - Change SL :  {stopLoss} to Entry: {position['openPrice']}. Successfully",
+            )
+        except ValueError:
+            return (
+                False,
+                f"{prefix}Invalid position ID: {intposition_id}. Please provide valid integers.",
+            )
+        except Exception as e:
+            return (
+                False,
+                f"{prefix}Error TrailingStop Position ID {intposition_id}: {str(e)}.",
+            )
+
+    await run_bulk(update, "Trailing stop", positions, move_to_entry)
+
+
+async def close_position(update: Update, args) -> None:
+    # Get the string of position IDs from the command arguments
+    if not args:
+        reply(update, "Please provide a list of position IDs.")
+        return
+    # Tách chuỗi thành danh sách các ID, tách bởi dấu phẩy
+    position_ids = [
+        (account, position["id"])
+        for account, position in await target_positions(update, args)
+    ]
+    if not position_ids:
+        return
+
+    async def close(item):
+        account, position_id = item
+        prefix = account_prefix(account)
+        try:
+            # Close position
+            manager = get_connection_manager(account.account_id)
+            connection = await manager.get_connection()
+            await connection.close_position(position_id)
+            return (True, f"{prefix}Closed Position ID {position_id} successfully.")
+        except ValueError:
+            return (
+                False,
+                f"{prefix}Invalid Position ID: {position_id}. Please provide valid integers.",
+            )
+        except Exception as e:
+            return (
+                False,
+                f"{prefix}Error closing Position ID {position_id}: {str(e)}.",
+            )
+
+    await run_bulk(update, "Close positions", position_ids, close)
+
+
+async def close_position_partially(update: Update, args) -> None:
+    # Get the string of position IDs and sizes from the command arguments
+    if not args or "|" not in args:
+        reply(
+            update,
+            "Please provide a list of position IDs and sizes separated by '|'."
+        )
+        return
+
+    # Split the arguments into position IDs and sizes
+    position_args = args.split("|")
+    listID = [
+        (account, position["id"])
+        for account, position in await target_positions(update, position_args[0])
+    ]
+    if not listID:
+        return
+    listSize = list(map(float, position_args[1].split(",")))
+    # one size applies to every selected position
+    if len(listSize) == 1:
+        listSize = listSize * len(listID)
+
+    async def close_part(item):
+        account, position_id, size = item
+        prefix = account_prefix(account)
+        # Kiểm tra nếu không tồn tại phần tử tương ứng trong listSize
+        if size is None:
+            return (False, f"{prefix}No size provided for Position ID {position_id}.")
+        try:
+            # Close a part of the position
+            manager = get_connection_manager(account.account_id)
+            connection = await manager.get_connection()
+            await connection.close_position_partially(position_id, size)
+            return (
+                True,
+                f"{prefix}Closed a part : {size} lot of Position ID : {position_id} successfully.",
+            )
+        except ValueError:
+            return (
+                False,
+                f"{prefix}Invalid Position ID: {position_id}. Please provide valid integers.",
+            )
+        except Exception as e:
+            return (
+                False,
+                f"{prefix}Error closing Position ID {position_id}: {str(e)}.",
+            )
+
+    items = [
+        (account, position_id, listSize[i] if i < len(listSize) else None)
+        for i, (account, position_id) in enumerate(listID)
+    ]
+    await run_bulk(update, "Partial close", items, close_part)
+
+
+async def account_info(update: Update, args: str = "") -> None:
+    """Sends the balance, equity and margin of every account, or of the named one."""
+    try:
+        accounts, _ = command_accounts(args)
+    except ValueError as e:
+        reply(update, str(e))
+        return
+    for account in accounts:
+        await show_account_info(update, account)
+
+
+async def show_account_info(update: Update, account: AccountSettings) -> None:
+    try:
+        # Đoạn mã JSON của bạn
+        manager = get_connection_manager(account.account_id)
+        account_information = await manager.get_account_information()
+        logger.info(f"Account Info : {account_information}")
+        # Tạo PrettyTable
+        table = PrettyTable(["Title", "Value"])
+        table.align["Title"] = "l"
+        table.align["Value"] = "l"
+        # Thêm dữ liệu vào PrettyTable
+        # Chọn các trường bạn muốn hiển thị
+        fields_to_display = [
+            "balance",
+            "equity",
+            "margin",
+            "freeMargin",
+            "leverage",
+            "marginLevel",
+        ]
+
+        # Thêm dữ liệu vào PrettyTable
+        for field in fields_to_display:
+            # Chuyển đổi tên trường thành tiếng Việt
+            field_name_vietnamese = {
+                "balance": "Balance - Số dư",
+                "equity": "Equity - Tài sản ròng",
+                "margin": "Margin - Tiền ký quỹ",
+                "freeMargin": "FreeMargin - Số dư margin",
+                "leverage": "Leverage - Đòn bẩy",
+                "marginLevel": "Margin Level - % ký quỹ",
+            }.get(field, field)
+            if field in ["balance", "equity", "margin", "freeMargin"]:
+                field_value = "$ {:,.2f}".format(account_information.get(field, 0))
+            elif field == "marginLevel":
+                field_value = "{:.2f} %".format(account_information.get(field, 0))
+            else:
+                field_value = account_information.get(field, 0)
+            table.add_row([field_name_vietnamese, field_value])
+        # Gửi bảng dưới dạng tin nhắn HTML
+        temp_table = f"<pre>{table}</pre>"
+        reply(
+            update,
+            f"{html.escape(account_prefix(account))}"
+            f"<pre>{temp_table}</pre>\n{manager.freshness()}",
+            parse_mode=ParseMode.HTML,
+        )
+    except Exception as e:
+        reply(
+            update, f"{account_prefix(account)}Error get Account Infomation: {str(e)}."
+        )
+
+    def ButtonMenu(update, context):
         """
         Button Callback Handler
 
@@ -843,30 +2685,33 @@ async def account_info(update: Update) -> None:
 
 
 def handle_account_info(update: Update, context: CallbackContext):
-    asyncio.run(account_info(update))
+    args = update.effective_message.text.split(" ", 1)[1:]
+    run_coroutine(account_info(update, args[0] if args else ""))
 
 
 def handle_pending_orders(update: Update, context: CallbackContext):
-    asyncio.run(pending_orders(update, context))
+    args = update.effective_message.text.split(" ", 1)[1:]
+    run_coroutine(pending_orders(update, context, args[0] if args else ""))
 
 
 def handle_open_trades(update: Update, context: CallbackContext):
-    asyncio.run(open_trades(update, context))
+    args = update.effective_message.text.split(" ", 1)[1:]
+    run_coroutine(open_trades(update, context, args[0] if args else ""))
 
 
 def handle_trailingstop(update: Update, context: CallbackContext):
-    args = update.effective_message.text.split(" ")[1:]
-    asyncio.run(trailing_stop(update, args[0]))
+    args = update.effective_message.text.split(" ", 1)[1:]
+    run_coroutine(trailing_stop(update, args[0] if args else ""))
 
 
 def handle_closeposition(update: Update, context: CallbackContext):
-    args = update.effective_message.text.split(" ")[1:]
-    asyncio.run(close_position(update, args[0]))
+    args = update.effective_message.text.split(" ", 1)[1:]
+    run_coroutine(close_position(update, args[0] if args else ""))
 
 
 def handle_close_position_part(update: Update, context: CallbackContext):
-    args = update.effective_message.text.split(" ")[1:]
-    asyncio.run(close_position_partially(update, args[0]))
+    args = update.effective_message.text.split(" ", 1)[1:]
+    run_coroutine(close_position_partially(update, args[0] if args else ""))
 
 
 # def find_entry_point(trade: str, signal: list[str], signaltype : str) -> float:
@@ -878,6 +2723,9 @@ def handle_close_position_part(update: Update, context: CallbackContext):
 #     except ValueError:
 #         entry_price = None
 #     return entry_price
+SPACED_NUMBER_PATTERN = re.compile(r"(\d+) +(\d+)(?!0)")
+
+
 def replace_spaces(text):
     """
     Thay thế khoảng trắng nằm giữa 2 số thành dấu .
@@ -888,10 +2736,184 @@ def replace_spaces(text):
     Returns:
       Chuỗi đã được xử lý
     """
-    temp = re.sub(r"(\d+) +(\d+)(?!0)", r"\1.\2", text)
+    temp = SPACED_NUMBER_PATTERN.sub(r"\1.\2", text)
     return temp
 
 
+# Order types in the priority ParseSignal has always used: more specific types first.
+# The alternation lists them in the same order, so at any position the longest type wins.
+ORDER_TYPES = [
+    "Buy Limit",
+    "Sell Limit",
+    "Buy Stop",
+    "Sell Stop",
+    "Buy Now",
+    "Sell Now",
+    "Buy",
+    "Sell",
+]
+ORDER_TYPE_PRIORITY = {order_type.lower(): order_type for order_type in ORDER_TYPES}
+ORDER_TYPE_PATTERN = re.compile(
+    "|".join(re.escape(order_type.lower()) for order_type in ORDER_TYPES)
+)
+
+# Line keywords, matched with a lookahead so overlapping keywords are all reported
+LINE_KEYWORD_PATTERN = re.compile(r"(?=(entry|target profit|stop loss|tp|sl))")
+ENTRY_SPLIT_PATTERN = re.compile("[a-z]+|[-,/,@]", flags=re.IGNORECASE)
+
+
+@dataclass(frozen=True)
+class ParsedSignal:
+    """Typed result of parse_signal_text.
+
+    entry is a float, "NOW" for market execution, or None when a stop order had
+    no entry line.
+    """
+
+    order_type: str
+    symbol: str
+    entry: Union[float, str, None]
+    stop_loss: float
+    take_profits: List[float]
+
+    def to_trade(self) -> dict:
+        """Converts the parsed signal into the trade dictionary used by the bot."""
+        trade = {"OrderType": self.order_type, "Symbol": self.symbol}
+        if self.entry is not None:
+            trade["Entry"] = self.entry
+        trade["TP"] = list(self.take_profits)
+        trade["StopLoss"] = self.stop_loss
+        return trade
+
+
+def last_float(tokens: list):
+    """Returns the last whitespace separated token as float, or None."""
+    if not tokens:
+        return None
+    try:
+        return float(tokens[-1])
+    except ValueError:
+        return None
+
+
+def FindSymbol(line: str, cfg: ConfigSnapshot = None):
+    """Finds the symbol of a signal in its first line.
+
+    Symbols written with '/' (SYMBOLSPLUS) take precedence and are returned without it.
+    Overlapping symbols resolve to the longest match.
+    Returns None if no symbol is found.
+    """
+    cfg = cfg or settings
+    symbol = cfg.symbolplus_matcher.find_longest(line)
+    if symbol is not None:
+        return symbol.replace("/", "")
+    return cfg.symbol_matcher.find_longest(line)
+
+
+def parse_signal_text(
+    signal: str, cfg: ConfigSnapshot = None
+) -> Optional[ParsedSignal]:
+    """Parses a trading signal in a single pass over its lines.
+
+    Every line is lowercased and tokenized once; order type, entry, SL and TP keywords
+    are recognized with the precompiled patterns above.
+
+    Arguments:
+        signal: trading signal
+        cfg: settings to parse with, the current ones by default
+
+    Returns:
+        a ParsedSignal, or None if the order type or symbol is invalid
+    """
+    cfg = cfg or settings
+    # converts message to list of strings for parsing
+    lines = replace_spaces(remove_pips(signal)).splitlines()
+    lines = [line.rstrip() for line in lines]
+    lowered = [line.lower() for line in lines]
+
+    # determines the order type of the trade from the first three lines
+    found = set()
+    for line in lowered[:3]:
+        found.update(ORDER_TYPE_PATTERN.findall(line))
+    order_type = next(
+        (order_type for order_type in ORDER_TYPES if order_type.lower() in found), None
+    )
+    if order_type is None:
+        return None
+
+    # extracts symbol from trade signal and checks if it is valid
+    symbol = FindSymbol(lines[0], cfg) if lines else None
+    if symbol is None or symbol not in cfg.symbols:
+        return None
+    symbol = cfg.symbol_aliases.get(symbol, symbol)
+
+    # single pass over the lines collecting keyword values
+    entries, takeProfits, targets, stopLosses, stopLossesLong = [], [], [], [], []
+    sideEntry = None
+    side = order_type.lower() if order_type in ("Buy", "Sell") else None
+    for line, lower in zip(lines, lowered):
+        if line == "":
+            continue
+        keywords = set(LINE_KEYWORD_PATTERN.findall(lower))
+        if keywords:
+            value = last_float(line.split())
+            if value is not None:
+                if "entry" in keywords:
+                    entries.append(value)
+                if "tp" in keywords:
+                    takeProfits.append(value)
+                if "target profit" in keywords:
+                    targets.append(value)
+                if "sl" in keywords:
+                    stopLosses.append(value)
+                if "stop loss" in keywords:
+                    stopLossesLong.append(value)
+        # the last line that mentions BUY/SELL holds the entry of a plain Buy/Sell signal
+        if side is not None and side in lower:
+            sideEntry = ENTRY_SPLIT_PATTERN.split(line)[-1]
+
+    # finds entry: 'Entry' line first, then the order type specific fallbacks
+    entry = None
+    if entries:
+        entry = entries[0]
+    elif side is not None:
+        entry = float(sideEntry) if sideEntry != "" else ""
+    elif order_type in ("Buy Limit", "Sell Limit"):
+        oneline = ENTRY_SPLIT_PATTERN.split(lines[0])[-1]
+        if oneline != "":
+            entry = float(oneline)
+        elif lines[1] != "":
+            entry = float((lines[1].split())[-1])
+        else:
+            entry = float((lines[2].split())[-1])
+
+    # market execution ("NOW") for Buy Now/Sell Now or a Buy/Sell without price
+    if order_type in ("Buy Now", "Sell Now"):
+        entry = "NOW"
+    elif side is not None:
+        if entry == "":
+            entry = "NOW"
+        else:
+            order_type = order_type + " Limit"
+
+    # finds take profit(s) and stop loss
+    if takeProfits:
+        takeProfit = takeProfits
+    elif targets:
+        takeProfit = targets
+    else:
+        takeProfit = [float((lines[3].split())[-1])]
+
+    if stopLosses:
+        stopLoss = stopLosses[0]
+    elif stopLossesLong:
+        stopLoss = stopLossesLong[0]
+    else:
+        stopLoss = float((lines[2].split())[-1])
+
+    return ParsedSignal(order_type, symbol, entry, stopLoss, takeProfit)
+
+
 def ParseSignal(signal: str) -> dict:
     """Starts process of parsing signal and entering trade on MetaTrader account.
 
@@ -901,1011 +2923,1033 @@ def ParseSignal(signal: str) -> dict:
     Returns:
         a dictionary that contains trade signal information
     """
+    # one snapshot for the whole signal, a reload meanwhile does not mix settings
+    cfg = settings
+    parsed = parse_signal_text(signal, cfg)
+    if parsed is None:
+        return {}
 
-    # converts message to list of strings for parsing
-    signal = remove_pips(signal)
-    signal = replace_spaces(signal)
-    signal = signal.splitlines()
-    signal = [line.rstrip() for line in signal]
+    trade = parsed.to_trade()
 
-    # signalstripemty = [x.strip(' ') for x in signal]
+    # adds risk factor and plan to trade
+    trade["RiskFactor"] = cfg.risk_factor
+    trade["RiskPerTrade"] = cfg.risk_per_trade
+    trade["Plan"] = cfg.plan
+    trade["TrailingStop"] = cfg.trailing_stop
 
-    trade = {}
+    return trade
 
-    # determines the order type of the trade
-    if (
-        "Buy Limit".lower() in signal[0].lower()
-        or "Buy Limit".lower() in signal[1].lower()
-        or "Buy Limit".lower() in signal[2].lower()
-    ):
-        trade["OrderType"] = "Buy Limit"
 
-    elif (
-        "Sell Limit".lower() in signal[0].lower()
-        or "Sell Limit".lower() in signal[1].lower()
-        or "Sell Limit".lower() in signal[2].lower()
-    ):
-        trade["OrderType"] = "Sell Limit"
+def GetTradeInformation(
+    update: Update, trade: dict, balance: float, spec: SymbolSpec = None
+) -> Optional[PrettyTable]:
+    """Calculates information from given trade including stop loss and take profit in pips, posiition size, and potential loss/profit.
 
-    elif (
-        "Buy Stop".lower() in signal[0].lower()
-        or "Buy Stop".lower() in signal[1].lower()
-        or "Buy Stop".lower() in signal[2].lower()
-    ):
-        trade["OrderType"] = "Buy Stop"
+    Arguments:
+        update: update from Telegram, None to only return the table and raise errors
+        trade: dictionary that stores trade information
+        balance: current balance of the MetaTrader account
+        spec: cached broker specification of the symbol, if available
 
-    elif (
-        "Sell Stop".lower() in signal[0].lower()
-        or "Sell Stop".lower() in signal[1].lower()
-        or "Sell Stop".lower() in signal[2].lower()
-    ):
-        trade["OrderType"] = "Sell Stop"
+    Returns:
+        the trade information table, or None if it could not be calculated
+    """
+    try:
+        # stop loss and take profits in pips, lot sizes, losses and profits per leg
+        sizing = size_trades([trade], [balance], [spec])[0]
+        trade["Sizing"] = sizing
+        trade["PipValue"] = sizing.pip_value
+        trade["PositionSize"] = sizing.position_size
+        if sizing.plan == "B":
+            trade["RR"] = sizing.rr
 
-    elif (
-        "Buy Now".lower() in signal[0].lower()
-        or "Buy Now".lower() in signal[1].lower()
-        or "Buy Now".lower() in signal[2].lower()
-    ):
-        trade["OrderType"] = "Buy Now"
+        # creates table with trade information
+        table = CreateTable(trade, balance, sizing)
+
+        # sends user trade information and calcualted risk
+        if update is not None:
+            reply(update, f"<pre>{table}</pre>", parse_mode=ParseMode.HTML)
+
+    except Exception as error:
+        if update is None:
+            raise
+        logger.error(f"Error Trade: {error}")
+        reply(
+            update,
+            f"There was an issue with the connection 😕\n\nError Message:\n{error}",
+        )
+        return None
+
+    return table
+
+
+def CreateTable(trade: dict, balance: float, sizing: TradeSizing) -> PrettyTable:
+    """Creates PrettyTable object to display trade information to user.
+
+    Arguments:
+        trade: dictionary that stores trade information
+        balance: current balance of the MetaTrader account
+        sizing: pips, lot sizes, losses and profits from size_trades
+
+    Returns:
+        a Pretty Table object that contains trade information
+    """
+    # creates prettytable object
+    table = PrettyTable()
+    if sizing.plan == "A":
+        table.title = "Trade InformationAI - Risk Position Size"
+    else:
+        table.title = "Trade Information AI - R:R Kelly Criterion"
+    table.field_names = ["Key", "Value"]
+    table.align["Key"] = "l"
+    table.align["Value"] = "l"
+
+    table.add_row([trade["OrderType"], trade["Symbol"]])
+    table.add_row(["Entry\n", trade["Entry"]])
+
+    table.add_row(["Stop Loss", "{} pips".format(sizing.stop_loss_pips)])
+    for count, takeProfit in enumerate(sizing.take_profit_pips):
+        table.add_row([f"TP {count + 1}", f"({takeProfit} pips)"])
+    table.add_row(["\n", ""])
+    table.add_row(["Stop Loss", trade["StopLoss"]])
+    for count, tradeTPflt in enumerate(trade["TP"]):
+        table.add_row([f"TP {count + 1}", f"{tradeTPflt}"])
+
+    if sizing.plan == "A":
+        table.add_row(
+            ["\nRisk Factor", "\n{:,.0f} %".format(trade["RiskFactor"] * 100)]
+        )
+        table.add_row(["Position Size", sizing.position_size])
+        table.add_row(["\nCurrent Balance", "\n$ {:,.2f}".format(balance)])
+        table.add_row(["Potential Loss", "$ {:,.2f}".format(sum(sizing.losses))])
+    else:
+        table.add_row(
+            ["\nRiskPerTrade", "\n{:,.0f} %".format(trade["RiskPerTrade"] * 100)]
+        )
+        for count, position_size in enumerate(sizing.position_size):
+            table.add_row([f"Position Size {count + 1}", round(position_size, 2)])
+        table.add_row(["\nCurrent Balance", "\n$ {:,.2f}".format(balance)])
+        for count, potential_loss in enumerate(sizing.losses):
+            table.add_row(
+                [f"Potential Loss {count + 1}", "$ {:,.2f}".format(potential_loss)]
+            )
+
+    # potential profit of each take profit leg
+    for count, profit in enumerate(sizing.profits):
+        table.add_row([f"TP {count + 1} Profit", "$ {:,.2f}".format(profit)])
+    skipped = skipped_legs(sizing)
+    if skipped:
+        table.add_row(["Not Placed", f"{', '.join(skipped)} (below min lot)"])
+
+    if sizing.plan == "A":
+        table.add_row(["\nTotal Profit", "\n$ {:,.2f}".format(sum(sizing.profits))])
+    else:
+        table.add_row(["\nTotal Loss", "\n$ {:,.2f}".format(sum(sizing.losses))])
+        table.add_row(["Total Profit", "$ {:,.2f}".format(sum(sizing.profits))])
+    return table
+
+
+def market_order_arguments(trade: dict, leg) -> tuple:
+    return (trade["Symbol"], leg.volume, trade["StopLoss"], leg.take_profit)
+
+
+def pending_order_arguments(trade: dict, leg) -> tuple:
+    return (
+        trade["Symbol"],
+        leg.volume,
+        trade["Entry"],
+        trade["StopLoss"],
+        leg.take_profit,
+    )
+
+
+# Order routing: every normalized order type maps to the SDK coroutine that places it
+# and to the positional argument shape that coroutine expects
+OrderRoute = namedtuple("OrderRoute", ["method", "arguments"])
+ORDER_ROUTES = {
+    "Buy": OrderRoute("create_market_buy_order", market_order_arguments),
+    "Buy Now": OrderRoute("create_market_buy_order", market_order_arguments),
+    "Buy Limit": OrderRoute("create_limit_buy_order", pending_order_arguments),
+    "Buy Stop": OrderRoute("create_stop_buy_order", pending_order_arguments),
+    "Sell": OrderRoute("create_market_sell_order", market_order_arguments),
+    "Sell Now": OrderRoute("create_market_sell_order", market_order_arguments),
+    "Sell Limit": OrderRoute("create_limit_sell_order", pending_order_arguments),
+    "Sell Stop": OrderRoute("create_stop_sell_order", pending_order_arguments),
+}
+
+# One leg of a signal: a single order with its own volume, take profit and trade options
+OrderLeg = namedtuple("OrderLeg", ["label", "volume", "take_profit", "options"])
+
+# TP1 leg moves its stop loss to entry once price covers this share of the way to TP1
+TRAILING_THRESHOLD_RATIO = 0.8
+TRAILING_THRESHOLD_DIGITS = 4
+
+
+def trailing_stop_options(threshold: float, stop_loss: float) -> dict:
+    """Trade options that move the stop loss to stop_loss once price reaches threshold."""
+    return {
+        "trailingStopLoss": {
+            "threshold": {
+                "thresholds": [{"threshold": threshold, "stopLoss": stop_loss}],
+                "units": "ABSOLUTE_PRICE",
+                "stopPriceBase": "CURRENT_PRICE",
+            }
+        }
+    }
+
+
+def build_leg_plan(trade: dict, trailing: bool, spec: SymbolSpec = None) -> list:
+    """Expresses the active plan as data: one OrderLeg per take profit.
+
+    The volume of every leg comes from the trade's Sizing (see size_trades): PLAN A
+    splits one position size evenly, PLAN B sizes each take profit; legs sized below
+    the minimum lot (volume 0) are left out. With trailing stop
+    enabled and at least two take profits, every leg moves its stop loss to entry:
+    the TP1 leg once price covers TRAILING_THRESHOLD_RATIO of the way to TP1, the
+    other legs once TP1 is reached.
+
+    Arguments:
+        trade: dictionary that stores trade information, including Sizing
+        trailing: whether the trailing stop configuration is enabled
+        spec: cached broker specification, used for price digits
+
+    Returns:
+        a list of OrderLeg
+    """
+    takeProfits = trade["TP"]
+    volumes = trade["Sizing"].volumes
+
+    options = [None] * len(takeProfits)
+    if trailing and len(takeProfits) >= 2:
+        entryTrade = float(trade["Entry"])
+        tradeFirstTP = float(takeProfits[0])
+        threshold_TP1 = round(
+            entryTrade + (tradeFirstTP - entryTrade) * TRAILING_THRESHOLD_RATIO,
+            spec.digits if spec is not None else TRAILING_THRESHOLD_DIGITS,
+        )
+        options = [trailing_stop_options(threshold_TP1, entryTrade)] + [
+            trailing_stop_options(tradeFirstTP, entryTrade)
+        ] * (len(takeProfits) - 1)
+
+    return [
+        OrderLeg(f"TP {count + 1}", volume, takeProfit, option)
+        for count, (volume, takeProfit, option) in enumerate(
+            zip(volumes, takeProfits, options)
+        )
+        if volume
+    ]
+
+
+def order_leg_coroutines(connection, trade: dict, legs: list) -> list:
+    """Dispatches every leg of a plan to the SDK call of the trade's order type.
+
+    Arguments:
+        connection: MetaApi RPC connection
+        trade: dictionary that stores trade information
+        legs: list of OrderLeg from build_leg_plan
+
+    Returns:
+        a list of (label, coroutine) tuples for submit_order_legs
+    """
+    route = ORDER_ROUTES[trade["OrderType"]]
+    create_order = getattr(connection, route.method)
+
+    orders = []
+    for leg in legs:
+        args = route.arguments(trade, leg)
+        if leg.options is not None:
+            args += (leg.options,)
+        orders.append((leg.label, create_order(*args)))
+    return orders
+
+
+def is_trade_success(error: Exception) -> bool:
+    """MetaApi reports some successful trades as TradeException with ERR_NO_ERROR."""
+    return (
+        getattr(error, "stringCode", None) == "ERR_NO_ERROR"
+        or getattr(error, "numericCode", None) == 0
+    )
+
+
+async def submit_order_legs(legs: list, concurrency: int = None) -> list:
+    """Submits the order legs of one signal concurrently.
+
+    Arguments:
+        legs: list of (label, coroutine) tuples, one per take profit
+        concurrency: maximum number of orders in flight, defaults to ORDER_CONCURRENCY
+
+    Returns:
+        a list of (label, result, error) tuples in the same order as legs
+    """
+    semaphore = asyncio.Semaphore(max(1, concurrency or ORDER_CONCURRENCY))
+
+    async def submit(label, order):
+        async with semaphore:
+            try:
+                return label, await order, None
+            except Exception as error:
+                if is_trade_success(error):
+                    return label, {"stringCode": error.stringCode}, None
+                return label, None, error
+
+    return await asyncio.gather(*(submit(label, order) for label, order in legs))
+
+
+def format_order_summary(results: list) -> str:
+    """Creates one message that reports the outcome of every order leg.
+
+    Arguments:
+        results: list of (label, result, error) tuples from submit_order_legs
+
+    Returns:
+        summary text for the user
+    """
+    failed = [label for label, _, error in results if error is not None]
+    if not failed:
+        lines = ["Trade entered successfully! 💰"]
+    elif len(failed) < len(results):
+        lines = [
+            f"Trade partially entered: {len(results) - len(failed)}/{len(results)} orders placed ⚠️"
+        ]
+    else:
+        lines = ["Trade failed, no orders were placed 😕"]
+
+    for label, result, error in results:
+        if error is None:
+            order_id = result.get("orderId") or result.get("positionId") or ""
+            lines.append(f"{label}: ✅ {result.get('stringCode', 'OK')} {order_id}".rstrip())
+        else:
+            lines.append(f"{label}: ❌ {error}")
+    return "\n".join(lines)
+
+
+# Outcome of one signal on one account, error is None when nothing raised
+AccountResult = namedtuple(
+    "AccountResult", ["account", "trade", "table", "results", "error"]
+)
+
+
+async def place_on_account(
+    account: AccountSettings, trade: dict, enterTrade: bool, trace: SignalTrace
+) -> AccountResult:
+    """Sizes a copy of trade with the risk settings of account and submits its orders.
+
+    Arguments:
+        account: account to place the trade on
+        trade: parsed trade, left unchanged
+        enterTrade: False only connects and prices the trade
+        trace: timing spans of the signal
+
+    Returns:
+        an AccountResult with the sized trade and the order leg results
+    """
+    trade = dict(
+        trade,
+        TP=list(trade["TP"]),
+        RiskFactor=account.risk_factor,
+        RiskPerTrade=account.risk_per_trade,
+        Plan=account.plan,
+        TrailingStop=account.trailing_stop,
+    )
+    table = results = None
+    try:
+        # reuses the shared, already synchronized connection of the account
+        manager = get_connection_manager(account.account_id)
+        with trace.span("connection", account.name):
+            connection = await manager.get_connection()
+
+        # obtains account information from the mirror or the MetaTrader server
+        with trace.span("account_info", account.name):
+            account_information = await manager.get_account_information()
+        # digits, pip and lot sizes of the symbol, from the cache when fresh
+        with trace.span("symbol_spec", account.name):
+            spec = await manager.symbol_specs.ensure(connection, trade["Symbol"])
+
+        # latest streamed quote, one RPC round trip only when it is stale
+        with trace.span("price", account.name):
+            price = await manager.get_price(trade["Symbol"])
+        # checks if the order is a market execution to get the current price of symbol
+        if trade["Entry"] == "NOW":
+            # uses ask price if the order type is a buy
+            if trade["OrderType"] == "Buy" or trade["OrderType"] == "Buy Now":
+                trade["Entry"] = float(price["ask"])
+
+            # uses bid price if the order type is a sell
+            if trade["OrderType"] == "Sell" or trade["OrderType"] == "Sell Now":
+                trade["Entry"] = float(price["bid"])
+
+        # checks if the user has indicated to enter trade
+        if enterTrade == True:
+            # Kiểm tra nếu giá hiện tại thấp hơn giá Entry cho lệnh Buy Limit
+            if (
+                trade["OrderType"] == "Buy Limit"
+                and float(price["bid"]) < trade["Entry"]
+            ):
+                trade["OrderType"] = "Buy Stop"
+
+            # Kiểm tra nếu giá hiện tại cao hơn giá Entry cho lệnh Sell Limit
+            elif (
+                trade["OrderType"] == "Sell Limit"
+                and float(price["ask"]) > trade["Entry"]
+            ):
+                trade["OrderType"] = "Sell Stop"
+
+            # GET INFOMATION TRADE - CREATE TABLE TRADE
+            with trace.span("sizing", account.name):
+                table = GetTradeInformation(
+                    None, trade, account_information["balance"], spec
+                )
+                if not any(trade["Sizing"].volumes):
+                    raise ValueError(
+                        f"Position size is below the minimum lot of {trade['Symbol']}"
+                        " for this risk, trade not placed"
+                    )
+
+                # builds the legs of the active plan, each routed to its SDK call
+                legs = build_leg_plan(trade, trade["TrailingStop"] == "Y", spec)
+            # submits every take profit leg concurrently
+            with trace.span("orders", account.name):
+                results = await submit_order_legs(
+                    order_leg_coroutines(connection, trade, legs)
+                )
+
+            # prints result to console
+            logger.info(
+                f"\nsignal={trace.id} account={account.name}"
+                f" order legs submitted: {results}\n"
+            )
+    except Exception as error:
+        if is_trade_success(error):
+            logger.info(f"\nTrade with ERR_NO_ERROR : {error}\n")
+        else:
+            logger.error(
+                f"signal={trace.id} account={account.name} error trade: {error}"
+            )
+            return AccountResult(account, trade, table, results, error)
+    return AccountResult(account, trade, table, results, None)
 
-    elif (
-        "Sell Now".lower() in signal[0].lower()
-        or "Sell Now".lower() in signal[1].lower()
-        or "Sell Now".lower() in signal[2].lower()
-    ):
-        trade["OrderType"] = "Sell Now"
 
-    elif (
-        "Buy".lower() in signal[0].lower()
-        or "Buy".lower() in signal[1].lower()
-        or "Buy".lower() in signal[2].lower()
-    ):
-        trade["OrderType"] = "Buy"
+def account_placed(result: AccountResult) -> bool:
+    """True if every order leg of the account was placed."""
+    return result.error is None and all(
+        error is None for _, _, error in result.results or ()
+    )
 
-    elif (
-        "Sell".lower() in signal[0].lower()
-        or "Sell".lower() in signal[1].lower()
-        or "Sell".lower() in signal[2].lower()
-    ):
-        trade["OrderType"] = "Sell"
 
-    # returns an empty dictionary if an invalid order type was given
-    else:
-        return {}
+def format_volume(size) -> str:
+    """Position size of a sized trade: one volume (PLAN A) or one per take profit."""
+    if isinstance(size, list):
+        return "+".join(f"{volume:g}" for volume in size)
+    return f"{size:g}"
 
-    # extracts symbolplus '/' from trade signal if found then replace '/' to ''
-    symbolflag = 0
-    for elemental in SYMBOLSPLUS:
-        calcusymbol = signal[0].upper().find(elemental, 0)
-        if calcusymbol != -1:
-            trade["Symbol"] = elemental.replace("/", "")
-            symbolflag = 1
-
-    # extracts symbol from trade signal
-    if symbolflag == 0:
-        for element in SYMBOLS:
-            calcu = signal[0].upper().find(element, 0)
-            if calcu != -1:
-                trade["Symbol"] = element
-
-    # checks if the symbol is valid, if not, returns an empty dictionary
-    if trade["Symbol"] not in SYMBOLS:
-        return {}
 
-    # change symbol trade signal
-    if trade["Symbol"] == "GOLD":
-        trade["Symbol"] = "XAUUSD"
-    elif trade["Symbol"] == "NAS100":
-        trade["Symbol"] = "USTEC"
-
-    # Find symbol 'Entry' if found 'entry' will get float entry in Signal and specical Entry = NOW
-    entrygetbuy = FindTP("ENTRY", signal)
-    flagbuyentry = 0
-    if len(entrygetbuy) > 0:
-        trade["Entry"] = float(entrygetbuy[0])
-        flagbuyentry = 1
-
-    # checks entry for 'BUY'/'SELL' OrderType
-    if (
-        trade["OrderType"] == "Buy" or trade["OrderType"] == "Sell"
-    ) and flagbuyentry == 0:
-        memforfindorderentry = trade["OrderType"].upper()
-        for i in range(len(signal)):
-            if signal[i] != "":
-                j = signal[i].upper().find(memforfindorderentry, 0)
-                if j != -1 and i == 0:
-                    getentryfirstline = re.split(
-                        "[a-z]+|[-,/,@]", signal[i], flags=re.IGNORECASE
-                    )[-1]
-                    if getentryfirstline != "":
-                        trade["Entry"] = float(getentryfirstline)
-                    else:
-                        trade["Entry"] = ""
-                elif j != -1 and i > 0:
-                    getentrybyline = re.split(
-                        "[a-z]+|[-,/,@]", signal[i], flags=re.IGNORECASE
-                    )[-1]
-                    if getentrybyline != "":
-                        trade["Entry"] = float(getentrybyline)
-                    else:
-                        trade["Entry"] = ""
-    # checks wheter or not to convert entry to float because of market exectution option ("NOW")
-    if (
-        trade["OrderType"] == "Buy Limit" or trade["OrderType"] == "Sell Limit"
-    ) and flagbuyentry == 0:
-        oneline = re.split("[a-z]+|[-,/,@]", signal[0], flags=re.IGNORECASE)[-1]
-        if oneline != "":
-            trade["Entry"] = float(oneline)
+def send_account_report(update: Update, trade: dict, placed: list) -> None:
+    """Sends the outcome of a signal on all accounts as one report.
 
-        elif oneline == "" and signal[1] != "":
-            trade["Entry"] = float((signal[1].split())[-1])
+    A single account gets its trade information table and order summary, several
+    accounts get one line per account with its size and each order leg.
 
-        else:
-            trade["Entry"] = float((signal[2].split())[-1])
-
-    # checks wheter or not to convert entry to float because of market exectution option ("NOW")
-    if trade["OrderType"] == "Buy Now" or trade["OrderType"] == "Sell Now":
-        trade["Entry"] = "NOW"
-
-    # Change symbol ordertype from buy/sell to buy limit/sell limit with if : trade['Entry'] != NOW
-    if trade["OrderType"] == "Buy" and trade["Entry"] != "NOW" and trade["Entry"] != "":
-        trade["OrderType"] = "Buy Limit"
-    elif (
-        trade["OrderType"] == "Sell"
-        and trade["Entry"] != "NOW"
-        and trade["Entry"] != ""
-    ):
-        trade["OrderType"] = "Sell Limit"
-    elif (
-        trade["OrderType"] == "Buy" and trade["Entry"] != "NOW" and trade["Entry"] == ""
-    ):
-        trade["Entry"] = "NOW"
-    elif (
-        trade["OrderType"] == "Sell"
-        and trade["Entry"] != "NOW"
-        and trade["Entry"] == ""
-    ):
-        trade["Entry"] = "NOW"
-
-    # find and add TP
-    arraytp = FindTP("TP", signal)
-    arraytarget = FindTP("Target Profit", signal)
-    if len(arraytp) > 0:
-        trade["TP"] = arraytp
-    elif len(arraytarget) > 0 and len(arraytp) == 0:
-        trade["TP"] = arraytarget
-    else:
-        trade["TP"] = [float((signal[3].split())[-1])]
-
-    # find and add SL
-    stoplosser = FindTP("SL", signal)
-    stoplosserb = FindTP("STOP LOSS", signal)
-    if len(stoplosser) > 0:
-        trade["StopLoss"] = float(stoplosser[0])
-    elif len(stoplosserb) > 0 and len(stoplosser) == 0:
-        trade["StopLoss"] = float(stoplosserb[0])
+    Arguments:
+        update: update from Telegram
+        trade: parsed trade
+        placed: AccountResult of every account
+    """
+    if len(placed) == 1:
+        result = placed[0]
+        header = None
     else:
-        trade["StopLoss"] = float((signal[2].split())[-1])
-
-    # adds risk factor to trade
-    trade["RiskFactor"] = RISK_FACTOR
-    trade["RiskPerTrade"] = RISK_PERTRADE
+        succeeded = sum(account_placed(result) for result in placed)
+        mark = "✅" if succeeded == len(placed) else "⚠️" if succeeded else "❌"
+        header = (
+            f"{html.escape(trade['Symbol'])} {html.escape(trade['OrderType'])}:"
+            f" placed on {succeeded}/{len(placed)} accounts {mark}"
+        )
+    with ReplyBatch(update, header, parse_mode=ParseMode.HTML) as batch:
+        for result in placed:
+            if len(placed) == 1:
+                if result.table is not None:
+                    batch.add(f"<pre>{result.table}</pre>")
+            else:
+                size = result.trade.get("PositionSize")
+                sizing = result.trade.get("Sizing")
+                skipped = skipped_legs(sizing) if sizing is not None else []
+                batch.add(
+                    f"\n<b>{html.escape(result.account.name)}</b>"
+                    + (f" {format_volume(size)} lots" if size is not None else "")
+                    + (
+                        f" ({', '.join(skipped)} below min lot, not placed)"
+                        if skipped
+                        else ""
+                    )
+                )
+            if result.results is not None:
+                batch.add(html.escape(format_order_summary(result.results)))
+            if result.error is not None:
+                batch.add(
+                    html.escape(
+                        "There was an issue ConnectMetaTrader 😕"
+                        f"\n\nError Message:\n{result.error}"
+                    )
+                )
 
-    return trade
 
+async def ConnectMetaTrader(
+    update: Update, trade: dict, enterTrade: bool, trace: SignalTrace = None
+):
+    """Places trade on every configured account concurrently and reports once.
 
-def GetTradeInformation(update: Update, trade: dict, balance: float) -> None:
-    """Calculates information from given trade including stop loss and take profit in pips, posiition size, and potential loss/profit.
+    The trade is parsed once; each account sizes its own copy with its risk settings
+    over its warm connection, so copying to more accounts adds little latency.
 
     Arguments:
         update: update from Telegram
         trade: dictionary that stores trade information
-        balance: current balance of the MetaTrader account
+        enterTrade: False only connects and prices the trade
+        trace: timing spans of the signal, finished here
+
+    Returns:
+        A coroutine that confirms that the connection to MetaAPI/MetaTrader and trade placement were successful
     """
-    try:
-        default_multiplier = 0.0001
-        # calculates the stop loss in pips
-        if trade["Symbol"] == "XAUUSD":
-            multiplier = 0.1
-
-        elif trade["Symbol"] == "XAGUSD":
-            multiplier = 0.001
-
-        elif trade["Symbol"] in ["US30", "US500", "USTEC", "NAS100"]:
-            multiplier = 0.1
-        elif str(trade["Entry"]).index(".") >= 2:
-            multiplier = 0.01
-        else:
-            multiplier = 0.0001
+    trace = trace or SignalTrace()
+    accounts = settings.accounts
+
+    if enterTrade == True:
+        # enters trade on to MetaTrader accounts
+        reply(
+            update,
+            "Entering trade on MetaTrader Account ... 👨🏾‍💻"
+            if len(accounts) == 1
+            else f"Entering trade on {len(accounts)} MetaTrader Accounts ... 👨🏾‍💻",
+        )
 
-        # calculates the stop loss in pips
-        stopLossPips = abs(round((trade["StopLoss"] - trade["Entry"]) / multiplier))
+    placed = await asyncio.gather(
+        *(place_on_account(account, trade, enterTrade, trace) for account in accounts)
+    )
 
-        # calculates the take profit(s) in pips
-        takeProfitPips = []
-        for takeProfit in trade["TP"]:
-            takeProfitPips.append(
-                abs(round((takeProfit - trade["Entry"]) / multiplier))
-            )
-        tradeTP = []
-        for takeProfit in trade["TP"]:
-            tradeTP.append(takeProfit)
-
-        if PLAN == "A":
-            # calculates the position size using stop loss and RISK FACTOR
-            trade["PositionSize"] = (
-                math.floor(((balance * trade["RiskFactor"]) / stopLossPips) / 10 * 100)
-                / 100
-            )
-        elif PLAN == "B":
-            # calculates the position size using stop loss and RISK FACTOR
-            rr_coefficient = calculate_rr_coefficient(takeProfitPips, stopLossPips)
-            positionSize = []
-            rickandreward = []
-            for rr in rr_coefficient:
-                position_size = (
-                    math.floor(
-                        ((balance * trade["RiskPerTrade"] * rr) / stopLossPips)
-                        / 10
-                        * 100
-                    )
-                    / 100
-                )
-                positionSize.append(position_size)
-                rickandreward.append(rr)
-            trade["RR"] = rickandreward
-            trade["PositionSize"] = positionSize
-        # creates table with trade information
-        table = CreateTable(trade, balance, stopLossPips, takeProfitPips, tradeTP)
+    if enterTrade != True:
+        # market price of the first account for the caller
+        trade["Entry"] = placed[0].trade["Entry"]
+        trace.finish("calculated")
+        return
 
-        # sends user trade information and calcualted risk
-        update.effective_message.reply_text(
-            f"<pre>{table}</pre>", parse_mode=ParseMode.HTML
-        )
+    send_account_report(update, trade, placed)
+    succeeded = sum(account_placed(result) for result in placed)
+    if succeeded == len(placed):
+        trace.finish("placed")
+    else:
+        trace.finish("partial" if succeeded else "error")
+    return
 
-    except Exception as error:
-        logger.error(f"Error Trade: {error}")
-        update.effective_message.reply_text(
-            f"There was an issue with the connection 😕\n\nError Message:\n{error}"
-        )
 
-    return
+# Work queue between "signal parsed" and "orders placed"
+SignalJob = namedtuple(
+    "SignalJob", ["symbol", "update", "trade", "enqueued_at", "trace"]
+)
+OVERFLOW_POLICIES = ("REJECT", "DROP_OLDEST", "COALESCE")
 
 
-def CreateTable(
-    trade: dict, balance: float, stopLossPips: int, takeProfitPips: int, tradeTP: float
-) -> PrettyTable:
-    """Creates PrettyTable object to display trade information to user.
+class SignalQueue:
+    """Bounded queue of parsed signals served by SIGNAL_WORKERS coroutines.
 
-    Arguments:
-        trade: dictionary that stores trade information
-        balance: current balance of the MetaTrader account
-        stopLossPips: the difference in pips from stop loss price to entry price
+    Signals of one symbol are placed one after another in arrival order, different
+    symbols run in parallel. When SIGNAL_QUEUE_SIZE signals are waiting, a new one is
+    handled by the overflow policy:
+        REJECT: the new signal is refused
+        DROP_OLDEST: the longest waiting signal is dropped to make room
+        COALESCE: the new signal replaces the latest waiting signal of its symbol,
+            and is refused if its symbol has none waiting
 
-    Returns:
-        a Pretty Table object that contains trade information
+    Everything runs on the shared event loop; put() is called through run_coroutine.
+
+    Arguments:
+        workers: number of signals placed concurrently
+        max_size: maximum number of waiting signals
+        overflow: one of OVERFLOW_POLICIES
     """
-    if PLAN == "A":
-        # creates prettytable object
-        table = PrettyTable()
-        table.title = "Trade InformationAI - Risk Position Size"
-        table.field_names = ["Key", "Value"]
-        table.align["Key"] = "l"
-        table.align["Value"] = "l"
 
-        table.add_row([trade["OrderType"], trade["Symbol"]])
-        table.add_row(["Entry\n", trade["Entry"]])
+    def __init__(
+        self,
+        workers: int = SIGNAL_WORKERS,
+        max_size: int = SIGNAL_QUEUE_SIZE,
+        overflow: str = SIGNAL_OVERFLOW,
+    ):
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError(f"SIGNAL_OVERFLOW must be one of {OVERFLOW_POLICIES}")
+        self.workers = workers
+        self.max_size = max_size
+        self.overflow = overflow
+        self.counters = Counter()
+        # seconds each signal waited before a worker picked it up (last 1000)
+        self.waits = deque(maxlen=1000)
+        self._pending = {}
+        self._ready = deque()
+        self._active = set()
+        self._size = 0
+        self._condition = None
+        self._tasks = []
+
+    def _start(self) -> None:
+        # workers and the condition belong to the event loop that runs put();
+        # a worker that died is logged and replaced, the others keep waiting
+        if self._condition is None:
+            self._condition = asyncio.Condition()
+        alive = []
+        for task in self._tasks:
+            if task.done():
+                log_future_error(task)
+            else:
+                alive.append(task)
+        self._tasks = alive + [
+            asyncio.ensure_future(self._worker())
+            for _ in range(self.workers - len(alive))
+        ]
 
-        table.add_row(["Stop Loss", "{} pips".format(stopLossPips)])
+    def _drop_oldest(self) -> SignalJob:
+        symbol = min(
+            self._pending, key=lambda symbol: self._pending[symbol][0].enqueued_at
+        )
+        job = self._pending[symbol].popleft()
+        if not self._pending[symbol]:
+            del self._pending[symbol]
+            if symbol in self._ready:
+                self._ready.remove(symbol)
+        self._size -= 1
+        return job
 
-        for count, takeProfit in enumerate(takeProfitPips):
-            table.add_row([f"TP {count + 1}", f"({takeProfit} pips)"])
-        table.add_row(["\n", ""])
-        table.add_row(["Stop Loss", trade["StopLoss"]])
-        for count, tradeTPflt in enumerate(tradeTP):
-            table.add_row([f"TP {count + 1}", f"{tradeTPflt}"])
+    async def put(self, update: Update, trade: dict, trace: SignalTrace = None) -> str:
+        """Queues a parsed trade.
 
-        table.add_row(
-            ["\nRisk Factor", "\n{:,.0f} %".format(trade["RiskFactor"] * 100)]
+        Returns:
+            "queued", "coalesced", "rejected", or "queued" after dropping the oldest
+        """
+        self._start()
+        job = SignalJob(
+            trade["Symbol"], update, trade, time.monotonic(), trace or SignalTrace()
         )
-        table.add_row(["Position Size", trade["PositionSize"]])
-
-        table.add_row(["\nCurrent Balance", "\n$ {:,.2f}".format(balance)])
+        async with self._condition:
+            if self._size >= self.max_size:
+                if self.overflow == "COALESCE" and self._pending.get(job.symbol):
+                    replaced = self._pending[job.symbol].pop()
+                    self._pending[job.symbol].append(job)
+                    self.counters["coalesced"] += 1
+                    replaced.trace.finish("coalesced")
+                    signal_dedupe.discard(
+                        signal_fingerprint(
+                            replaced.trade, replaced.update.effective_chat.id
+                        )
+                    )
+                    reply(
+                        replaced.update, "Replaced by a newer signal for this symbol ♻️"
+                    )
+                    return "coalesced"
+                if self.overflow != "DROP_OLDEST":
+                    self.counters["rejected"] += 1
+                    job.trace.finish("rejected")
+                    return "rejected"
+                dropped = self._drop_oldest()
+                self.counters["dropped"] += 1
+                dropped.trace.finish("dropped")
+                signal_dedupe.discard(
+                    signal_fingerprint(dropped.trade, dropped.update.effective_chat.id)
+                )
+                reply(
+                    dropped.update, "Signal queue is full, this signal was dropped ⚠️"
+                )
+            self._pending.setdefault(job.symbol, deque()).append(job)
+            self._size += 1
+            self.counters["queued"] += 1
+            if job.symbol not in self._active and job.symbol not in self._ready:
+                self._ready.append(job.symbol)
+                self._condition.notify()
+        return "queued"
+
+    async def _worker(self) -> None:
+        while True:
+            async with self._condition:
+                await self._condition.wait_for(lambda: self._ready)
+                symbol = self._ready.popleft()
+                job = self._pending[symbol].popleft()
+                if not self._pending[symbol]:
+                    del self._pending[symbol]
+                self._size -= 1
+                self._active.add(symbol)
+            self.waits.append(time.monotonic() - job.enqueued_at)
+            job.trace.add("queue_wait", self.waits[-1])
+            try:
+                await ConnectMetaTrader(job.update, job.trade, True, job.trace)
+                self.counters["placed"] += 1
+            except Exception as e:
+                self.counters["failed"] += 1
+                job.trace.finish("failed")
+                logger.error(f"signal={job.trace.id} worker failed on {job.trade}: {e}")
+            async with self._condition:
+                self._active.discard(symbol)
+                # the next signal of this symbol may start only now
+                if symbol in self._pending:
+                    self._ready.append(symbol)
+                self._condition.notify_all()
+
+    async def stop(self, timeout: float = 30) -> None:
+        """Lets queued signals finish for up to timeout seconds, then stops the workers."""
+        if self._condition is not None:
+            try:
+                async with self._condition:
+                    await asyncio.wait_for(
+                        self._condition.wait_for(
+                            lambda: not self._size and not self._active
+                        ),
+                        timeout,
+                    )
+            except asyncio.TimeoutError:
+                logger.warning(f"Stopping with {self._size} signals still queued")
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def stats(self) -> dict:
+        """Queue depth, counters and wait time percentiles in milliseconds."""
+        waits = sorted(self.waits)
+
+        def percentile(p):
+            if not waits:
+                return 0.0
+            return waits[min(len(waits) - 1, int(p * len(waits)))] * 1000
+
+        return {
+            "depth": self._size,
+            "running": len(self._active),
+            **self.counters,
+            "wait p50 ms": round(percentile(0.50), 1),
+            "wait p95 ms": round(percentile(0.95), 1),
+            "wait max ms": round(waits[-1] * 1000, 1) if waits else 0.0,
+        }
+
+
+signal_queue = SignalQueue()
+
+
+def handle_queue_stats(update: Update, context: CallbackContext) -> None:
+    """Sends the signal queue depth, counters and wait times."""
+    table = PrettyTable(["Queue", "Value"])
+    table.align["Queue"] = "l"
+    table.align["Value"] = "r"
+    for name, value in signal_queue.stats().items():
+        table.add_row([name, value])
+    for name in ("queued", "duplicate", "forbidden", "invalid"):
+        table.add_row([f"webhook {name}", webhook_counters[name]])
+    reply(update, f"<pre>{table}</pre>", parse_mode=ParseMode.HTML)
+
+
+def handle_stats(update: Update, context: CallbackContext) -> None:
+    """Sends latency percentiles of every stage of the signal path in milliseconds."""
+    table = FixedWidthTable(["Stage", "n", "p50", "p95", "p99", "max"], "Latency ms")
+    for stage, values in latency_stats.summary().items():
         table.add_row(
-            [
-                "Potential Loss",
-                "$ {:,.2f}".format(
-                    round((trade["PositionSize"] * 10) * stopLossPips, 2)
-                ),
-            ]
+            [stage, values["count"]]
+            + [f"{values[key] * 1000:.1f}" for key in ("p50", "p95", "p99", "max")]
         )
-
-        # total potential profit from trade
-        totalProfit = 0
-
-        for count, takeProfit in enumerate(takeProfitPips):
-            profit = round(
-                (trade["PositionSize"] * 10 * (1 / len(takeProfitPips))) * takeProfit, 2
+    outcomes = ", ".join(
+        f"{outcome} {count}" for outcome, count in latency_stats.outcomes.items()
+    )
+    with ReplyBatch(update) as batch:
+        for chunk in table.chunks():
+            batch.add(chunk)
+        batch.add(f"Signals: {outcomes or 'none yet'}")
+
+
+def format_metrics() -> str:
+    """Latency summaries and queue gauges in the Prometheus text format."""
+    lines = [
+        "# HELP signal_stage_seconds Duration of each stage of the signal path",
+        "# TYPE signal_stage_seconds summary",
+    ]
+    for stage, values in latency_stats.summary().items():
+        for key, quantile in (("p50", "0.5"), ("p95", "0.95"), ("p99", "0.99")):
+            lines.append(
+                f'signal_stage_seconds{{stage="{stage}",quantile="{quantile}"}} '
+                f"{values[key]:.6f}"
             )
-            table.add_row([f"TP {count + 1} Profit", "$ {:,.2f}".format(profit)])
+        lines.append(f'signal_stage_seconds_sum{{stage="{stage}"}} {values["sum"]:.6f}')
+        lines.append(f'signal_stage_seconds_count{{stage="{stage}"}} {values["count"]}')
+    lines += [
+        "# HELP signal_outcomes_total Signals by how their processing ended",
+        "# TYPE signal_outcomes_total counter",
+    ]
+    for outcome, count in latency_stats.outcomes.items():
+        lines.append(f'signal_outcomes_total{{outcome="{outcome}"}} {count}')
+    queue = signal_queue.stats()
+    lines += [
+        "# HELP signal_queue_depth Signals waiting for a worker",
+        "# TYPE signal_queue_depth gauge",
+        f"signal_queue_depth {queue['depth']}",
+        "# HELP signal_queue_running Signals being placed",
+        "# TYPE signal_queue_running gauge",
+        f"signal_queue_running {queue['running']}",
+    ]
+    return "\n".join(lines) + "\n"
+
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    """Serves format_metrics() at /metrics."""
+
+    def do_GET(self) -> None:
+        if self.path.split("?", 1)[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = format_metrics().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args) -> None:
+        # scrapes every few seconds would flood the bot log
+        return
 
-            # sums potential profit from each take profit target
-            totalProfit += profit
 
-        table.add_row(["\nTotal Profit", "\n$ {:,.2f}".format(totalProfit)])
-    elif PLAN == "B":
-        # creates prettytable object
-        table = PrettyTable()
-        table.title = "Trade Information AI - R:R Kelly Criterion"
-        table.field_names = ["Key", "Value"]
-        table.align["Key"] = "l"
-        table.align["Value"] = "l"
+def start_metrics_server(host: str = METRICS_HOST, port: int = METRICS_PORT):
+    """Serves /metrics from a daemon thread; returns the server, or None when off."""
+    if not port:
+        return None
+    try:
+        server = ThreadingHTTPServer((host, port), MetricsHandler)
+    except OSError as e:
+        logger.error(f"Metrics endpoint not started on {host}:{port}: {e}")
+        return None
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics", daemon=True).start()
+    logger.info(f"Metrics at http://{host}:{port}/metrics")
+    return server
 
-        table.add_row([trade["OrderType"], trade["Symbol"]])
-        table.add_row(["Entry\n", trade["Entry"]])
 
-        table.add_row(["Stop Loss", "{} pips".format(stopLossPips)])
-        positionSize = trade["PositionSize"]
+# Telegram sends the secret_token given to setWebhook in this header
+SECRET_TOKEN_HEADER = "X-Telegram-Bot-Api-Secret-Token"
 
-        for count, takeProfit in enumerate(takeProfitPips):
-            table.add_row([f"TP {count + 1}", f"({takeProfit} pips)"])
-        table.add_row(["\n", ""])
-        table.add_row(["Stop Loss", trade["StopLoss"]])
-        for count, tradeTPflt in enumerate(tradeTP):
-            table.add_row([f"TP {count + 1}", f"{tradeTPflt}"])
 
-        table.add_row(
-            ["\nRiskPerTrade", "\n{:,.0f} %".format(trade["RiskPerTrade"] * 100)]
-        )
+class UpdateSeenSet:
+    """Remembers the last max_entries update_ids accepted by the webhook.
 
-        for count, position_size in enumerate(positionSize):
-            if isinstance(position_size, (int, float)):
-                rounded_position_size = round(position_size, 2)
-                table.add_row([f"Position Size {count + 1}", rounded_position_size])
-            else:
-                print(f"Skipping non-numeric value at index {count}")
-        # total potential loss from trade
-        totalLoss = 0
+    Telegram delivers an update again when the webhook does not answer in time, with
+    the same update_id, so a repeated update_id is acknowledged and dropped.
 
-        table.add_row(["\nCurrent Balance", "\n$ {:,.2f}".format(balance)])
-        for count, position_size in enumerate(positionSize):
-            if isinstance(position_size, (int, float)):
-                potential_loss = round((position_size * 10) * stopLossPips, 2)
-                table.add_row(
-                    [f"Potential Loss {count + 1}", "$ {:,.2f}".format(potential_loss)]
-                )
-                totalLoss += potential_loss
-            else:
-                print(f"Skipping non-numeric value at index {count}")
-        # total potential profit from trade
-        totalProfit = 0
-
-        for count, takeProfit in enumerate(takeProfitPips):
-            position_sizes = positionSize[count]
-            # Retrieve the corresponding position size for the current take profit level
-            # position_sz = trade['PositionSize'][count]
-            profit = round(position_size * 10 * takeProfit, 2)
-            table.add_row([f"TP {count + 1} Profit", "$ {:,.2f}".format(profit)])
-
-            # sums potential profit from each take profit target
-            totalProfit += profit
-        table.add_row(["\nTotal Loss", "\n$ {:,.2f}".format(totalLoss)])
-        table.add_row(["Total Profit", "$ {:,.2f}".format(totalProfit)])
-    return table
+    Arguments:
+        max_entries: maximum number of remembered update_ids
+    """
 
+    def __init__(self, max_entries: int = UPDATE_SEEN_MAX):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
 
-async def ConnectMetaTrader(update: Update, trade: dict, enterTrade: bool):
-    """Attempts connection to MetaAPI and MetaTrader to place trade.
+    def check_and_add(self, update_id: int) -> bool:
+        """Returns True if update_id was seen before, else records it."""
+        with self._lock:
+            if update_id in self._entries:
+                return True
+            self._entries[update_id] = None
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            self._added(update_id)
+        return False
 
-    Arguments:
-        update: update from Telegram
-        trade: dictionary that stores trade information
+    def _added(self, update_id: int) -> None:
+        pass
 
-    Returns:
-        A coroutine that confirms that the connection to MetaAPI/MetaTrader and trade placement were successful
-    """
 
-    # creates connection to MetaAPI
-    api = MetaApi(API_KEY)
+class PersistentUpdateSeenSet(UpdateSeenSet):
+    """UpdateSeenSet that appends every update_id to a file, so it survives restarts.
 
-    try:
-        account = await api.metatrader_account_api.get_account(ACCOUNT_ID)
-        initial_state = account.state
-        deployed_states = ["DEPLOYING", "DEPLOYED"]
+    Appending keeps the acknowledgement fast; the file is rewritten with only the
+    remembered update_ids once it holds twice as many lines.
 
-        if initial_state not in deployed_states:
-            #  wait until account is deployed and connected to broker
-            logger.info("Deploying account")
-            await account.deploy()
+    Arguments:
+        path: text file with one update_id per line
+    """
 
-        logger.info("Waiting for API server to connect to broker ...")
-        await account.wait_connected()
+    def __init__(self, path: str, max_entries: int = UPDATE_SEEN_MAX):
+        super().__init__(max_entries)
+        self.path = path
+        self._file = None
+        self._lines = 0
+        try:
+            with open(path) as file:
+                for line in file:
+                    if line.strip():
+                        self._entries[int(line)] = None
+                        self._lines += 1
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            logger.info(f"Loaded {len(self._entries)} update ids from {path}")
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            logger.warning(f"Could not load update ids from {path}: {e}")
 
-        # connect to MetaApi API
-        connection = account.get_rpc_connection()
-        await connection.connect()
+    def _added(self, update_id: int) -> None:
+        try:
+            if self._file is None:
+                self._file = open(self.path, "a")
+            self._file.write(f"{update_id}\n")
+            self._file.flush()
+            self._lines += 1
+            if self._lines >= 2 * self.max_entries:
+                self._compact()
+        except Exception as e:
+            logger.warning(f"Could not save update id to {self.path}: {e}")
 
-        # wait until terminal state synchronized to the local state
-        logger.info("Waiting for SDK to synchronize to terminal state ...")
-        await connection.wait_synchronized()
+    def _compact(self) -> None:
+        # write to a temporary file and rename, so a crash never leaves half a file
+        self._file.close()
+        self._file = None
+        temp = f"{self.path}.tmp"
+        with open(temp, "w") as file:
+            file.writelines(f"{update_id}\n" for update_id in self._entries)
+        os.replace(temp, self.path)
+        self._lines = len(self._entries)
 
-        # obtains account information from MetaTrader server
-        account_information = await connection.get_account_information()
 
-        update.effective_message.reply_text(
-            "Successfully connected to MetaTrader!\nCalculating trade risk ... 🤔"
-        )
-        price = await connection.get_symbol_price(symbol=trade["Symbol"])
-        # checks if the order is a market execution to get the current price of symbol
-        if trade["Entry"] == "NOW":
-            # uses ask price if the order type is a buy
-            if trade["OrderType"] == "Buy" or trade["OrderType"] == "Buy Now":
-                trade["Entry"] = float(price["ask"])
+if UPDATE_SEEN_FILE:
+    update_seen = PersistentUpdateSeenSet(UPDATE_SEEN_FILE)
+else:
+    update_seen = UpdateSeenSet()
 
-            # uses bid price if the order type is a sell
-            if trade["OrderType"] == "Sell" or trade["OrderType"] == "Sell Now":
-                trade["Entry"] = float(price["bid"])
+# what the webhook did with the requests it received, for /queuestats
+webhook_counters = Counter()
 
-        # produces a table with trade information
-        # GetTradeInformation(update, trade, account_information['balance'])
 
-        # checks if the user has indicated to enter trade
-        if enterTrade == True:
-            # enters trade on to MetaTrader account
-            update.effective_message.reply_text(
-                "Entering trade on MetaTrader Account ... 👨🏾‍💻"
-            )
+class WebhookServer:
+    """Ack-first webhook: answers Telegram at once, the dispatcher does the work.
 
-            try:
-                # executes buy market execution order
-                # Kiểm tra nếu giá hiện tại thấp hơn giá Entry cho lệnh Buy Limit
-                if (
-                    trade["OrderType"] == "Buy Limit"
-                    and float(price["bid"]) < trade["Entry"]
-                ):
-                    trade["OrderType"] = "Buy Stop"
-
-                # Kiểm tra nếu giá hiện tại cao hơn giá Entry cho lệnh Sell Limit
-                elif (
-                    trade["OrderType"] == "Sell Limit"
-                    and float(price["ask"]) > trade["Entry"]
-                ):
-                    trade["OrderType"] = "Sell Stop"
-
-                # GET INFOMATION TRADE - CREATE TABLE TRADE
-                # produces a table with trade information
-                GetTradeInformation(update, trade, account_information["balance"])
-
-                if PLAN == "A":
-                    # Kiểm tra nếu trailing stop được kích hoạt và có ít nhất 2 TP
-                    if TRAILINGSTOP == "Y" and len(trade["TP"]) >= 2:
-                        entryTrade = float(trade["Entry"])
-                        tradeFirstTP = float(trade["TP"][0])
-                        trailing_stop_config = {
-                            "trailingStopLoss": {
-                                "threshold": {
-                                    "thresholds": [
-                                        {
-                                            "threshold": tradeFirstTP,
-                                            "stopLoss": entryTrade,
-                                        }
-                                    ],
-                                    "units": "ABSOLUTE_PRICE",
-                                    "stopPriceBase": "CURRENT_PRICE",
-                                }
-                            }
-                        }
-
-                        threshold_TP1 = trade["Entry"] + (
-                            (trade["TP"][0] - trade["Entry"]) * 0.8
-                        )
-                        # decimal_places_entry = len(str(price['bid']).split('.')[-1]) if '.' in str(price['bid']) else 0
-                        decimal_places_entry = 4
-                        if decimal_places_entry == 0:
-                            threshold_TP1 = round(threshold_TP1)
-                        else:
-                            threshold_TP1 = round(threshold_TP1, decimal_places_entry)
-                        trailing_stop_TP1 = {
-                            "trailingStopLoss": {
-                                "threshold": {
-                                    "thresholds": [
-                                        {
-                                            "threshold": threshold_TP1,
-                                            "stopLoss": entryTrade,
-                                        }
-                                    ],
-                                    "units": "ABSOLUTE_PRICE",
-                                    "stopPriceBase": "CURRENT_PRICE",
-                                }
-                            }
-                        }
-                        # Tiếp tục thực hiện lệnh tương ứng
-                        for i, takeProfit in enumerate(trade["TP"]):
-                            if i >= 1:
-                                if trade["OrderType"] == "Buy":
-                                    result = await connection.create_market_buy_order(
-                                        trade["Symbol"],
-                                        trade["PositionSize"] / len(trade["TP"]),
-                                        trade["StopLoss"],
-                                        takeProfit,
-                                        trailing_stop_config,
-                                    )
-                                elif trade["OrderType"] == "Buy Now":
-                                    result = await connection.create_market_buy_order(
-                                        trade["Symbol"],
-                                        trade["PositionSize"] / len(trade["TP"]),
-                                        trade["StopLoss"],
-                                        takeProfit,
-                                        trailing_stop_config,
-                                    )
-                                elif trade["OrderType"] == "Buy Limit":
-                                    result = await connection.create_limit_buy_order(
-                                        trade["Symbol"],
-                                        trade["PositionSize"] / len(trade["TP"]),
-                                        trade["Entry"],
-                                        trade["StopLoss"],
-                                        takeProfit,
-                                        trailing_stop_config,
-                                    )
-                                elif trade["OrderType"] == "Buy Stop":
-                                    result = await connection.create_stop_buy_order(
-                                        trade["Symbol"],
-                                        trade["PositionSize"] / len(trade["TP"]),
-                                        trade["Entry"],
-                                        trade["StopLoss"],
-                                        takeProfit,
-                                        trailing_stop_config,
-                                    )
-                                elif trade["OrderType"] == "Sell":
-                                    result = await connection.create_market_sell_order(
-                                        trade["Symbol"],
-                                        trade["PositionSize"] / len(trade["TP"]),
-                                        trade["StopLoss"],
-                                        takeProfit,
-                                        trailing_stop_config,
-                                    )
-                                elif trade["OrderType"] == "Sell Now":
-                                    result = await connection.create_market_sell_order(
-                                        trade["Symbol"],
-                                        trade["PositionSize"] / len(trade["TP"]),
-                                        trade["StopLoss"],
-                                        takeProfit,
-                                        trailing_stop_config,
-                                    )
-                                elif trade["OrderType"] == "Sell Limit":
-                                    result = await connection.create_limit_sell_order(
-                                        trade["Symbol"],
-                                        trade["PositionSize"] / len(trade["TP"]),
-                                        trade["Entry"],
-                                        trade["StopLoss"],
-                                        takeProfit,
-                                        trailing_stop_config,
-                                    )
-                                elif trade["OrderType"] == "Sell Stop":
-                                    result = await connection.create_stop_sell_order(
-                                        trade["Symbol"],
-                                        trade["PositionSize"] / len(trade["TP"]),
-                                        trade["Entry"],
-                                        trade["StopLoss"],
-                                        takeProfit,
-                                        trailing_stop_config,
-                                    )
-                            else:
-                                if trade["OrderType"] == "Buy":
-                                    result = await connection.create_market_buy_order(
-                                        trade["Symbol"],
-                                        trade["PositionSize"] / len(trade["TP"]),
-                                        trade["StopLoss"],
-                                        takeProfit,
-                                        trailing_stop_TP1,
-                                    )
-                                elif trade["OrderType"] == "Buy Now":
-                                    result = await connection.create_market_buy_order(
-                                        trade["Symbol"],
-                                        trade["PositionSize"] / len(trade["TP"]),
-                                        trade["StopLoss"],
-                                        takeProfit,
-                                        trailing_stop_TP1,
-                                    )
-                                elif trade["OrderType"] == "Buy Limit":
-                                    result = await connection.create_limit_buy_order(
-                                        trade["Symbol"],
-                                        trade["PositionSize"] / len(trade["TP"]),
-                                        trade["Entry"],
-                                        trade["StopLoss"],
-                                        takeProfit,
-                                        trailing_stop_TP1,
-                                    )
-                                elif trade["OrderType"] == "Buy Stop":
-                                    result = await connection.create_stop_buy_order(
-                                        trade["Symbol"],
-                                        trade["PositionSize"] / len(trade["TP"]),
-                                        trade["Entry"],
-                                        trade["StopLoss"],
-                                        takeProfit,
-                                        trailing_stop_TP1,
-                                    )
-                                elif trade["OrderType"] == "Sell":
-                                    result = await connection.create_market_sell_order(
-                                        trade["Symbol"],
-                                        trade["PositionSize"] / len(trade["TP"]),
-                                        trade["StopLoss"],
-                                        takeProfit,
-                                        trailing_stop_TP1,
-                                    )
-                                elif trade["OrderType"] == "Sell Now":
-                                    result = await connection.create_market_sell_order(
-                                        trade["Symbol"],
-                                        trade["PositionSize"] / len(trade["TP"]),
-                                        trade["StopLoss"],
-                                        takeProfit,
-                                        trailing_stop_TP1,
-                                    )
-                                elif trade["OrderType"] == "Sell Limit":
-                                    result = await connection.create_limit_sell_order(
-                                        trade["Symbol"],
-                                        trade["PositionSize"] / len(trade["TP"]),
-                                        trade["Entry"],
-                                        trade["StopLoss"],
-                                        takeProfit,
-                                        trailing_stop_TP1,
-                                    )
-                                elif trade["OrderType"] == "Sell Stop":
-                                    result = await connection.create_stop_sell_order(
-                                        trade["Symbol"],
-                                        trade["PositionSize"] / len(trade["TP"]),
-                                        trade["Entry"],
-                                        trade["StopLoss"],
-                                        takeProfit,
-                                        trailing_stop_TP1,
-                                    )
-                    else:
-                        # Tiếp tục thực hiện lệnh tương ứng
-                        for takeProfit in trade["TP"]:
-                            if trade["OrderType"] == "Buy":
-                                result = await connection.create_market_buy_order(
-                                    trade["Symbol"],
-                                    trade["PositionSize"] / len(trade["TP"]),
-                                    trade["StopLoss"],
-                                    takeProfit,
-                                )
-                            elif trade["OrderType"] == "Buy Now":
-                                result = await connection.create_market_buy_order(
-                                    trade["Symbol"],
-                                    trade["PositionSize"] / len(trade["TP"]),
-                                    trade["StopLoss"],
-                                    takeProfit,
-                                )
-                            elif trade["OrderType"] == "Buy Limit":
-                                result = await connection.create_limit_buy_order(
-                                    trade["Symbol"],
-                                    trade["PositionSize"] / len(trade["TP"]),
-                                    trade["Entry"],
-                                    trade["StopLoss"],
-                                    takeProfit,
-                                )
-                            elif trade["OrderType"] == "Buy Stop":
-                                result = await connection.create_stop_buy_order(
-                                    trade["Symbol"],
-                                    trade["PositionSize"] / len(trade["TP"]),
-                                    trade["Entry"],
-                                    trade["StopLoss"],
-                                    takeProfit,
-                                )
-                            elif trade["OrderType"] == "Sell":
-                                result = await connection.create_market_sell_order(
-                                    trade["Symbol"],
-                                    trade["PositionSize"] / len(trade["TP"]),
-                                    trade["StopLoss"],
-                                    takeProfit,
-                                )
-                            elif trade["OrderType"] == "Sell Now":
-                                result = await connection.create_market_sell_order(
-                                    trade["Symbol"],
-                                    trade["PositionSize"] / len(trade["TP"]),
-                                    trade["StopLoss"],
-                                    takeProfit,
-                                )
-                            elif trade["OrderType"] == "Sell Limit":
-                                result = await connection.create_limit_sell_order(
-                                    trade["Symbol"],
-                                    trade["PositionSize"] / len(trade["TP"]),
-                                    trade["Entry"],
-                                    trade["StopLoss"],
-                                    takeProfit,
-                                )
-                            elif trade["OrderType"] == "Sell Stop":
-                                result = await connection.create_stop_sell_order(
-                                    trade["Symbol"],
-                                    trade["PositionSize"] / len(trade["TP"]),
-                                    trade["Entry"],
-                                    trade["StopLoss"],
-                                    takeProfit,
-                                )
-                elif PLAN == "B":
-                    if TRAILINGSTOP == "Y" and len(trade["TP"]) >= 2:
-                        entryTrade = float(trade["Entry"])
-                        tradeFirstTP = float(trade["TP"][0])
-                        trailing_stop_config = {
-                            "trailingStopLoss": {
-                                "threshold": {
-                                    "thresholds": [
-                                        {
-                                            "threshold": tradeFirstTP,
-                                            "stopLoss": entryTrade,
-                                        }
-                                    ],
-                                    "units": "ABSOLUTE_PRICE",
-                                    "stopPriceBase": "CURRENT_PRICE",
-                                }
-                            }
-                        }
-
-                        threshold_TP1 = trade["Entry"] + (
-                            (trade["TP"][0] - trade["Entry"]) * 0.8
-                        )
-                        # decimal_places_entry = len(str(price['bid']).split('.')[-1]) if '.' in str(price['bid']) else 0
-                        decimal_places_entry = 4
-                        if decimal_places_entry == 0:
-                            threshold_TP1 = round(threshold_TP1, 4)
-                        else:
-                            threshold_TP1 = round(threshold_TP1, decimal_places_entry)
-                        trailing_stop_TP1 = {
-                            "trailingStopLoss": {
-                                "threshold": {
-                                    "thresholds": [
-                                        {
-                                            "threshold": threshold_TP1,
-                                            "stopLoss": entryTrade,
-                                        }
-                                    ],
-                                    "units": "ABSOLUTE_PRICE",
-                                    "stopPriceBase": "CURRENT_PRICE",
-                                }
-                            }
-                        }
-                        for i, takeProfit in enumerate(trade["TP"]):
-                            if i >= 1:
-                                if trade["OrderType"] == "Buy":
-                                    result = await connection.create_market_buy_order(
-                                        trade["Symbol"],
-                                        trade["PositionSize"] / len(trade["TP"]),
-                                        trade["StopLoss"],
-                                        takeProfit,
-                                        trailing_stop_config,
-                                    )
-                                elif trade["OrderType"] == "Buy Now":
-                                    result = await connection.create_market_buy_order(
-                                        trade["Symbol"],
-                                        trade["PositionSize"] / len(trade["TP"]),
-                                        trade["StopLoss"],
-                                        takeProfit,
-                                        trailing_stop_config,
-                                    )
-                                elif trade["OrderType"] == "Buy Limit":
-                                    result = await connection.create_limit_buy_order(
-                                        trade["Symbol"],
-                                        trade["PositionSize"] / len(trade["TP"]),
-                                        trade["Entry"],
-                                        trade["StopLoss"],
-                                        takeProfit,
-                                        trailing_stop_config,
-                                    )
-                                elif trade["OrderType"] == "Buy Stop":
-                                    result = await connection.create_stop_buy_order(
-                                        trade["Symbol"],
-                                        trade["PositionSize"] / len(trade["TP"]),
-                                        trade["Entry"],
-                                        trade["StopLoss"],
-                                        takeProfit,
-                                        trailing_stop_config,
-                                    )
-                                elif trade["OrderType"] == "Sell":
-                                    result = await connection.create_market_sell_order(
-                                        trade["Symbol"],
-                                        trade["PositionSize"] / len(trade["TP"]),
-                                        trade["StopLoss"],
-                                        takeProfit,
-                                        trailing_stop_config,
-                                    )
-                                elif trade["OrderType"] == "Sell Now":
-                                    result = await connection.create_market_sell_order(
-                                        trade["Symbol"],
-                                        trade["PositionSize"] / len(trade["TP"]),
-                                        trade["StopLoss"],
-                                        takeProfit,
-                                        trailing_stop_config,
-                                    )
-                                elif trade["OrderType"] == "Sell Limit":
-                                    result = await connection.create_limit_sell_order(
-                                        trade["Symbol"],
-                                        trade["PositionSize"] / len(trade["TP"]),
-                                        trade["Entry"],
-                                        trade["StopLoss"],
-                                        takeProfit,
-                                        trailing_stop_config,
-                                    )
-                                elif trade["OrderType"] == "Sell Stop":
-                                    result = await connection.create_stop_sell_order(
-                                        trade["Symbol"],
-                                        trade["PositionSize"] / len(trade["TP"]),
-                                        trade["Entry"],
-                                        trade["StopLoss"],
-                                        takeProfit,
-                                        trailing_stop_config,
-                                    )
-                            else:
-                                if trade["OrderType"] == "Buy":
-                                    result = await connection.create_market_buy_order(
-                                        trade["Symbol"],
-                                        trade["PositionSize"] / len(trade["TP"]),
-                                        trade["StopLoss"],
-                                        takeProfit,
-                                        trailing_stop_TP1,
-                                    )
-                                elif trade["OrderType"] == "Buy Now":
-                                    result = await connection.create_market_buy_order(
-                                        trade["Symbol"],
-                                        trade["PositionSize"] / len(trade["TP"]),
-                                        trade["StopLoss"],
-                                        takeProfit,
-                                        trailing_stop_TP1,
-                                    )
-                                elif trade["OrderType"] == "Buy Limit":
-                                    result = await connection.create_limit_buy_order(
-                                        trade["Symbol"],
-                                        trade["PositionSize"] / len(trade["TP"]),
-                                        trade["Entry"],
-                                        trade["StopLoss"],
-                                        takeProfit,
-                                        trailing_stop_TP1,
-                                    )
-                                elif trade["OrderType"] == "Buy Stop":
-                                    result = await connection.create_stop_buy_order(
-                                        trade["Symbol"],
-                                        trade["PositionSize"] / len(trade["TP"]),
-                                        trade["Entry"],
-                                        trade["StopLoss"],
-                                        takeProfit,
-                                        trailing_stop_TP1,
-                                    )
-                                elif trade["OrderType"] == "Sell":
-                                    result = await connection.create_market_sell_order(
-                                        trade["Symbol"],
-                                        trade["PositionSize"] / len(trade["TP"]),
-                                        trade["StopLoss"],
-                                        takeProfit,
-                                        trailing_stop_TP1,
-                                    )
-                                elif trade["OrderType"] == "Sell Now":
-                                    result = await connection.create_market_sell_order(
-                                        trade["Symbol"],
-                                        trade["PositionSize"] / len(trade["TP"]),
-                                        trade["StopLoss"],
-                                        takeProfit,
-                                        trailing_stop_TP1,
-                                    )
-                                elif trade["OrderType"] == "Sell Limit":
-                                    result = await connection.create_limit_sell_order(
-                                        trade["Symbol"],
-                                        trade["PositionSize"] / len(trade["TP"]),
-                                        trade["Entry"],
-                                        trade["StopLoss"],
-                                        takeProfit,
-                                        trailing_stop_TP1,
-                                    )
-                                elif trade["OrderType"] == "Sell Stop":
-                                    result = await connection.create_stop_sell_order(
-                                        trade["Symbol"],
-                                        trade["PositionSize"] / len(trade["TP"]),
-                                        trade["Entry"],
-                                        trade["StopLoss"],
-                                        takeProfit,
-                                        trailing_stop_TP1,
-                                    )
-                    else:
-                        for i, take_profit in enumerate(trade["TP"]):
-                            position_size = trade["PositionSize"][i]
-                            if trade["OrderType"] == "Buy":
-                                result = await connection.create_market_buy_order(
-                                    trade["Symbol"],
-                                    position_size,
-                                    trade["StopLoss"],
-                                    take_profit,
-                                )
-                            elif trade["OrderType"] == "Buy Now":
-                                result = await connection.create_market_buy_order(
-                                    trade["Symbol"],
-                                    position_size,
-                                    trade["StopLoss"],
-                                    take_profit,
-                                )
-                            elif trade["OrderType"] == "Buy Limit":
-                                result = await connection.create_limit_buy_order(
-                                    trade["Symbol"],
-                                    position_size,
-                                    trade["Entry"],
-                                    trade["StopLoss"],
-                                    take_profit,
-                                )
-                            elif trade["OrderType"] == "Buy Stop":
-                                result = await connection.create_stop_buy_order(
-                                    trade["Symbol"],
-                                    position_size,
-                                    trade["Entry"],
-                                    trade["StopLoss"],
-                                    take_profit,
-                                )
-                            elif trade["OrderType"] == "Sell":
-                                result = await connection.create_market_sell_order(
-                                    trade["Symbol"],
-                                    position_size,
-                                    trade["StopLoss"],
-                                    take_profit,
-                                )
-                            elif trade["OrderType"] == "Sell Now":
-                                result = await connection.create_market_sell_order(
-                                    trade["Symbol"],
-                                    position_size,
-                                    trade["StopLoss"],
-                                    take_profit,
-                                )
-                            elif trade["OrderType"] == "Sell Limit":
-                                result = await connection.create_limit_sell_order(
-                                    trade["Symbol"],
-                                    position_size,
-                                    trade["Entry"],
-                                    trade["StopLoss"],
-                                    take_profit,
-                                )
-                            elif trade["OrderType"] == "Sell Stop":
-                                result = await connection.create_stop_sell_order(
-                                    trade["Symbol"],
-                                    position_size,
-                                    trade["Entry"],
-                                    trade["StopLoss"],
-                                    take_profit,
-                                )
-                # sends success message to user
-                update.effective_message.reply_text("Trade entered successfully! 💰")
-
-                # prints success message to console
-                logger.info("\nTrade entered successfully!")
-                logger.info(f"\nResult Code: {result}\n")
-            except Exception as errors:
-                if errors["stringCode"] == "ERR_NO_ERROR" or errors["numericCode"] == 0:
-                    logger.info(f"\nTrade with ERR_NO_ERROR : {errors}\n")
-                else:
-                    logger.info(f"\nTrade failed with error: {errors}\n")
-                    update.effective_message.reply_text(
-                        f"There was an issue ConnectMetaTrader-00😕\n\nError Message:\n{errors}"
-                    )
+    aiohttp runs on its own event loop thread, so MetaApi calls on event_loop never
+    delay an answer. Requests without the secret token are refused, updates with an
+    update_id seen before are acknowledged and dropped, new updates are put on the
+    dispatcher's update queue and acknowledged.
 
-    except Exception as error:
-        logger.error(f"Error Trade: {error}")
-        update.effective_message.reply_text(
-            f"There was an issue ConnectMetaTrader 😕\n\nError Message:\n{error}"
-        )
+    Arguments:
+        dispatcher: dispatcher of the Updater that runs the handlers
+        path: URL path Telegram posts updates to
+        secret: secret_token registered with setWebhook
+        seen: UpdateSeenSet of the accepted update_ids
+    """
 
-    return
+    def __init__(
+        self,
+        dispatcher: Dispatcher,
+        path: str,
+        secret: str = WEBHOOK_SECRET,
+        seen: UpdateSeenSet = None,
+    ):
+        self.dispatcher = dispatcher
+        self.path = path
+        self.secret = secret
+        self.seen = seen if seen is not None else update_seen
+        self.loop = AsyncLoopThread("webhook-loop")
+        self._runner = None
+
+    async def handle(self, request: web.Request) -> web.Response:
+        started = time.perf_counter()
+        token = request.headers.get(SECRET_TOKEN_HEADER, "")
+        if not hmac.compare_digest(token.encode(), self.secret.encode()):
+            webhook_counters["forbidden"] += 1
+            return web.Response(status=403)
+        try:
+            data = await request.json()
+            updateId = int(data["update_id"])
+        except Exception:
+            webhook_counters["invalid"] += 1
+            return web.Response(status=400)
+
+        if self.seen.check_and_add(updateId):
+            webhook_counters["duplicate"] += 1
+            logger.info(f"Update {updateId} was delivered again, dropped")
+            return web.Response()
+        try:
+            update = Update.de_json(data, self.dispatcher.bot)
+        except Exception as e:
+            # an error answer would only make Telegram send the same update again
+            webhook_counters["invalid"] += 1
+            logger.error(f"Could not read update {updateId}: {e}")
+            return web.Response()
+        self.dispatcher.update_queue.put(update)
+        webhook_counters["queued"] += 1
+        latency_stats.record("webhook", time.perf_counter() - started)
+        return web.Response()
+
+    async def _start(self, host: str, port: int) -> None:
+        app = web.Application()
+        app.router.add_post(self.path, self.handle)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, host, port).start()
+
+    def start(self, host: str, port: int) -> None:
+        self.loop.run(self._start(host, port), timeout=30)
+        logger.info(f"Webhook listening on {host}:{port}")
+
+    def stop(self) -> None:
+        """Stops accepting updates; queued ones stay with the dispatcher."""
+        if self._runner is not None:
+            self.loop.run(self._runner.cleanup(), timeout=30)
+            self._runner = None
+        self.loop.stop()
+
+
+def start_webhook(
+    updater: Updater,
+    listen: str = "0.0.0.0",
+    port: int = PORT,
+    webhook_url: str = APP_URL + TOKEN,
+) -> WebhookServer:
+    """Starts the dispatcher and the webhook server, then points Telegram at it.
+
+    Returns:
+        the running WebhookServer, stop it with stop_webhook
+    """
+    server = WebhookServer(updater.dispatcher, f"/{TOKEN}")
+    threading.Thread(
+        target=updater.dispatcher.start, name="dispatcher", daemon=True
+    ).start()
+    updater.job_queue.start()
+    server.start(listen, port)
+    updater.bot.set_webhook(url=webhook_url, secret_token=server.secret)
+    return server
+
+
+def stop_webhook(
+    updater: Updater, server: WebhookServer, timeout: float = WEBHOOK_DRAIN_TIMEOUT
+) -> None:
+    """Stops the webhook server, lets the dispatcher drain its queue, then stops it."""
+    server.stop()
+    deadline = time.monotonic() + timeout
+    while not updater.dispatcher.update_queue.empty() and time.monotonic() < deadline:
+        time.sleep(0.1)
+    updater.stop()
 
 
 # Handler Functions
-def PlaceTrade(update: Update, context: CallbackContext) -> int:
+def PlaceTrade(
+    update: Update, context: CallbackContext, trace: SignalTrace = None
+) -> int:
     """Parses trade and places on MetaTrader account.
 
     Arguments:
         update: update from Telegram
         context: CallbackContext object that stores commonly used objects in handler callbacks
+        trace: timing spans of the signal, started by the message handler
     """
     # checks if the trade has already been parsed or not
     # if(context.user_data['trade'] is None):
+    trace = trace or SignalTrace()
+    fingerprint = None
 
     try:
         # parses signal from Telegram message
         # errorMessage1 = f"There was \nError: {update.effective_message.text}\n."
         # update.effective_message.reply_text(errorMessage1)
-        trade = ParseSignal(update.effective_message.text)
+        with trace.span("parse"):
+            trade = ParseSignal(update.effective_message.text)
         # update.effective_message.reply_text(trade)
 
         # Test Done OK Here
@@ -1914,24 +3958,43 @@ def PlaceTrade(update: Update, context: CallbackContext) -> int:
         if not (trade):
             raise Exception("Invalid Trade")
 
+        # drops reposts, edits and forwards of a signal before connecting to MetaApi
+        with trace.span("dedupe"):
+            fingerprint = signal_fingerprint(trade, update.effective_chat.id)
+            duplicate = signal_dedupe.check_and_add(fingerprint)
+        if duplicate:
+            logger.info(f"signal={trace.id} duplicate signal skipped: {trade}")
+            count_screen("duplicate")
+            trace.finish("duplicate")
+            return TRADE
+
         # sets the user context trade equal to the parsed trade
         # Fixing here
         # context.user_data['trade'] = trade
 
-        update.effective_message.reply_text(
-            "Trade Successfully Parsed! 🥳\nConnecting to MetaTrader ... \n(May take a while) ⏰"
-        )
+        with trace.span("ack_reply"):
+            reply(
+                update,
+                "Trade Successfully Parsed! 🥳\nConnecting to MetaTrader ... \n(May take a while) ⏰"
+            )
 
     except Exception as error:
-        logger.error(f"Error: {error}")
+        logger.error(f"signal={trace.id} error: {error}")
+        trace.finish("invalid")
+        # the signal was not queued, a resend must not count as a duplicate
+        if fingerprint is not None:
+            signal_dedupe.discard(fingerprint)
         errorMessage = f"There was an error parsing this trade 😕\n\nError: {error}\n"
-        update.effective_message.reply_text(errorMessage)
+        reply(update, errorMessage)
 
         # returns to TRADE state to reattempt trade parsing
         return TRADE
 
-    # attempts connection to MetaTrader and places trade
-    asyncio.run(ConnectMetaTrader(update, trade, True))
+    # queues the trade; a signal worker connects to MetaTrader and places it
+    logger.info(f"signal={trace.id} parsed: {trade}")
+    if run_coroutine(signal_queue.put(update, trade, trace)) == "rejected":
+        signal_dedupe.discard(fingerprint)
+        reply(update, "Signal queue is full, this signal was not placed ⚠️")
 
     # removes trade from user context data
     # context.user_data['trade'] = None
@@ -1959,8 +4022,9 @@ def CalculateTrade(update: Update, context: CallbackContext) -> int:
 
             # sets the user context trade equal to the parsed trade
             context.user_data["trade"] = trade
-            update.effective_message.reply_text(
-                "Trade Successfully Parsed! 🥳\nConnecting to MetaTrader ... (May take a while) ⏰"
+            reply(
+                update,
+                "Trade Successfully Parsed! 🥳\nConnecting to MetaTrader ... (May take a while) ⏰",
             )
 
         except Exception as error:
@@ -1968,17 +4032,18 @@ def CalculateTrade(update: Update, context: CallbackContext) -> int:
             errorMessage = (
                 f"There was an error parsing this trade 😕\n\nError: {error}\n"
             )
-            update.effective_message.reply_text(errorMessage)
+            reply(update, errorMessage)
 
             # returns to CALCULATE to reattempt trade parsing
             return CALCULATE
 
     # attempts connection to MetaTrader and calculates trade information
-    asyncio.run(ConnectMetaTrader(update, context.user_data["trade"], False))
+    run_coroutine(ConnectMetaTrader(update, context.user_data["trade"], False))
 
     # asks if user if they would like to enter or decline trade
-    update.effective_message.reply_text(
-        "Would you like to enter this trade?\nTo enter, select: /yes\nTo decline, select: /no"
+    reply(
+        update,
+        "Would you like to enter this trade?\nTo enter, select: /yes\nTo decline, select: /no",
     )
 
     return DECISION
@@ -1993,13 +4058,12 @@ def unknown_command(update: Update, context: CallbackContext) -> None:
     """
     user_username = update.effective_message.chat.username
     if user_username not in AUTHORIZED_USERS:
-        update.effective_message.reply_text(
-            "You are not authorized to use this bot! 🙅🏽‍♂️"
-        )
+        reply(update, "You are not authorized to use this bot! 🙅🏽‍♂️")
         return ConversationHandler.END
 
-    update.effective_message.reply_text(
-        "Unknown command. Use /trade to place a trade or /calculate to find information for a trade. You can also use the /help command to view instructions for this bot."
+    reply(
+        update,
+        "Unknown command. Use /trade to place a trade or /calculate to find information for a trade. You can also use the /help command to view instructions for this bot.",
     )
 
     return
@@ -2017,7 +4081,7 @@ def welcome(update: Update, context: CallbackContext) -> None:
     welcome_message = "Welcome to the FX Signal Copier Telegram Bot! 💻💸\n\nYou can use this bot to enter trades directly from Telegram and get a detailed look at your risk to reward ratio with profit, loss, and calculated lot size. You are able to change specific settings such as allowed symbols, risk factor, and more from your personalized Python script and environment variables.\n\nUse the /help command to view instructions and example trades."
 
     # sends messages to user
-    update.effective_message.reply_text(welcome_message)
+    reply(update, welcome_message)
 
     return
 
@@ -2036,9 +4100,9 @@ def help(update: Update, context: CallbackContext) -> None:
     # market_execution_example = "Market Execution:\nBUY GBPUSD\nEntry NOW\nSL 1.14336\nTP 1.28930\nTP 1.29845\n\n"
     # limit_example = "Limit Execution:\nBUY LIMIT GBPUSD\nEntry 1.14480\nSL 1.14336\nTP 1.28930\n\n"
     # note = "You are able to enter up to two take profits. If two are entered, both trades will use half of the position size, and one will use TP1 while the other uses TP2.\n\nNote: Use 'NOW' as the entry to enter a market execution trade."
-    commandtrade = "\n----Bot commands:\n\t/accountinfo : Check infomation account\n\t/opentrades : Check all Opening Position\n\t/pendingorders : Check all Pending Orders\n\tcloseposition id,id,id \n\tclosepart id,id|size,size \n\ttrailingstop id,id,id"
+    commandtrade = "\n----Bot commands:\n\t/accountinfo : Check infomation account\n\t/opentrades : Check all Opening Position\n\t/pendingorders : Check all Pending Orders\n\tcloseposition id,id,id \n\tclosepart id,id|size,size \n\ttrailingstop id,id,id\n\t\tinstead of ids: all, losing, winning, symbol=XAUUSD side=buy profit>0 opened<1h magic=123\n\t\tadd account=NAME to act on one account only, all accounts by default\n\t/screenstats : Messages dropped by signal screening\n\t/queuestats : Signal queue depth and wait times\n\t/stats : Latency percentiles of each signal stage\n\t/reload : Reread symbols, risk and plan from the config files\n\t/updateenv : Change settings, one NAME = value per line"
     # sends messages to user
-    update.effective_message.reply_text(help_message + commandtrade)
+    reply(update, help_message + commandtrade)
     # update.effective_message.reply_text(commands)
     # update.effective_message.reply_text(trade_example + market_execution_example + limit_example + note + commandtrade)
     # update.effective_message.reply_text(commandtrade)
@@ -2053,7 +4117,7 @@ def cancel(update: Update, context: CallbackContext) -> int:
         context: CallbackContext object that stores commonly used objects in handler callbacks
     """
 
-    update.effective_message.reply_text("Command has been canceled.")
+    reply(update, "Command has been canceled.")
 
     # removes trade from user context data
     if context.user_data["trade"] is not None:
@@ -2083,9 +4147,7 @@ def Trade_Command(update: Update, context: CallbackContext) -> int:
     """
     user_username = update.effective_message.chat.username
     if user_username not in AUTHORIZED_USERS:
-        update.effective_message.reply_text(
-            "You are not authorized to use this bot! 🙅🏽‍♂️"
-        )
+        reply(update, "You are not authorized to use this bot! 🙅🏽‍♂️")
         return ConversationHandler.END
 
     # initializes the user's trade as empty prior to input and parsing
@@ -2107,9 +4169,7 @@ def Calculation_Command(update: Update, context: CallbackContext) -> int:
     """
     user_username = update.effective_message.chat.username
     if user_username not in AUTHORIZED_USERS:
-        update.effective_message.reply_text(
-            "You are not authorized to use this bot! 🙅🏽‍♂️"
-        )
+        reply(update, "You are not authorized to use this bot! 🙅🏽‍♂️")
         return ConversationHandler.END
 
     # initializes the user's trade as empty prior to input and parsing
@@ -2117,53 +4177,324 @@ def Calculation_Command(update: Update, context: CallbackContext) -> int:
         context.user_data["trade"] = None
 
     # asks user to enter the trade
-    update.effective_message.reply_text(
-        "Please enter the trade that you would like to calculate."
-    )
+    reply(update, "Please enter the trade that you would like to calculate.")
 
     return CALCULATE
 
 
+# Message screening: cheap constant-time stages run before the full signal check.
+# Counters record how many messages each stage dropped.
+SCREEN_STAGES = ["length", "digit", "order type", "signal"]
+screen_counters = Counter()
+screen_lock = threading.Lock()
+DIGIT_PATTERN = re.compile(r"\d")
+
+
+def count_screen(stage: str) -> None:
+    with screen_lock:
+        screen_counters[stage] += 1
+
+
+def screen_message(text: str) -> bool:
+    """Runs a message through the staged signal pre-filter.
+
+    Stages, cheapest first: length bounds, at least one digit, an order type keyword
+    from TYPETRADE, and finally the full CheckSignalMessage.
+
+    Arguments:
+        text: message text
+
+    Returns:
+        True if the message passed every stage
+    """
+    count_screen("seen")
+    if not text or not SIGNAL_MIN_LENGTH <= len(text) <= SIGNAL_MAX_LENGTH:
+        count_screen("length")
+        return False
+    if DIGIT_PATTERN.search(text) is None:
+        count_screen("digit")
+        return False
+    if not settings.typetrade_matcher.contains_any(text):
+        count_screen("order type")
+        return False
+    if CheckSignalMessage(text) != TRADE:
+        count_screen("signal")
+        return False
+    count_screen("passed")
+    return True
+
+
+def handle_screen_stats(update: Update, context: CallbackContext) -> None:
+    """Sends how many messages each screening stage dropped."""
+    with screen_lock:
+        counters = dict(screen_counters)
+    table = PrettyTable(["Stage", "Dropped"])
+    table.align["Stage"] = "l"
+    table.align["Dropped"] = "r"
+    for stage in SCREEN_STAGES:
+        table.add_row([stage, counters.get(stage, 0)])
+    table.add_row(["passed", counters.get("passed", 0)])
+    table.add_row(["duplicate", counters.get("duplicate", 0)])
+    table.add_row(["total seen", counters.get("seen", 0)])
+    reply(update, f"<pre>{table}</pre>", parse_mode=ParseMode.HTML)
+
+
+def reload_config() -> tuple:
+    """Rereads the config files and swaps in a new settings snapshot.
+
+    Handlers already working on a signal keep the snapshot they started with. Symbols
+    new to the list get their specifications and price stream on every connected
+    account; the webhook and MetaApi connections stay up.
+
+    Returns:
+        (previous, current) snapshots
+
+    Raises:
+        any error reading or validating the files, the current settings stay in place
+    """
+    global settings, watched_mtimes
+    with settings_lock:
+        mtimes = config_mtimes()
+        snapshot = ConfigSnapshot.from_config(read_config())
+        previous, settings = settings, snapshot
+        watched_mtimes = mtimes
+    logger.info(f"Config reloaded: {snapshot.changes(previous) or 'no changes'}")
+    known = {account.account_id for account in previous.accounts}
+    for account in snapshot.accounts:
+        if account.account_id not in known:
+            # connects accounts added to the config before their first signal
+            manager = get_connection_manager(account.account_id)
+            future = event_loop.submit(manager.start())
+            future.add_done_callback(log_future_error)
+    if snapshot.symbols != previous.symbols or (
+        snapshot.symbol_aliases != previous.symbol_aliases
+    ):
+        symbols = broker_symbols()
+        for manager in list(connection_managers.values()):
+            if manager.connection is not None:
+                future = event_loop.submit(manager.subscribe_symbols(symbols))
+                future.add_done_callback(log_future_error)
+    return previous, snapshot
+
+
+def describe_reload() -> str:
+    """Reloads the config and describes the outcome for a Telegram reply."""
+    try:
+        previous, snapshot = reload_config()
+    except Exception as e:
+        logger.error(f"Config reload failed: {e}")
+        return f"Config reload failed, settings unchanged: {e}"
+    changes = snapshot.changes(previous)
+    if not changes:
+        return "Config reloaded, no changes."
+    return "Config reloaded:\n" + "\n".join(changes)
+
+
+def watch_config(context: CallbackContext) -> None:
+    """Job that reloads the config when one of the files was modified."""
+    global watched_mtimes
+    if config_mtimes() == watched_mtimes:
+        return
+    try:
+        reload_config()
+    except Exception as e:
+        # retried on the next change only, the broken file is not reread every tick
+        watched_mtimes = config_mtimes()
+        logger.error(f"Config reload failed, settings unchanged: {e}")
+
+
+def handle_reload(update: Update, context: CallbackContext) -> None:
+    """Rereads the config files without restarting the bot."""
+    user_username = update.effective_message.chat.username
+    if user_username not in AUTHORIZED_USERS:
+        reply(update, "You are not authorized to use this bot! 🙅🏽‍♂️")
+        return
+    reply(update, describe_reload())
+
+
+def signal_fingerprint(trade: dict, chat_id) -> str:
+    """Normalized fingerprint of a parsed trade and the chat it came from.
+
+    Symbol, direction, entry, stop loss and take profits are compared, so reposts,
+    edits and forwards of the same signal map to the same fingerprint.
+    """
+    side = "buy" if trade["OrderType"].lower().startswith("buy") else "sell"
+    entry = trade.get("Entry")
+    entry = entry if isinstance(entry, str) or entry is None else round(entry, 5)
+    key = (
+        f"{chat_id}|{trade['Symbol']}|{side}|{entry}|{round(trade['StopLoss'], 5)}|"
+        + ",".join(str(round(tp, 5)) for tp in trade["TP"])
+    )
+    return hashlib.sha1(key.encode()).hexdigest()
+
+
+class SignalDedupeCache:
+    """Remembers signal fingerprints for window seconds, at most max_entries of them.
+
+    Entries are kept in insertion order, so expired ones are dropped from the front
+    and the oldest one is evicted when the cache is full.
+
+    Arguments:
+        window: seconds during which a repeated fingerprint is a duplicate
+        max_entries: maximum number of remembered fingerprints
+    """
+
+    def __init__(self, window: float = DEDUPE_WINDOW, max_entries: int = DEDUPE_MAX):
+        self.window = window
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _expire(self, now: float) -> None:
+        while self._entries:
+            fingerprint, seenAt = next(iter(self._entries.items()))
+            if now - seenAt < self.window:
+                break
+            self._entries.popitem(last=False)
+
+    def check_and_add(self, fingerprint: str) -> bool:
+        """Returns True if fingerprint was seen within the window, else records it."""
+        if self.window <= 0:
+            return False
+        now = time.time()
+        with self._lock:
+            self._expire(now)
+            if fingerprint in self._entries:
+                return True
+            self._entries[fingerprint] = now
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            self._record(fingerprint, now)
+        return False
+
+    def discard(self, fingerprint: str) -> None:
+        """Forgets fingerprint, so a signal that was not placed can be sent again."""
+        with self._lock:
+            if self._entries.pop(fingerprint, None) is not None:
+                self._record(fingerprint, None)
+
+    def _record(self, fingerprint: str, seenAt: float) -> None:
+        pass
+
+
+class PersistentSignalDedupeCache(SignalDedupeCache):
+    """SignalDedupeCache that appends every change to a file, so it survives restarts.
+
+    Each line is a JSON [fingerprint, unix time seen], or [fingerprint, null] for a
+    discarded one. Appending keeps check_and_add fast; the file is rewritten with
+    only the remembered fingerprints once it holds twice max_entries lines.
+
+    Arguments:
+        path: JSON lines file of the fingerprints
+    """
+
+    def __init__(
+        self, path: str, window: float = DEDUPE_WINDOW, max_entries: int = DEDUPE_MAX
+    ):
+        super().__init__(window, max_entries)
+        self.path = path
+        self._file = None
+        self._lines = 0
+        try:
+            with open(path) as file:
+                for line in file:
+                    if not line.strip():
+                        continue
+                    record = json.loads(line)
+                    # files written before the append format hold one JSON object
+                    if isinstance(record, dict):
+                        changes = sorted(record.items(), key=lambda e: e[1])
+                    else:
+                        changes = [record]
+                    # replayed in order, so evictions happen as they did when written
+                    for fingerprint, seenAt in changes:
+                        self._entries.pop(fingerprint, None)
+                        if seenAt is not None:
+                            self._entries[fingerprint] = seenAt
+                        while len(self._entries) > self.max_entries:
+                            self._entries.popitem(last=False)
+                    self._lines += 1
+            self._expire(time.time())
+            logger.info(f"Loaded {len(self._entries)} signal fingerprints from {path}")
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            logger.warning(f"Could not load signal fingerprints from {path}: {e}")
+
+    def _record(self, fingerprint: str, seenAt: float) -> None:
+        try:
+            if self._file is None:
+                self._file = open(self.path, "a")
+            self._file.write(json.dumps([fingerprint, seenAt]) + "\n")
+            self._file.flush()
+            self._lines += 1
+            if self._lines >= 2 * self.max_entries:
+                self._compact()
+        except Exception as e:
+            logger.warning(f"Could not save signal fingerprints to {self.path}: {e}")
+
+    def _compact(self) -> None:
+        # write to a temporary file and rename, so a crash never leaves half a file
+        self._file.close()
+        self._file = None
+        self._expire(time.time())
+        temp = f"{self.path}.tmp"
+        with open(temp, "w") as file:
+            file.writelines(
+                json.dumps([fingerprint, seenAt]) + "\n"
+                for fingerprint, seenAt in self._entries.items()
+            )
+        os.replace(temp, self.path)
+        self._lines = len(self._entries)
+
+
+if DEDUPE_FILE:
+    signal_dedupe = PersistentSignalDedupeCache(DEDUPE_FILE)
+else:
+    signal_dedupe = SignalDedupeCache()
+
+
 # Function for handle message
 def TotalMessHandle(update: Update, context: CallbackContext) -> int:
-    checktruesignal = CheckSignalMessage(update.effective_message.text)
     temp = Trade_Command(update, context)
-    if temp == TRADE and checktruesignal == TRADE:
-        PlaceTrade(update, context)
+    if temp != TRADE:
+        return TRADE
+    # the trace starts with the message, it is logged only once screening passes
+    trace = SignalTrace()
+    with trace.span("screen"):
+        passed = screen_message(update.effective_message.text)
+    if passed:
+        PlaceTrade(update, context, trace)
     return TRADE
 
 
 # Function for check message is a signal format true
 def CheckSignalMessage(signal: str) -> int:
-    signal = signal.splitlines()
-    signal = [line.rstrip() for line in signal]
-    # extracts symbolplus '/' from trade signal if found then replace '/' to ''
-    for elemental in SYMBOLSPLUS:
-        calcusymbol = signal[0].upper().find(elemental, 0)
-        for symbolother in TYPETRADE:
-            for item in signal:
-                calcusymbolother = item.upper().find(symbolother, 0)
-                if calcusymbol != -1 & calcusymbolother != -1:
-                    return TRADE
-    # extracts symbol from trade signal
-    for element in SYMBOLS:
-        calcu = signal[0].upper().find(element, 0)
-        for symbol_other in TYPETRADE:
-            for item in signal:
-                calcu_symbolother = item.upper().find(symbol_other, 0)
-                if calcu != -1 & calcu_symbolother != -1:
-                    return TRADE
-    return ERROR
+    """Checks that a message names a known symbol in its first line and an order type.
 
+    Arguments:
+        signal: message text
 
-def main() -> None:
-    """Runs the Telegram bot."""
+    Returns:
+        TRADE if the message looks like a signal, ERROR otherwise
+    """
+    cfg = settings
+    firstLine = signal.split("\n", 1)[0]
+    hasSymbol = cfg.symbolplus_matcher.contains_any(firstLine) or (
+        cfg.symbol_matcher.contains_any(firstLine)
+    )
+    if hasSymbol:
+        if cfg.typetrade_matcher.contains_any(signal):
+            return TRADE
+    return ERROR
 
-    updater = Updater(TOKEN, use_context=True)
 
-    # get the dispatcher to register handlers
-    dp = updater.dispatcher
+def register_handlers(dp: Dispatcher) -> None:
+    """Registers the bot's command, conversation and message handlers on dp.
 
+    Arguments:
+        dp: dispatcher of the Updater that receives the webhook updates
+    """
     # message handler
     dp.add_handler(CommandHandler("start", welcome))
 
@@ -2191,9 +4522,15 @@ def main() -> None:
         entry_points=[CommandHandler("menu", menu_button)],
         states={
             SELECT_OPTION: [
-                CallbackQueryHandler(select_option, pattern=pattern_text),
+                CallbackQueryHandler(
+                    select_option, pattern=pattern_text, run_async=True
+                ),
+            ],
+            WAIT_FOR_ID: [
+                MessageHandler(
+                    Filters.text & ~Filters.command, handle_ids, run_async=True
+                )
             ],
-            WAIT_FOR_ID: [MessageHandler(Filters.text & ~Filters.command, handle_ids)],
         },
         fallbacks=[],
         # per_message=True,
@@ -2207,50 +4544,117 @@ def main() -> None:
         },
         fallbacks=[CommandHandler("cancel", cancel)],
     )
+    dp.add_handler(conv_handler_env)
 
     # message handler for all messages that are not included in conversation handler
     """"dp.add_handler(MessageHandler(Filters.text, unknown_command))"""
     """"dp.add_handler(MessageHandler(Filters.text,TotalMessHandle()))"""
     dp.add_handler(
         MessageHandler(
-            Filters.command & Filters.regex("accountinfo"), handle_account_info
+            Filters.command & Filters.regex("accountinfo"),
+            handle_account_info,
+            run_async=True,
+        )
+    )
+    dp.add_handler(
+        MessageHandler(
+            Filters.command & Filters.regex("pendingorders"),
+            handle_pending_orders,
+            run_async=True,
         )
     )
     dp.add_handler(
         MessageHandler(
-            Filters.command & Filters.regex("pendingorders"), handle_pending_orders
+            Filters.command & Filters.regex("opentrades"),
+            handle_open_trades,
+            run_async=True,
         )
     )
     dp.add_handler(
         MessageHandler(
-            Filters.command & Filters.regex("opentrades"), handle_open_trades
+            Filters.command & Filters.regex("trailingstop"),
+            handle_trailingstop,
+            run_async=True,
         )
     )
     dp.add_handler(
         MessageHandler(
-            Filters.command & Filters.regex("trailingstop"), handle_trailingstop
+            Filters.command & Filters.regex("closeposition"),
+            handle_closeposition,
+            run_async=True,
         )
     )
     dp.add_handler(
         MessageHandler(
-            Filters.command & Filters.regex("closeposition"), handle_closeposition
+            Filters.command & Filters.regex("closepart"),
+            handle_close_position_part,
+            run_async=True,
         )
     )
     dp.add_handler(
         MessageHandler(
-            Filters.command & Filters.regex("closepart"), handle_close_position_part
+            Filters.command & Filters.regex("screenstats"), handle_screen_stats
         )
     )
+    dp.add_handler(
+        MessageHandler(Filters.command & Filters.regex("queuestats"), handle_queue_stats)
+    )
+    dp.add_handler(CommandHandler("reload", handle_reload))
+    dp.add_handler(CommandHandler("stats", handle_stats))
     dp.add_handler(MessageHandler(Filters.text, TotalMessHandle))
 
     # log all errors
     dp.add_error_handler(error)
 
+
+def main() -> None:
+    """Runs the Telegram bot."""
+
+    updater = Updater(TOKEN, use_context=True, workers=DISPATCHER_WORKERS)
+
+    # get the dispatcher to register handlers
+    register_handlers(updater.dispatcher)
+
+    # starts the shared event loop and warms up the MetaApi connections in background;
+    # [MetaAPI] ACCOUNT_ID is one of them only when no [Account:<name>] section exists
+    event_loop.start()
+    reply_sender.start()
+    metrics_server = start_metrics_server()
+    for account in settings.accounts:
+        warmup = event_loop.submit(get_connection_manager(account.account_id).start())
+        warmup.add_done_callback(log_future_error)
+
+    # picks up edits of the config files without a restart
+    if CONFIG_WATCH_INTERVAL > 0:
+        updater.job_queue.run_repeating(
+            watch_config, CONFIG_WATCH_INTERVAL, first=CONFIG_WATCH_INTERVAL
+        )
+
     # listens for incoming updates from Telegram
-    updater.start_webhook(
-        listen="0.0.0.0", port=PORT, url_path=TOKEN, webhook_url=APP_URL + TOKEN
-    )
-    updater.idle()
+    webhook_server = start_webhook(updater)
+
+    # blocks until the bot is asked to stop, as Updater.idle() does
+    stopping = threading.Event()
+    for stopSignal in (SIGINT, SIGTERM, SIGABRT):
+        handle_signal(stopSignal, lambda signum, frame: stopping.set())
+    while not stopping.wait(1):
+        pass
+    stop_webhook(updater, webhook_server)
+
+    # finishes queued signals, then closes MetaApi connections before the loop goes away
+    try:
+        event_loop.run(signal_queue.stop(), timeout=60)
+    except Exception as e:
+        logger.info(f"Error stopping the signal queue: {e}")
+    for manager in list(connection_managers.values()):
+        try:
+            event_loop.run(manager.close(), timeout=30)
+        except Exception as e:
+            logger.info(f"Error closing MetaApi connection: {e}")
+    event_loop.stop()
+    reply_sender.stop()
+    if metrics_server is not None:
+        metrics_server.shutdown()
 
     return
 
@@ -0,0 +1,40 @@
+"""run.py reads its settings at import, so point it at a throwaway test config
+before any test module imports it."""
+import os
+import sys
+import tempfile
+
+TEST_CONFIG = """\
+[MetaAPI]
+API_KEY = test
+ACCOUNT_ID = test
+RISK_FACTOR = 0.02
+RISK_PERTRADE = 0.01
+
+[Telegram]
+TOKEN = 123456:test
+TELEGRAM_USER = test
+CHANNEL_USER = test
+
+[Render]
+APP_URL = http://localhost/
+PLAN = A
+TRAILING_STOP = Y
+
+[Bot]
+SYMBOLS = XAUUSD,GOLD,XAGUSD,EURUSD,GBPUSD,USDJPY,JPY,GBPJPY,NAS100,USTEC,US30
+SYMBOLSPLUS = XAU/USD,EUR/USD,GBP/USD,USD/JPY,GBP/JPY
+TYPETRADE = BUY,SELL
+OTHER = CLOSE,MOVE SL
+CONFIG_WATCH_INTERVAL = 0
+METRICS_PORT = 0
+"""
+
+# the directory is removed when the interpreter exits
+testDir = tempfile.TemporaryDirectory(prefix="tests-")
+os.environ["CONFIG_FILE"] = os.path.join(testDir.name, "test.env")
+os.environ["CONFIG_OVERRIDE_FILE"] = os.path.join(testDir.name, "override.env")
+with open(os.environ["CONFIG_FILE"], "w") as f:
+    f.write(TEST_CONFIG)
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
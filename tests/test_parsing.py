@@ -0,0 +1,85 @@
+import pytest
+
+import run
+
+
+@pytest.mark.parametrize(
+    "signal, expected",
+    [
+        (
+            "XAUUSD BUY 1935.50\nSL 1928.00\nTP 1940.00\nTP 1945.00",
+            ("Buy Limit", "XAUUSD", 1935.5, 1928.0, [1940.0, 1945.0]),
+        ),
+        (
+            "XAUUSD SELL NOW\nSL 1948\nTP 1940\nTP 1935",
+            ("Sell Now", "XAUUSD", "NOW", 1948.0, [1940.0, 1935.0]),
+        ),
+        (
+            "GOLD BUY LIMIT 1930 - 1927\nSL 1922\nTP 1935\nTP 1940",
+            ("Buy Limit", "XAUUSD", 1927.0, 1922.0, [1935.0, 1940.0]),
+        ),
+        (
+            "XAU/USD BUY STOP\nEntry 1941.2\nSL 1934.2\nTP 1946.2",
+            ("Buy Stop", "XAUUSD", 1941.2, 1934.2, [1946.2]),
+        ),
+        (
+            "EUR/USD SELL LIMIT 1.0925\nSL 1.0950 (25 pips)\nTP 1.0900 (25 pips)",
+            ("Sell Limit", "EURUSD", 1.0925, 1.095, [1.09]),
+        ),
+        (
+            "GOLD SELL 1950 (scalper)\nSTOP LOSS 1956\nTarget Profit 1945",
+            ("Sell Limit", "XAUUSD", 1950.0, 1956.0, [1945.0]),
+        ),
+        (
+            "NAS100 BUY NOW\nSL 15250\nTP 15350",
+            ("Buy Now", "USTEC", "NOW", 15250.0, [15350.0]),
+        ),
+        (
+            "USDJPY SELL 149 85\nSL 150 20\nTP 149 50",
+            ("Sell Limit", "USDJPY", 149.85, 150.2, [149.5]),
+        ),
+        (
+            "🔥 GOLD BUY NOW 🔥\n\nSL 1925 (swing)\nTP 1935\nTP OPEN",
+            ("Buy Now", "XAUUSD", "NOW", 1925.0, [1935.0]),
+        ),
+    ],
+)
+def test_parse_signal_text(signal, expected):
+    assert run.parse_signal_text(signal) == run.ParsedSignal(*expected)
+
+
+def test_parse_signal_adds_risk_settings():
+    trade = run.ParseSignal("XAUUSD BUY 1935.50\nSL 1928.00\nTP 1940.00")
+    assert trade["Symbol"] == "XAUUSD"
+    assert trade["TP"] == [1940.0]
+    assert trade["RiskFactor"] == run.settings.risk_factor
+    assert trade["Plan"] == run.settings.plan
+
+
+@pytest.mark.parametrize(
+    "text",
+    [
+        "Good morning traders! Big week ahead with CPI on Wednesday.",
+        "TP1 hit on gold +50 pips ✅✅",
+        "Move SL to entry on the EURUSD trade",
+        "Close half now and let the rest run",
+        "AUDUSD BUY 0.6650\nSL 0.6620\nTP 0.6700",
+    ],
+)
+def test_chatter_and_unknown_symbols_parse_to_nothing(text):
+    assert run.parse_signal_text(text) is None
+    assert run.ParseSignal(text) == {}
+
+
+@pytest.mark.parametrize(
+    "line, symbol",
+    [
+        ("XAU/USD BUY STOP", "XAUUSD"),
+        ("GBP/JPY SELL", "GBPJPY"),
+        ("USDJPY SELL 149 85", "USDJPY"),
+        ("gold buy now", "GOLD"),
+        ("no symbol here", None),
+    ],
+)
+def test_find_symbol(line, symbol):
+    assert run.FindSymbol(line) == symbol
@@ -0,0 +1,167 @@
+import asyncio
+import dataclasses
+import operator
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import pytest
+import pytz
+
+import run
+
+
+def position(symbol="XAUUSD", side="buy", profit=0.0, volume=0.1, age=60):
+    opened = datetime.now(pytz.utc) - timedelta(seconds=age)
+    return {
+        "id": "1",
+        "symbol": symbol,
+        "type": "POSITION_TYPE_BUY" if side == "buy" else "POSITION_TYPE_SELL",
+        "profit": profit,
+        "volume": volume,
+        "time": opened.isoformat().replace("+00:00", "Z"),
+    }
+
+
+def test_parse_selector():
+    selector = run.parse_selector("symbol=gold side=buy profit>0 opened<1h")
+    assert selector.symbol == "XAUUSD"
+    assert selector.side == "buy"
+    assert selector.checks == [
+        ("profit", operator.gt, 0.0),
+        ("opened", operator.lt, 3600.0),
+    ]
+
+
+def test_parse_selector_keywords():
+    assert run.parse_selector("all") == run.PositionSelector(None, None, [])
+    assert run.parse_selector("losing").checks == [("profit", operator.lt, 0.0)]
+    assert run.parse_selector("WINNING volume>=0.5").checks == [
+        ("profit", operator.gt, 0.0),
+        ("volume", operator.ge, 0.5),
+    ]
+
+
+@pytest.mark.parametrize(
+    "selector", ["colour=red", "profit>abc", "opened<soon", "side<buy", "losers"]
+)
+def test_parse_selector_rejects_unknown_terms(selector):
+    with pytest.raises(ValueError):
+        run.parse_selector(selector)
+
+
+@pytest.mark.parametrize(
+    "selector, matching",
+    [
+        ("all", {"gold buy", "gold sell", "euro loser", "old winner"}),
+        ("symbol=xauusd", {"gold buy", "gold sell"}),
+        ("side=sell", {"gold sell", "euro loser"}),
+        ("losing", {"euro loser"}),
+        ("winning opened>1d", {"old winner"}),
+        ("symbol=eurusd side=sell profit<=-10", {"euro loser"}),
+        ("volume>1", set()),
+    ],
+)
+def test_selector_matches(selector, matching):
+    positions = {
+        "gold buy": position(),
+        "gold sell": position(side="sell"),
+        "euro loser": position("EURUSD", "sell", profit=-12.5),
+        "old winner": position("GBPUSD", profit=30.0, age=3 * 86400),
+    }
+    parsed = run.parse_selector(selector)
+    assert {
+        name for name, item in positions.items() if run.selector_matches(parsed, item)
+    } == matching
+
+
+def test_is_selector():
+    assert run.is_selector("symbol=XAUUSD losing")
+    assert not run.is_selector("123,456")
+    assert not run.is_selector("")
+
+
+@pytest.mark.parametrize("target", ["123,456", "123, 456", " 123 ,456, ", "123,,456"])
+def test_target_positions_strips_position_ids(target):
+    (account,) = run.settings.accounts
+    positions = asyncio.run(run.target_positions(None, target))
+    assert positions == [(account, {"id": "123"}), (account, {"id": "456"})]
+
+
+class FakeManager:
+    def __init__(self, positions):
+        self.positions = positions
+        # no live mirror, selectors filter get_positions
+        self.state = SimpleNamespace(is_ready=lambda: False)
+        self.closed = []
+
+    async def get_positions(self):
+        return self.positions
+
+    async def get_connection(self):
+        return self
+
+    async def close_position(self, position_id):
+        self.closed.append(position_id)
+
+
+class FakeMessage:
+    def __init__(self):
+        self.replies = []
+
+    def reply_text(self, text, **kwargs):
+        self.replies.append(text)
+
+
+@pytest.fixture
+def two_accounts(monkeypatch):
+    accounts = tuple(
+        run.AccountSettings(name, f"id-{name}", 0.02, 0.01, "A", "N")
+        for name in ("main", "swing")
+    )
+    monkeypatch.setattr(
+        run, "settings", dataclasses.replace(run.settings, accounts=accounts)
+    )
+    monkeypatch.setattr(
+        run,
+        "connection_managers",
+        {
+            "id-main": FakeManager([position(), {**position("EURUSD"), "id": "2"}]),
+            "id-swing": FakeManager([{**position(side="sell"), "id": "3"}]),
+        },
+    )
+    return accounts
+
+
+def test_position_ids_are_found_on_their_account(two_accounts):
+    main, swing = two_accounts
+    update = SimpleNamespace(effective_message=FakeMessage())
+    positions = asyncio.run(run.target_positions(update, "3, 1,9"))
+    assert positions == [(swing, {"id": "3"}), (main, {"id": "1"})]
+    assert update.effective_message.replies == ["Not open on any account: 9"]
+
+
+def test_selectors_run_on_every_account_unless_one_is_named(two_accounts):
+    main, swing = two_accounts
+    positions = asyncio.run(run.target_positions(None, "symbol=XAUUSD"))
+    assert [(account.name, item["id"]) for account, item in positions] == [
+        ("main", "1"),
+        ("swing", "3"),
+    ]
+    positions = asyncio.run(run.target_positions(None, "account=Swing all"))
+    assert [(account.name, item["id"]) for account, item in positions] == [
+        ("swing", "3")
+    ]
+
+
+def test_close_position_closes_on_the_account_holding_it(two_accounts):
+    update = SimpleNamespace(effective_message=FakeMessage())
+    asyncio.run(run.close_position(update, "1,3"))
+    assert run.connection_managers["id-main"].closed == ["1"]
+    assert run.connection_managers["id-swing"].closed == ["3"]
+    assert "Close positions: 2/2 succeeded" in update.effective_message.replies[0]
+
+
+def test_unknown_account_is_refused(two_accounts):
+    with pytest.raises(ValueError, match="Unknown account: scalp"):
+        run.command_accounts("account=scalp 123")
+    assert run.command_accounts("account=main 1, 2") == (two_accounts[:1], "1, 2")
@@ -0,0 +1,154 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+import run
+
+
+class FakeMessage:
+    def __init__(self, chat_id):
+        self.chat_id = chat_id
+        self.replies = []
+
+    def reply_text(self, text, **kwargs):
+        self.replies.append(text)
+
+
+def signal(symbol, stop_loss, chat_id=1):
+    update = SimpleNamespace(
+        effective_message=FakeMessage(chat_id),
+        effective_chat=SimpleNamespace(id=chat_id),
+    )
+    trade = {
+        "OrderType": "Buy",
+        "Symbol": symbol,
+        "Entry": "NOW",
+        "StopLoss": stop_loss,
+        "TP": [stop_loss + 10],
+    }
+    return update, trade
+
+
+def put_all(queue, signals):
+    async def scenario():
+        return [await queue.put(update, trade) for update, trade in signals]
+
+    return asyncio.run(scenario())
+
+
+def waiting(queue):
+    return [
+        (job.symbol, job.trade["StopLoss"])
+        for jobs in queue._pending.values()
+        for job in jobs
+    ]
+
+
+def test_unknown_overflow_policy():
+    with pytest.raises(ValueError):
+        run.SignalQueue(overflow="BLOCK")
+
+
+def test_reject_refuses_new_signals_when_full():
+    # without workers every queued signal stays waiting
+    queue = run.SignalQueue(workers=0, max_size=2, overflow="REJECT")
+    results = put_all(
+        queue, [signal("XAUUSD", 1), signal("EURUSD", 2), signal("XAUUSD", 3)]
+    )
+    assert results == ["queued", "queued", "rejected"]
+    assert waiting(queue) == [("XAUUSD", 1), ("EURUSD", 2)]
+    assert queue.counters["rejected"] == 1
+
+
+def test_drop_oldest_makes_room_and_forgets_the_fingerprint():
+    queue = run.SignalQueue(workers=0, max_size=2, overflow="DROP_OLDEST")
+    signals = [signal("XAUUSD", 1), signal("EURUSD", 2), signal("GBPUSD", 3)]
+    oldest, oldestTrade = signals[0]
+    fingerprint = run.signal_fingerprint(oldestTrade, 1)
+    run.signal_dedupe.check_and_add(fingerprint)
+
+    assert put_all(queue, signals) == ["queued", "queued", "queued"]
+    assert sorted(waiting(queue)) == [("EURUSD", 2), ("GBPUSD", 3)]
+    assert queue.counters["dropped"] == 1
+    assert oldest.effective_message.replies == [
+        "Signal queue is full, this signal was dropped ⚠️"
+    ]
+    # the dropped signal may be sent again
+    assert not run.signal_dedupe.check_and_add(fingerprint)
+    run.signal_dedupe.discard(fingerprint)
+
+
+def test_coalesce_replaces_the_latest_signal_of_the_symbol():
+    queue = run.SignalQueue(workers=0, max_size=2, overflow="COALESCE")
+    signals = [
+        signal("XAUUSD", 1),
+        signal("XAUUSD", 2),
+        signal("XAUUSD", 3),
+        signal("EURUSD", 4),
+    ]
+    results = put_all(queue, signals)
+    assert results == ["queued", "queued", "coalesced", "rejected"]
+    assert waiting(queue) == [("XAUUSD", 1), ("XAUUSD", 3)]
+    assert signals[1][0].effective_message.replies == [
+        "Replaced by a newer signal for this symbol ♻️"
+    ]
+
+
+def test_coalesce_forgets_the_fingerprint_of_the_replaced_signal():
+    queue = run.SignalQueue(workers=0, max_size=1, overflow="COALESCE")
+    signals = [signal("XAUUSD", 1), signal("XAUUSD", 2)]
+    fingerprint = run.signal_fingerprint(signals[0][1], 1)
+    run.signal_dedupe.check_and_add(fingerprint)
+
+    assert put_all(queue, signals) == ["queued", "coalesced"]
+    # the replaced signal was never placed, so it may be sent again
+    assert not run.signal_dedupe.check_and_add(fingerprint)
+    run.signal_dedupe.discard(fingerprint)
+
+
+def test_workers_place_each_symbol_in_arrival_order(monkeypatch):
+    placed = []
+
+    async def place(update, trade, enterTrade, trace):
+        placed.append((trade["Symbol"], trade["StopLoss"]))
+        await asyncio.sleep(0.01)
+
+    monkeypatch.setattr(run, "ConnectMetaTrader", place)
+    queue = run.SignalQueue(workers=2, max_size=10, overflow="REJECT")
+
+    async def scenario():
+        for update, trade in [
+            signal("XAUUSD", 1),
+            signal("XAUUSD", 2),
+            signal("EURUSD", 3),
+            signal("XAUUSD", 4),
+        ]:
+            await queue.put(update, trade)
+        await queue.stop(timeout=5)
+
+    asyncio.run(scenario())
+    assert [stop for symbol, stop in placed if symbol == "XAUUSD"] == [1, 2, 4]
+    assert queue.counters["placed"] == 4
+
+
+def test_a_dead_worker_is_replaced_without_restarting_the_others(caplog):
+    queue = run.SignalQueue(workers=2, max_size=10, overflow="REJECT")
+
+    async def scenario():
+        queue._start()
+        condition = queue._condition
+        first, survivor = queue._tasks
+        first.cancel()
+        dead = asyncio.get_running_loop().create_future()
+        dead.set_exception(RuntimeError("worker crashed"))
+        queue._tasks[0] = dead
+
+        queue._start()
+        assert queue._condition is condition
+        assert len(queue._tasks) == 2
+        assert survivor in queue._tasks and dead not in queue._tasks
+        await queue.stop(timeout=1)
+
+    asyncio.run(scenario())
+    assert "worker crashed" in caplog.text
@@ -0,0 +1,94 @@
+import numpy as np
+import pytest
+
+import run
+
+
+def size(balance, risk, stop_pips, take_profits, plan_b=False, step=0.01, minimum=0.01):
+    # XAUUSD-like: entry 2000, pip 0.1, one pip of one lot is worth 1
+    return run.size_positions(
+        [2000.0],
+        [2000.0 - stop_pips * 0.1],
+        [[2000.0 + tp * 0.1 for tp in take_profits]],
+        [balance],
+        [risk],
+        [plan_b],
+        [0.1],
+        [1.0],
+        [step],
+        [minimum],
+        [100.0],
+    )
+
+
+def test_small_account_is_not_rounded_up_to_one_lot_per_leg():
+    # 1000 * 2% over 200 pips is 0.1 lot: enough for one 0.1 leg only with min 0.1
+    sized = size(1000, 0.02, 200, [100, 200, 300], minimum=0.1)
+    assert sized["volumes"][0].tolist() == [0.1, 0.0, 0.0]
+
+
+def test_total_below_the_minimum_lot_places_nothing():
+    sized = size(100, 0.01, 200, [100, 200, 300])
+    assert not sized["volumes"].any()
+    assert not sized["losses"].any()
+
+
+def test_sub_minimum_plan_b_legs_are_dropped():
+    sized = size(1000, 0.01, 100, [20, 100, 300], plan_b=True)
+    # 0.1 lot of risk times the reward to risk ratios 0.2, 1 and 3
+    assert sized["volumes"][0].tolist() == [0.02, 0.1, 0.3]
+    sized = size(100, 0.01, 100, [20, 100, 300], plan_b=True)
+    assert sized["volumes"][0].tolist() == [0.0, 0.01, 0.03]
+
+
+@pytest.mark.parametrize("plan_b", [False, True])
+def test_summed_volume_never_exceeds_the_risk_volume(plan_b):
+    generator = np.random.default_rng(7)
+    for _ in range(500):
+        balance = generator.uniform(50, 50000)
+        risk = generator.uniform(0.001, 0.05)
+        stop_pips = int(generator.integers(5, 1000))
+        take_profits = sorted(generator.integers(5, 2000, size=3).tolist())
+        minimum = generator.choice([0.01, 0.1])
+        sized = size(balance, risk, stop_pips, take_profits, plan_b, 0.01, minimum)
+        riskVolume = balance * risk / stop_pips
+        volumes = sized["volumes"][0]
+        assert ((volumes == 0) | (volumes >= minimum - 1e-9)).all()
+        if plan_b:
+            allowed = riskVolume * np.array(take_profits) / stop_pips
+            assert (volumes <= allowed + 1e-9).all()
+        else:
+            assert volumes.sum() <= riskVolume + 1e-9
+            assert sized["losses"][0].sum() <= balance * risk + 1e-6
+
+
+def test_skipped_legs_are_not_ordered():
+    trade = {
+        "OrderType": "Buy Limit",
+        "Symbol": "XAUUSD",
+        "Entry": 2000.0,
+        "StopLoss": 1980.0,
+        "TP": [2010.0, 2020.0, 2030.0],
+        "RiskFactor": 0.02,
+        "RiskPerTrade": 0.01,
+        "Plan": "A",
+        "TrailingStop": "N",
+    }
+    spec = run.SymbolSpec(
+        symbol="XAUUSD",
+        digits=2,
+        point=0.01,
+        tick_size=0.01,
+        tick_value=1.0,
+        contract_size=100,
+        volume_step=0.01,
+        min_volume=0.1,
+        max_volume=100.0,
+        updated_at=0,
+    )
+    # 10000 * 2% over 200 pips of 10 per lot is 0.1 lot, the minimum lot
+    table = run.GetTradeInformation(None, trade, 10000.0, spec)
+    assert trade["Sizing"].volumes == [0.1, 0.0, 0.0]
+    assert "TP 2, TP 3 (below min lot)" in str(table)
+    legs = run.build_leg_plan(trade, False, spec)
+    assert [(leg.label, leg.volume) for leg in legs] == [("TP 1", 0.1)]
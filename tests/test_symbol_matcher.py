@@ -0,0 +1,35 @@
+import pytest
+
+import run
+
+
+@pytest.fixture
+def matcher():
+    return run.SymbolMatcher(["JPY", "USDJPY", "USD", "GOLD", "XAU/USD", ""])
+
+
+@pytest.mark.parametrize(
+    "text, symbol",
+    [
+        ("USDJPY SELL 149.85", "USDJPY"),
+        ("usdjpy sell", "USDJPY"),
+        ("JPY weakness, USD strength", "JPY"),
+        ("USD then JPY", "USD"),
+        ("XAU/USD BUY", "XAU/USD"),
+        ("Gold buy now", "GOLD"),
+        ("EURGBP buy", None),
+        ("", None),
+    ],
+)
+def test_find_longest(matcher, text, symbol):
+    assert matcher.find_longest(text) == symbol
+
+
+def test_finditer_reports_overlapping_matches(matcher):
+    assert sorted(matcher.finditer("USDJPY")) == [(0, "USD"), (0, "USDJPY"), (3, "JPY")]
+
+
+def test_contains_any(matcher):
+    assert matcher.contains_any("sell usdjpy")
+    assert not matcher.contains_any("EURGBP buy")
+    assert not run.SymbolMatcher([]).contains_any("USDJPY")
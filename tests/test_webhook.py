@@ -0,0 +1,94 @@
+import asyncio
+import json
+import queue
+from types import SimpleNamespace
+
+import pytest
+
+import run
+
+SECRET = "test-secret"
+
+
+class FakeRequest:
+    def __init__(self, body, secret=SECRET):
+        self.headers = {run.SECRET_TOKEN_HEADER: secret} if secret else {}
+        self.body = body
+
+    async def json(self):
+        return json.loads(self.body)
+
+
+def update_body(update_id):
+    return json.dumps(
+        {
+            "update_id": update_id,
+            "message": {
+                "message_id": update_id,
+                "date": 0,
+                "chat": {"id": 1000, "type": "private", "username": "test"},
+                "text": "XAUUSD BUY NOW",
+            },
+        }
+    )
+
+
+@pytest.fixture
+def server():
+    dispatcher = SimpleNamespace(bot=None, update_queue=queue.Queue())
+    return run.WebhookServer(dispatcher, "/hook", SECRET, run.UpdateSeenSet(100))
+
+
+def handle(server, request):
+    return asyncio.run(server.handle(request)).status
+
+
+def test_update_seen_set_remembers_the_last_update_ids():
+    seen = run.UpdateSeenSet(max_entries=2)
+    assert not seen.check_and_add(1)
+    assert seen.check_and_add(1)
+    assert not seen.check_and_add(2)
+    assert not seen.check_and_add(3)
+    # 1 was evicted to stay within max_entries
+    assert not seen.check_and_add(1)
+    assert seen.check_and_add(3)
+
+
+def test_persistent_update_seen_set_survives_a_restart(tmp_path):
+    path = str(tmp_path / "seen.txt")
+    seen = run.PersistentUpdateSeenSet(path, max_entries=3)
+    for update_id in range(1, 9):
+        seen.check_and_add(update_id)
+    # compacted once it held twice max_entries lines
+    with open(path) as file:
+        assert len(file.readlines()) < 6
+
+    restarted = run.PersistentUpdateSeenSet(path, max_entries=3)
+    assert [restarted.check_and_add(i) for i in (6, 7, 8)] == [True, True, True]
+    assert not restarted.check_and_add(5)
+
+
+@pytest.mark.parametrize("secret", [None, "wrong-secret"])
+def test_requests_without_the_secret_are_forbidden(server, secret):
+    assert handle(server, FakeRequest(update_body(1), secret)) == 403
+    assert server.dispatcher.update_queue.empty()
+    assert not server.seen.check_and_add(1)
+
+
+@pytest.mark.parametrize("body", ["not json", "{}", '{"update_id": "abc"}'])
+def test_malformed_updates_are_bad_requests(server, body):
+    assert handle(server, FakeRequest(body)) == 400
+    assert server.dispatcher.update_queue.empty()
+
+
+def test_updates_are_queued_once(server):
+    assert handle(server, FakeRequest(update_body(7))) == 200
+    # Telegram delivering the same update again is acknowledged and dropped
+    duplicates = run.webhook_counters["duplicate"]
+    assert handle(server, FakeRequest(update_body(7))) == 200
+    assert run.webhook_counters["duplicate"] == duplicates + 1
+
+    update = server.dispatcher.update_queue.get_nowait()
+    assert update.update_id == 7
+    assert update.effective_message.text == "XAUUSD BUY NOW"
+    assert server.dispatcher.update_queue.empty()